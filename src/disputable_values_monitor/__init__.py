@@ -4,9 +4,19 @@ from hexbytes import HexBytes
 from web3.datastructures import AttributeDict
 
 WAIT_PERIOD = 7  # seconds between checks for new events
+MIN_POLL_INTERVAL = 0.25  # fastest a chain is polled, in seconds
+MAX_POLL_INTERVAL = 15  # slowest a chain is polled when following its block time, in seconds
+STREAMING_POLL_INTERVAL = 60  # seconds between polls of a chain whose logs are streamed over a websocket
+CONTRACT_HEALTH_CHECK_INTERVAL = 60  # seconds between health checks of the dispute contracts' endpoints
 
 ALWAYS_ALERT_QUERY_TYPES = ("AutopayAddresses", "TellorOracleAddress")
 
+# token contracts that emit NewOracleAddress and NewProposedOracleAddress events
+TOKEN_CONTRACT_ADDRESSES = {
+    1: "0x88dF592F8eb5D7Bd38bFeF7dEb0fBc02cf3778a0",
+    11155111: "0x80fc34a2f9FfE86F41580F47368289C402DEc660",
+}
+
 
 # https://goerli.etherscan.io/tx/0x3cb2ac6017b9c2282aba271ac658c55db428edcdd391df646a1928bbe28dd9bd
 EXAMPLE_NEW_REPORT_EVENT = AttributeDict(
@@ -0,0 +1,86 @@
+"""Token allowances of the disputer's accounts, tracked between disputes."""
+import asyncio
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from telliot_core.contract.contract import Contract
+from web3 import Web3
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+APPROVAL_FEES = 100  # dispute fees approved at once
+DEFAULT_ALLOWANCE_FLOOR = 1.0  # dispute fees the allowance must cover, or more are approved before disputing
+
+# (chain_id, owner, spender)
+AllowanceKey = Tuple[int, str, str]
+
+
+class AllowanceTracker:
+    """Allowance of the governance contracts to spend each disputer account's tokens.
+
+    The allowance is read from the token contract once, then kept up to date
+    locally: it's set when an approval is sent and lowered by the fee of each
+    dispute. Tokens are only approved when the allowance can't cover `floor`
+    dispute fees, so most disputes skip the approve transaction.
+    """
+
+    def __init__(self, floor: float = DEFAULT_ALLOWANCE_FLOOR) -> None:
+        self.floor = floor
+        self.allowances: Dict[AllowanceKey, int] = {}
+        # bumped whenever an allowance is replaced, so refunds of fees set aside before don't apply to it
+        self.generations: Dict[AllowanceKey, int] = {}
+        self._locks: Dict[AllowanceKey, asyncio.Lock] = {}
+
+    @staticmethod
+    def key(chain_id: int, owner: str, spender: str) -> AllowanceKey:
+        return chain_id, Web3.to_checksum_address(owner), Web3.to_checksum_address(spender)
+
+    def lock(self, key: AllowanceKey) -> asyncio.Lock:
+        """Lock to hold while checking and changing an allowance."""
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    async def get(self, token: Contract, key: AllowanceKey) -> Optional[int]:
+        """Allowance, read from the token contract the first time it's needed."""
+        allowance = self.allowances.get(key)
+        if allowance is not None:
+            return allowance
+        chain_id, owner, spender = key
+        allowance, status = await token.read("allowance", owner=owner, spender=spender)
+        if not status.ok:
+            logger.error(f"Unable to read allowance of {owner} on chain_id {chain_id}: {status.error}")
+            return None
+        self.allowances[key] = int(allowance)
+        return self.allowances[key]
+
+    def needs_approval(self, allowance: int, dispute_fee: int) -> bool:
+        """Check if tokens have to be approved before disputing."""
+        return allowance < dispute_fee * max(self.floor, 1.0)
+
+    def approved(self, key: AllowanceKey, amount: int) -> None:
+        """Record an approval, which replaces the previous allowance."""
+        self.allowances[key] = amount
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+    def spent(self, key: AllowanceKey, amount: int) -> int:
+        """Record tokens transferred by the spender, e.g. a dispute fee.
+
+        Returns the allowance's generation, to refund the tokens if they end up not being transferred."""
+        if key in self.allowances:
+            self.allowances[key] = max(self.allowances[key] - amount, 0)
+        return self.generations.get(key, 0)
+
+    def refund(self, key: AllowanceKey, amount: int, generation: int) -> None:
+        """Give back tokens set aside for a transfer that wasn't sent, unless the allowance was replaced since."""
+        if key in self.allowances and self.generations.get(key, 0) == generation:
+            self.allowances[key] += amount
+
+    def forget(self, key: AllowanceKey) -> None:
+        """Drop an allowance so it's read again, e.g. after a failed dispute."""
+        self.allowances.pop(key, None)
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+
+allowance_tracker = AllowanceTracker()
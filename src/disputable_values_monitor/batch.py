@@ -0,0 +1,103 @@
+"""Check the disputability of many reported values at once, e.g. when backfilling."""
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import Threshold
+
+
+class BatchResult(NamedTuple):
+    """Disputability of each row, and whether it could be evaluated at all.
+
+    Rows that couldn't be evaluated (where MonitoredFeed.is_disputable returns
+    None) are never disputable."""
+
+    disputable: NDArray[np.bool_]
+    evaluated: NDArray[np.bool_]
+
+
+def as_numbers(values: Sequence[Any]) -> Tuple[NDArray[np.float64], NDArray[np.bool_]]:
+    """Values as floats (nan if not a number), and a mask of the ones that are ints or floats."""
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        numbers = values.astype(float)
+        return numbers, ~np.isnan(numbers)
+    count = len(values)
+    is_number = np.fromiter((isinstance(v, (int, float)) for v in values), dtype=bool, count=count)
+    numbers = np.fromiter(
+        (float(v) if number else np.nan for v, number in zip(values, is_number)), dtype=float, count=count
+    )
+    return numbers, is_number
+
+
+def values_differ(reported: Any, trusted: Any) -> Optional[bool]:
+    """Equality threshold of a single row, as MonitoredFeed.is_disputable checks it."""
+    comparable = (str, bytes, float, int, tuple)
+    if not isinstance(reported, comparable) or not isinstance(trusted, comparable):
+        return None
+    if (
+        isinstance(reported, str)
+        and isinstance(trusted, str)
+        and reported.startswith("0x")
+        and trusted.startswith("0x")
+    ):
+        return trusted.lower() != reported.lower()
+    return bool(trusted != reported)
+
+
+def disputable_mask(threshold: Threshold, reported: Sequence[Any], trusted: Sequence[Any]) -> BatchResult:
+    """Check reported values against trusted values with a single threshold.
+
+    Percentage and Range thresholds only evaluate rows where both values are
+    numbers, and Percentage also skips rows with a trusted value of zero.
+    Numbers are compared as floats, so integers beyond 2**53 lose precision.
+    """
+    if len(reported) != len(trusted):
+        raise ValueError(f"got {len(reported)} reported values but {len(trusted)} trusted values")
+
+    if threshold.metric == Metrics.Equality:
+        differ = [values_differ(r, t) for r, t in zip(reported, trusted)]
+        evaluated = np.fromiter((d is not None for d in differ), dtype=bool, count=len(differ))
+        disputable = np.fromiter((bool(d) for d in differ), dtype=bool, count=len(differ))
+        return BatchResult(disputable, evaluated)
+
+    reported_numbers, reported_ok = as_numbers(reported)
+    trusted_numbers, trusted_ok = as_numbers(trusted)
+    evaluated = reported_ok & trusted_ok
+    if threshold.amount is None:
+        evaluated[:] = False
+        return BatchResult(np.zeros(len(evaluated), dtype=bool), evaluated)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if threshold.metric == Metrics.Percentage:
+            evaluated &= trusted_numbers != 0
+            difference = np.abs((reported_numbers - trusted_numbers) / trusted_numbers)
+        elif threshold.metric == Metrics.Range:
+            difference = np.abs(reported_numbers - trusted_numbers)
+        else:
+            raise ValueError(f"unknown threshold metric {threshold.metric}")
+        disputable = evaluated & (difference >= threshold.amount)
+
+    return BatchResult(disputable, evaluated)
+
+
+def evaluate_reports(rows: Sequence[Tuple[Threshold, Any, Any]]) -> BatchResult:
+    """Check (threshold, reported value, trusted value) rows, grouping rows with the same threshold."""
+    groups: Dict[Tuple[Metrics, Optional[float]], Tuple[Threshold, List[int]]] = {}
+    for i, (threshold, _, _) in enumerate(rows):
+        groups.setdefault((threshold.metric, threshold.amount), (threshold, []))[1].append(i)
+
+    disputable = np.zeros(len(rows), dtype=bool)
+    evaluated = np.zeros(len(rows), dtype=bool)
+    for threshold, indices in groups.values():
+        result = disputable_mask(threshold, [rows[i][1] for i in indices], [rows[i][2] for i in indices])
+        disputable[indices] = result.disputable
+        evaluated[indices] = result.evaluated
+    return BatchResult(disputable, evaluated)
@@ -0,0 +1,192 @@
+"""Find blocks by timestamp with as few RPC calls as possible."""
+import bisect
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from web3 import Web3
+from web3.exceptions import ExtraDataLengthError
+from web3.middleware import geth_poa_middleware
+from web3.types import BlockIdentifier
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+# (block number, block timestamp)
+Anchor = Tuple[int, int]
+
+
+class StaleAnchorError(Exception):
+    """A fetched block contradicts the known anchors, e.g. after a reorg or a chain reset."""
+
+
+def get_block(w3: Web3, block: BlockIdentifier) -> Any:
+    """Get a block, injecting the poa middleware for chains that need it."""
+    try:
+        return w3.eth.get_block(block)
+    except ExtraDataLengthError:
+        # for poa chains get_block method throws an error if poa middleware is not injected
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        return w3.eth.get_block(block)
+
+
+class BlockIndex:
+    """Known (block number, timestamp) anchors of each chain.
+
+    Lookups interpolate between the closest known anchors, and every block
+    fetched along the way becomes a new anchor, so repeated lookups on a
+    chain settle after one or two get_block calls. Anchors are saved to a
+    SQLite file once one is opened, and loaded back on restart. Lookups run
+    in several threads at once, so the anchors and the file are only touched
+    while holding a lock.
+    """
+
+    def __init__(self) -> None:
+        self.anchors: Dict[int, List[Anchor]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> None:
+        """Load the anchors saved in a file and save new ones to it."""
+        conn = sqlite3.connect(path, check_same_thread=False)
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS block_timestamps ("
+                "chain_id INTEGER NOT NULL, number INTEGER NOT NULL, timestamp INTEGER NOT NULL, "
+                "PRIMARY KEY (chain_id, number))"
+            )
+        with self._lock:
+            self._conn = conn
+            for chain_id, number, timestamp in conn.execute("SELECT chain_id, number, timestamp FROM block_timestamps"):
+                self._insert(chain_id, (number, timestamp))
+
+    def close(self) -> None:
+        """Stop saving anchors."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _insert(self, chain_id: int, anchor: Anchor) -> bool:
+        # called with the lock held
+        anchors = self.anchors.setdefault(chain_id, [])
+        i = bisect.bisect_left(anchors, anchor)
+        if i < len(anchors) and anchors[i][0] == anchor[0]:
+            return False
+        anchors.insert(i, anchor)
+        return True
+
+    def add(self, chain_id: int, number: int, timestamp: int) -> None:
+        """Remember the timestamp of a block."""
+        with self._lock:
+            if not self._insert(chain_id, (number, timestamp)) or self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO block_timestamps (chain_id, number, timestamp) VALUES (?, ?, ?)",
+                        (chain_id, number, timestamp),
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"unable to save block {number} timestamp of chain_id {chain_id}: {e}")
+
+    def bracket(self, chain_id: int, timestamp: int) -> Tuple[Optional[Anchor], Optional[Anchor]]:
+        """Closest known anchors at or before, and after, a timestamp."""
+        with self._lock:
+            anchors = list(self.anchors.get(chain_id, []))
+        # block timestamps never decrease, so anchors sorted by number are sorted by timestamp
+        i = bisect.bisect_right([ts for _, ts in anchors], timestamp)
+        before = anchors[i - 1] if i > 0 else None
+        after = anchors[i] if i < len(anchors) else None
+        return before, after
+
+    def forget(self, chain_id: int) -> None:
+        """Drop all anchors of a chain."""
+        with self._lock:
+            self.anchors.pop(chain_id, None)
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute("DELETE FROM block_timestamps WHERE chain_id = ?", (chain_id,))
+            except sqlite3.Error as e:
+                logger.error(f"unable to delete block timestamps of chain_id {chain_id}: {e}")
+
+    def _fetch(self, w3: Web3, chain_id: int, block: BlockIdentifier) -> Anchor:
+        return self._fetch_many(w3, chain_id, [block])[0]
+
+    def _fetch_many(self, w3: Web3, chain_id: int, blocks: List[BlockIdentifier]) -> List[Anchor]:
+        """Fetch blocks at the same time, so a batching provider sends them as one request."""
+        if len(blocks) == 1:
+            fetched = [get_block(w3, blocks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(blocks)) as pool:
+                fetched = list(pool.map(lambda block: get_block(w3, block), blocks))
+        anchors: List[Anchor] = [(int(b["number"]), int(b["timestamp"])) for b in fetched]
+        for anchor in anchors:
+            self.add(chain_id, *anchor)
+        return anchors
+
+    def find_block(self, w3: Web3, chain_id: int, timestamp: int) -> int:
+        """Number of the block mined at a timestamp, or else of the last block mined before it."""
+        try:
+            return self._search(w3, chain_id, timestamp)
+        except StaleAnchorError as e:
+            logger.warning(f"dropping saved block timestamps of chain_id {chain_id}: {e}")
+            self.forget(chain_id)
+            return self._search(w3, chain_id, timestamp)
+
+    def _search(self, w3: Web3, chain_id: int, timestamp: int) -> int:
+        before, after = self.bracket(chain_id, timestamp)
+        if before is not None and before[1] == timestamp:
+            return before[0]
+
+        if after is None and before is None:
+            after, before = self._fetch_many(w3, chain_id, ["latest", 0])
+            if after[1] <= timestamp:
+                return after[0]
+            if before[1] >= timestamp:
+                return before[0]
+        if after is None:
+            after = self._fetch(w3, chain_id, "latest")
+            if after[1] <= timestamp:
+                return after[0]
+        if before is None:
+            before = self._fetch(w3, chain_id, 0)
+            if before[1] >= timestamp:
+                return before[0]
+
+        lo, hi = before, after
+        if lo[0] >= hi[0]:
+            raise StaleAnchorError(f"block {lo} is not before block {hi}")
+        bisect_next = False
+        while hi[0] - lo[0] > 1:
+            if bisect_next:
+                guess = (lo[0] + hi[0]) // 2
+            else:
+                # interpolate, assuming blocks are evenly spaced in time between lo and hi
+                guess = lo[0] + (timestamp - lo[1]) * (hi[0] - lo[0]) // (hi[1] - lo[1])
+                guess = min(max(guess, lo[0] + 1), hi[0] - 1)
+            width = hi[0] - lo[0]
+            block = self._fetch(w3, chain_id, guess)
+            if not lo[1] <= block[1] <= hi[1]:
+                raise StaleAnchorError(f"block {block[0]} timestamp {block[1]} isn't between blocks {lo} and {hi}")
+            if block[1] == timestamp:
+                return block[0]
+            if block[1] < timestamp:
+                lo = block
+            else:
+                hi = block
+            # fall back to bisecting when interpolation barely narrows the range, e.g. after a halt
+            bisect_next = (hi[0] - lo[0]) * 2 > width
+
+        return lo[0]
+
+
+block_index = BlockIndex()
@@ -0,0 +1,93 @@
+"""Short-lived cache of trusted values."""
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_TRUSTED_VALUE_TTL = 5.0  # seconds a trusted value is reused for
+
+
+class TrustedValueCache:
+    """Reuse trusted values fetched in the last few seconds.
+
+    Reports of the same query on several chains usually land within seconds
+    of each other. Instead of asking the price sources again for each of
+    them, a value is reused for `ttl` seconds, and reports evaluated at the
+    same time share a single fetch. Results that fail `is_valid` (e.g. a
+    source returning None) are handed to the waiting callers but not cached.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TRUSTED_VALUE_TTL) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time, value)
+        self._values: Dict[Hashable, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        is_valid: Callable[[Any], bool] = lambda value: value is not None,
+    ) -> Any:
+        """Get a fresh cached value, or fetch it once for all concurrent callers."""
+        ttl = self.ttl if ttl is None else ttl
+
+        cached = self._values.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            self.hits += 1
+            return cached[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # the caller doing the fetch was cancelled, not this one
+                return await self.get(key, fetch, ttl, is_valid)
+
+        self.misses += 1
+        self.evict_expired()
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieve it so the loop doesn't complain when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if ttl > 0 and is_valid(value):
+                self._values[key] = (time.monotonic() + ttl, value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    def evict_expired(self) -> None:
+        """Drop expired values."""
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._values.items() if now >= expires_at]:
+            del self._values[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hit and miss counts."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._values)}
@@ -0,0 +1,94 @@
+"""Block cursors of the event log streams, optionally persisted to disk."""
+import sqlite3
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+# (chain_id, contract address, topics)
+StreamKey = Tuple[int, str, str]
+
+# cursors only move forward; reset() is how a stream is scanned again
+ADVANCE_CURSOR = (
+    "INSERT INTO cursors (chain_id, address, topics, block) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (chain_id, address, topics) DO UPDATE SET block = MAX(block, excluded.block)"
+)
+
+
+def stream_key(chain_id: int, address: str, topics: Iterable[str]) -> StreamKey:
+    """Key of the log stream of a contract address and set of topics on a chain."""
+    return chain_id, address.lower(), ",".join(sorted(topic.lower() for topic in topics))
+
+
+class CursorStore:
+    """Last block scanned for each log stream.
+
+    Cursors are staged while a chain's events are fetched and only committed
+    once the events were evaluated, so a crash in between replays those
+    blocks instead of skipping them. With a path, committed cursors are
+    written to a SQLite file in a single transaction per commit and read
+    back on restart. Without one they only live in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cursors ("
+                "chain_id INTEGER NOT NULL, address TEXT NOT NULL, topics TEXT NOT NULL, block INTEGER NOT NULL, "
+                "PRIMARY KEY (chain_id, address, topics))"
+            )
+        self._staged: Dict[StreamKey, int] = {}
+
+    def get(self, key: StreamKey) -> Optional[int]:
+        """Last block scanned for a stream, or None if it was never scanned."""
+        if key in self._staged:
+            return self._staged[key]
+        row = self._conn.execute(
+            "SELECT block FROM cursors WHERE chain_id = ? AND address = ? AND topics = ?", key
+        ).fetchone()
+        return None if row is None else int(row[0])
+
+    def stage(self, key: StreamKey, block: int) -> None:
+        """Move a stream's cursor; it's persisted on the next commit of its chain."""
+        self._staged[key] = block
+
+    def reset(self, key: StreamKey) -> None:
+        """Forget a stream's cursor, e.g. after the chain was reset."""
+        self._staged.pop(key, None)
+        with self._conn:
+            self._conn.execute("DELETE FROM cursors WHERE chain_id = ? AND address = ? AND topics = ?", key)
+
+    def commit(self, chain_id: int) -> None:
+        """Persist the staged cursors of a chain atomically."""
+        staged = [(key, block) for key, block in self._staged.items() if key[0] == chain_id]
+        if not staged:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    ADVANCE_CURSOR,
+                    [(*key, block) for key, block in staged],
+                )
+        except sqlite3.Error as e:
+            logger.error(f"unable to save block cursors for chain_id {chain_id}: {e}")
+            return
+        for key, _ in staged:
+            del self._staged[key]
+
+    def advance(self, keys: Iterable[StreamKey], block: int) -> None:
+        """Persist cursors right away, e.g. for logs delivered by a stream; staged cursors are left alone."""
+        try:
+            with self._conn:
+                self._conn.executemany(ADVANCE_CURSOR, [(*key, block) for key in keys])
+        except sqlite3.Error as e:
+            logger.error(f"unable to save block cursors: {e}")
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        self._conn.close()
@@ -1,25 +1,58 @@
 """CLI dashboard to display recent values reported to Tellor oracles."""
+import asyncio
 import logging
 import warnings
-from time import sleep
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
 
 import click
-import pandas as pd
 from chained_accounts import ChainedAccount
 from hexbytes import HexBytes
 from telliot_core.apps.telliot_config import TelliotConfig
 from telliot_core.cli.utils import async_run
 
-from disputable_values_monitor import WAIT_PERIOD
-from disputable_values_monitor.config import AutoDisputerConfig
-from disputable_values_monitor.data import chain_events
-from disputable_values_monitor.data import get_events
+from disputable_values_monitor.allowances import allowance_tracker
+from disputable_values_monitor.allowances import DEFAULT_ALLOWANCE_FLOOR
+from disputable_values_monitor.blocks import block_index
+from disputable_values_monitor.cache import DEFAULT_TRUSTED_VALUE_TTL
+from disputable_values_monitor.cache import TrustedValueCache
+from disputable_values_monitor.checkpoints import CursorStore
+from disputable_values_monitor.config import DisputerConfigWatcher
+from disputable_values_monitor.connections import connection_manager
+from disputable_values_monitor.contracts import contract_registry
+from disputable_values_monitor.data import get_chain_events
 from disputable_values_monitor.data import parse_new_report_event
+from disputable_values_monitor.data import plan_chain_filter
+from disputable_values_monitor.data import plan_stream_keys
 from disputable_values_monitor.discord import alert
+from disputable_values_monitor.discord import alert_dispatcher
 from disputable_values_monitor.discord import dispute_alert
 from disputable_values_monitor.discord import generic_alert
 from disputable_values_monitor.discord import get_alert_bot_1
+from disputable_values_monitor.discord import webhook_urls
 from disputable_values_monitor.disputer import dispute
+from disputable_values_monitor.endpoints import endpoint_pool
+from disputable_values_monitor.metrics import METRICS_HOST
+from disputable_values_monitor.metrics import parse_failures
+from disputable_values_monitor.metrics import serve_metrics
+from disputable_values_monitor.nonces import nonce_manager
+from disputable_values_monitor.pipeline import ChainEvent
+from disputable_values_monitor.pipeline import log_key
+from disputable_values_monitor.pipeline import ReportPipeline
+from disputable_values_monitor.pipeline import SeenEvents
+from disputable_values_monitor.reports import infer_report_format
+from disputable_values_monitor.reports import REPORT_FILE
+from disputable_values_monitor.reports import REPORT_FORMATS
+from disputable_values_monitor.reports import ReportSink
+from disputable_values_monitor.scheduler import ChainScheduler
+from disputable_values_monitor.scheduler import monitored_chain_ids
+from disputable_values_monitor.subscriptions import LogStream
+from disputable_values_monitor.subscriptions import parse_ws_url
+from disputable_values_monitor.utils import chain_config
 from disputable_values_monitor.utils import clear_console
 from disputable_values_monitor.utils import format_values
 from disputable_values_monitor.utils import get_logger
@@ -36,6 +69,18 @@ price_aggregator_logger.handlers = [
 logger = get_logger(__name__)
 
 
+def parse_ws_urls(values: Tuple[str, ...]) -> Dict[int, str]:
+    """Websocket endpoints by chain id, from CHAIN_ID=URL pairs."""
+    ws_urls = {}
+    for value in values:
+        parsed = parse_ws_url(value)
+        if parsed is None:
+            raise click.BadParameter(f"expected CHAIN_ID=ws(s)://..., got {value}", param_hint="--ws-url")
+        chain_id, url = parsed
+        ws_urls[chain_id] = url
+    return ws_urls
+
+
 def print_title_info() -> None:
     """Prints the title info."""
     click.echo("Disputable Values Monitor 📒🔎📲")
@@ -46,7 +91,13 @@ def print_title_info() -> None:
     "-av", "--all-values", is_flag=True, default=False, show_default=True, help="if set, get alerts for all values"
 )
 @click.option("-a", "--account-name", help="the name of a ChainedAccount to dispute with", type=str)
-@click.option("-w", "--wait", help="how long to wait between checks", type=int, default=WAIT_PERIOD)
+@click.option(
+    "-w",
+    "--wait",
+    help="how long to wait between checks, defaults to each chain's block time",
+    type=float,
+    default=None,
+)
 @click.option("-d", "--is-disputing", help="enable auto-disputing on chain", is_flag=True)
 @click.option(
     "-c",
@@ -61,14 +112,88 @@ def print_title_info() -> None:
     type=int,
     default=0,
 )
+@click.option(
+    "--workers",
+    help="the number of reports to evaluate concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--checkpoint-file",
+    help="file to save scanned blocks to, so a restart resumes where it left off",
+    type=click.Path(dir_okay=False),
+    default=None,
+)
+@click.option(
+    "--trusted-value-ttl",
+    help="seconds a trusted value is reused for reports of the same query, 0 to fetch it for every report",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TRUSTED_VALUE_TTL,
+    show_default=True,
+)
+@click.option(
+    "--report-file",
+    help="file each evaluated report is appended to",
+    type=click.Path(dir_okay=False),
+    default=REPORT_FILE,
+    show_default=True,
+)
+@click.option(
+    "--report-format",
+    help="format of the report file, defaults to ndjson for .ndjson/.jsonl files and csv otherwise",
+    type=click.Choice(REPORT_FORMATS),
+    default=None,
+)
+@click.option(
+    "--allowance-floor",
+    help="dispute fees the token allowance must cover before disputing, or more tokens are approved first",
+    type=click.FloatRange(min=1),
+    default=DEFAULT_ALLOWANCE_FLOOR,
+    show_default=True,
+)
+@click.option(
+    "--metrics-port",
+    help="port to serve Prometheus metrics on, at /metrics; not served if unset",
+    type=click.IntRange(min=1, max=65535),
+    default=None,
+)
+@click.option(
+    "--metrics-host",
+    help="address to serve Prometheus metrics on; use 0.0.0.0 to serve them on every interface",
+    default=METRICS_HOST,
+    show_default=True,
+)
+@click.option(
+    "--ws-url",
+    "ws_urls",
+    help="websocket endpoint to stream a chain's logs from, as CHAIN_ID=URL; can be repeated, other chains are polled",
+    multiple=True,
+    callback=lambda ctx, param, values: parse_ws_urls(values),
+)
+@click.option(
+    "--hedge",
+    help="also send log fetches and gas estimates to a chain's second healthiest endpoint if the first is slow",
+    is_flag=True,
+)
 @async_run
 async def main(
     all_values: bool,
-    wait: int,
+    wait: Optional[float],
     account_name: str,
     is_disputing: bool,
     confidence_threshold: float,
     initial_block_offset: int,
+    workers: int,
+    checkpoint_file: Optional[str],
+    trusted_value_ttl: float,
+    report_file: str,
+    report_format: Optional[str],
+    allowance_floor: float,
+    metrics_port: Optional[int],
+    metrics_host: str,
+    ws_urls: Dict[int, str],
+    hedge: bool,
 ) -> None:
     """CLI dashboard to display recent values reported to Tellor oracles."""
     # Raises exception if no webhook url is found
@@ -80,21 +205,42 @@ async def main(
         is_disputing=is_disputing,
         confidence_threshold=confidence_threshold,
         initial_block_offset=initial_block_offset,
+        workers=workers,
+        checkpoint_file=checkpoint_file,
+        trusted_value_ttl=trusted_value_ttl,
+        report_file=report_file,
+        report_format=report_format,
+        allowance_floor=allowance_floor,
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        ws_urls=ws_urls,
+        hedge=hedge,
     )
 
 
 async def start(
     all_values: bool,
-    wait: int,
+    wait: Optional[float],
     account_name: str,
     is_disputing: bool,
     confidence_threshold: float,
     initial_block_offset: int,
+    workers: int = 1,
+    checkpoint_file: Optional[str] = None,
+    trusted_value_ttl: float = DEFAULT_TRUSTED_VALUE_TTL,
+    report_file: str = REPORT_FILE,
+    report_format: Optional[str] = None,
+    allowance_floor: float = DEFAULT_ALLOWANCE_FLOOR,
+    metrics_port: Optional[int] = None,
+    metrics_host: str = METRICS_HOST,
+    ws_urls: Optional[Dict[int, str]] = None,
+    hedge: bool = False,
 ) -> None:
     """Start the CLI dashboard."""
     cfg = TelliotConfig()
     cfg.main.chain_id = 1
-    disp_cfg = AutoDisputerConfig(is_disputing=is_disputing, confidence_flag=confidence_threshold)
+    config_watcher = DisputerConfigWatcher(is_disputing=is_disputing, confidence_flag=confidence_threshold)
+    disp_cfg = config_watcher.config
     print_title_info()
 
     if not disp_cfg.monitored_feeds:
@@ -105,127 +251,204 @@ async def start(
 
     if account and is_disputing:
         click.echo("...Now with auto-disputing!")
+    allowance_tracker.floor = allowance_floor
+    endpoint_pool.hedging = hedge
+
+    display_rows: List[Tuple[Any, ...]] = []
+    seen_events = SeenEvents()
+
+    async def handle_event(chain_id: int, event: Any) -> None:
+        """Parse, alert on, dispute and display a single event."""
+        nonlocal display_rows
 
-    display_rows = []
-    displayed_events = set()
+        # refetched events and copies from the stream are handled once
+        key = log_key(chain_id, event)
+        if not seen_events.reserve(key):
+            return
 
-    # Build query if filter is set
-    while True:
+        chain_cfg = chain_config(cfg, chain_id)
+        if (
+            HexBytes(Topics.NEW_ORACLE_ADDRESS) in event.topics
+            or HexBytes(Topics.NEW_PROPOSED_ORACLE_ADDRESS) in event.topics
+        ):
+            link = get_tx_explorer_url(cfg=chain_cfg, tx_hash=event.transactionHash.hex())
+            msg = f"\n❗NEW ORACLE ADDRESS ALERT❗\n{link}"
+            generic_alert(msg=msg)
+            return
 
-        # Fetch NewReport events
-        event_lists = await get_events(
-            cfg=cfg,
-            contract_name="tellor360-oracle",
-            topics=[Topics.NEW_REPORT],
-            inital_block_offset=initial_block_offset,
+        # evaluate the whole event against one config, even if it's reloaded meanwhile
+        event_disp_cfg = config_watcher.config
+
+        try:
+            new_report = await parse_new_report_event(
+                cfg=chain_cfg,
+                monitored_feeds=event_disp_cfg.monitored_feeds or [],
+                log=event,
+                confidence_threshold=confidence_threshold,
+                trusted_values=trusted_values,
+                feed_index=event_disp_cfg.feed_index,
+            )
+        except Exception as e:
+            logger.error(f"unable to parse new report event on chain_id {chain_id}: {e}")
+            parse_failures.inc(chain_id=chain_id, reason="error")
+            seen_events.release(key)
+            return
+
+        # Skip missing events, trying them again if they're fetched again
+        if new_report is None:
+            seen_events.release(key)
+            return
+
+        # Refesh
+        clear_console()
+        print_title_info()
+
+        if is_disputing:
+            click.echo("...Now with auto-disputing!")
+
+        alert(all_values, new_report)
+
+        if is_disputing and new_report.disputable:
+            # transactions are sent and awaited in a thread; with several workers disputes overlap,
+            # each with its own nonce from the nonce manager
+            success_msg = await dispute(chain_cfg, event_disp_cfg, account, new_report)
+            if success_msg:
+                dispute_alert(success_msg)
+
+        display_rows.append(
+            (
+                new_report.tx_hash,
+                new_report.submission_timestamp,
+                new_report.link,
+                new_report.query_type,
+                new_report.value,
+                new_report.status_str,
+                new_report.asset,
+                new_report.currency,
+                new_report.chain_id,
+            )
         )
-        tellor_flex_report_events = await get_events(
-            cfg=cfg,
-            contract_name="tellorflex-oracle",
-            topics=[Topics.NEW_REPORT],
-            inital_block_offset=initial_block_offset,
+
+        # Prune display
+        if len(display_rows) > 10:
+            # sort by timestamp
+            display_rows = sorted(display_rows, key=lambda x: x[1])
+            del display_rows[0]
+
+        # Display table
+        # only the dashboard needs pandas
+        import pandas as pd
+
+        _, times, links, query_type, values, disputable_strs, assets, currencies, chain = zip(*display_rows)
+
+        dataframe_state = dict(
+            When=times,
+            Transaction=links,
+            QueryType=query_type,
+            Asset=assets,
+            Currency=currencies,
+            # split length of characters in the Values' column that overflow when displayed in cli
+            Value=values,
+            Disputable=disputable_strs,
+            ChainId=chain,
         )
-        tellor360_events = await chain_events(
-            cfg=cfg,
-            # addresses are for token contract
-            chain_addy={
-                1: "0x88dF592F8eb5D7Bd38bFeF7dEb0fBc02cf3778a0",
-                11155111: "0x80fc34a2f9FfE86F41580F47368289C402DEc660",
-            },
-            topics=[[Topics.NEW_ORACLE_ADDRESS], [Topics.NEW_PROPOSED_ORACLE_ADDRESS]],
-            inital_block_offset=initial_block_offset,
+        df = pd.DataFrame.from_dict(dataframe_state)
+        df = df.sort_values("When")
+        df["Value"] = df["Value"].apply(format_values)
+        print(df.to_markdown(index=False), end="\r")
+        report_sink.write(new_report)
+
+    trusted_values = TrustedValueCache(ttl=trusted_value_ttl)
+    report_sink = ReportSink(report_file, fmt=report_format or infer_report_format(report_file))
+    pipeline = ReportPipeline(handle_event, workers=workers)
+
+    cursors = CursorStore(checkpoint_file)
+    if checkpoint_file is not None:
+        block_index.open(checkpoint_file)
+        nonce_manager.open(checkpoint_file)
+
+    # streamed chains polled since their stream (re)connected, so the stream picks up where the poll left off
+    backfilled: Set[int] = set()
+
+    async def poll_chain(chain_id: int) -> None:
+        """Fetch new events from a chain, evaluate them, then save how far the chain was scanned."""
+        streaming = chain_id in scheduler.streaming
+        events = await get_chain_events(
+            cfg=cfg, chain_id=chain_id, inital_block_offset=initial_block_offset, cursors=cursors
         )
-        event_lists += tellor360_events + tellor_flex_report_events
-        for event_list in event_lists:
-            # event_list = [(80001, EXAMPLE_NEW_REPORT_EVENT)]
-            if not event_list:
-                continue
-            for chain_id, event in event_list:
-
-                cfg.main.chain_id = chain_id
-                if (
-                    HexBytes(Topics.NEW_ORACLE_ADDRESS) in event.topics
-                    or HexBytes(Topics.NEW_PROPOSED_ORACLE_ADDRESS) in event.topics
-                ):
-                    link = get_tx_explorer_url(cfg=cfg, tx_hash=event.transactionHash.hex())
-                    msg = f"\n❗NEW ORACLE ADDRESS ALERT❗\n{link}"
-                    generic_alert(msg=msg)
-                    continue
-
-                try:
-                    new_report = await parse_new_report_event(
-                        cfg=cfg,
-                        monitored_feeds=disp_cfg.monitored_feeds,
-                        log=event,
-                        confidence_threshold=confidence_threshold,
-                    )
-                except Exception as e:
-                    logger.error(f"unable to parse new report event on chain_id {chain_id}: {e}")
-                    continue
-
-                # Skip duplicate & missing events
-                if new_report is None or new_report.tx_hash in displayed_events:
-                    continue
-                displayed_events.add(new_report.tx_hash)
-
-                # Refesh
-                clear_console()
-                print_title_info()
-
-                if is_disputing:
-                    click.echo("...Now with auto-disputing!")
-
-                alert(all_values, new_report)
-
-                if is_disputing and new_report.disputable:
-                    success_msg = await dispute(cfg, disp_cfg, account, new_report)
-                    if success_msg:
-                        dispute_alert(success_msg)
-
-                display_rows.append(
-                    (
-                        new_report.tx_hash,
-                        new_report.submission_timestamp,
-                        new_report.link,
-                        new_report.query_type,
-                        new_report.value,
-                        new_report.status_str,
-                        new_report.asset,
-                        new_report.currency,
-                        new_report.chain_id,
-                    )
-                )
-
-                # Prune display
-                if len(display_rows) > 10:
-                    # sort by timestamp
-                    display_rows = sorted(display_rows, key=lambda x: x[1])
-                    displayed_events.remove(display_rows[0][0])
-                    del display_rows[0]
-
-                # Display table
-                _, times, links, query_type, values, disputable_strs, assets, currencies, chain = zip(*display_rows)
-
-                dataframe_state = dict(
-                    When=times,
-                    Transaction=links,
-                    QueryType=query_type,
-                    Asset=assets,
-                    Currency=currencies,
-                    # split length of characters in the Values' column that overflow when displayed in cli
-                    Value=values,
-                    Disputable=disputable_strs,
-                    ChainId=chain,
-                )
-                df = pd.DataFrame.from_dict(dataframe_state)
-                df = df.sort_values("When")
-                df["Value"] = df["Value"].apply(format_values)
-                print(df.to_markdown(index=False), end="\r")
-                df.to_csv("table.csv", mode="a", header=False)
-                # reset config to clear object attributes that were set during loop
-                disp_cfg = AutoDisputerConfig(is_disputing=is_disputing, confidence_flag=confidence_threshold)
-
-        sleep(wait)
+        config_watcher.reload()
+        await pipeline.process(events)
+        cursors.commit(chain_id)
+        if streaming and chain_id in scheduler.streaming:
+            backfilled.add(chain_id)
+
+    chain_ids = monitored_chain_ids(cfg)
+    contract_maintenance = None
+    if account and is_disputing:
+        # connect the dispute contracts ahead of the first disputable report
+        contract_maintenance = asyncio.create_task(contract_registry.maintain(cfg, chain_ids, account))
+
+    urls = webhook_urls()
+    if urls:
+        # alerts are posted in the background so a slow Discord never holds up monitoring
+        alert_dispatcher.start(urls)
+
+    report_flushing = asyncio.create_task(report_sink.autoflush())
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = await serve_metrics(metrics_port, host=metrics_host)
+
+    scheduler = ChainScheduler(cfg, poll_chain, wait=wait)
+
+    def stream_chain(chain_id: int, url: str) -> LogStream:
+        """Stream a chain's logs, polling it right away to backfill whenever the stream (re)connects or drops."""
+
+        plan = plan_chain_filter(chain_id)
+
+        async def on_logs(events: List[ChainEvent]) -> None:
+            await pipeline.process(events)
+            # the safety net poll then starts from the streamed block instead of refetching what was streamed
+            if chain_id in backfilled:
+                cursors.advance(plan_stream_keys(plan), max(event["blockNumber"] for _, event in events))
+
+        def on_connect() -> None:
+            backfilled.discard(chain_id)
+            scheduler.streaming.add(chain_id)
+            scheduler.wake(chain_id)
+
+        def on_disconnect() -> None:
+            backfilled.discard(chain_id)
+            scheduler.streaming.discard(chain_id)
+            scheduler.wake(chain_id)
+
+        return LogStream(chain_id, url, plan, on_logs, on_connect, on_disconnect)
+
+    log_streams = []
+    for chain_id, url in (ws_urls or {}).items():
+        if chain_id not in chain_ids:
+            logger.warning(f"not streaming chain_id {chain_id}: it has no endpoint configured")
+            continue
+        if not plan_chain_filter(chain_id).targets:
+            logger.warning(f"not streaming chain_id {chain_id}: no Tellor contracts are known on it")
+            continue
+        log_streams.append(asyncio.create_task(stream_chain(chain_id, url).run()))
+    try:
+        await scheduler.run(chain_ids)
+    finally:
+        report_flushing.cancel()
+        report_sink.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if contract_maintenance is not None:
+            contract_maintenance.cancel()
+        for log_stream in log_streams:
+            log_stream.cancel()
+        cursors.close()
+        block_index.close()
+        nonce_manager.close()
+        connection_manager.close()
+        if alert_dispatcher.running:
+            await alert_dispatcher.stop()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,17 @@
 """contains AutoDisputerConfig class for adjusting the settings of the auto-disputer"""
 import logging
+import os
 from dataclasses import dataclass
 from typing import Any
 from typing import List
 from typing import Optional
+from typing import Tuple
 
 import yaml
 from box import Box
-from telliot_feeds.feeds import CATALOG_FEEDS
-from telliot_feeds.feeds import DataFeed
-from telliot_feeds.feeds import DATAFEED_BUILDER_MAPPING
-from telliot_feeds.queries.query_catalog import query_catalog
+from telliot_feeds.datafeed import DataFeed
 
+from disputable_values_monitor.data import FeedIndex
 from disputable_values_monitor.data import Metrics
 from disputable_values_monitor.data import MonitoredFeed
 from disputable_values_monitor.data import Threshold
@@ -19,17 +19,22 @@ from disputable_values_monitor.utils import get_logger
 
 logger = get_logger(__name__)
 
+DISPUTER_CONFIG_PATH = "disputer-config.yaml"
+
 
 @dataclass
 class AutoDisputerConfig:
 
     monitored_feeds: Optional[List[MonitoredFeed]]
+    feed_index: FeedIndex
 
-    def __init__(self, is_disputing: bool, confidence_flag: float) -> None:
+    def __init__(self, is_disputing: bool, confidence_flag: float, path: str = DISPUTER_CONFIG_PATH) -> None:
         self.confidence = None if is_disputing else confidence_flag
+        self.monitored_feeds = None
+        self.feed_index = FeedIndex()
 
         try:
-            with open("disputer-config.yaml", "r") as f:
+            with open(path, "r") as f:
                 self.box = Box(yaml.safe_load(f))
         except (yaml.parser.ParserError, yaml.scanner.ScannerError) as e:
             logging.error(f"YAML file error: {e}")
@@ -42,6 +47,7 @@ class AutoDisputerConfig:
             return
 
         self.monitored_feeds = self.build_monitored_feeds_from_yaml()
+        self.feed_index = FeedIndex.build(self.monitored_feeds or [])
 
     def build_monitored_feeds_from_yaml(self) -> Optional[List[MonitoredFeed]]:
         """
@@ -60,6 +66,11 @@ class AutoDisputerConfig:
 
         """
 
+        # imported here rather than with the module so that importing it stays fast
+        from telliot_feeds.feeds import CATALOG_FEEDS
+        from telliot_feeds.feeds import DATAFEED_BUILDER_MAPPING
+        from telliot_feeds.queries.query_catalog import query_catalog
+
         monitored_feeds = []
 
         for i in range(len(self.box.feeds)):
@@ -112,11 +123,52 @@ class AutoDisputerConfig:
                 logging.error(f"Unsupported threshold: {threshold}\n")
                 return None
 
-            monitored_feeds.append(MonitoredFeed(datafeed, threshold))
+            ttl = self.box.feeds[i].get("ttl")
+            monitored_feeds.append(MonitoredFeed(datafeed, threshold, ttl=None if ttl is None else float(ttl)))
 
         return monitored_feeds
 
 
+class DisputerConfigWatcher:
+    """Compiled disputer config, recompiled only when its file changes.
+
+    Reports are evaluated against `config`, which is never changed in place:
+    when the file's modification time or size changes, a new config is
+    compiled and swapped in whole. A file that no longer compiles to any
+    monitored feed is reported and the previous config is kept.
+    """
+
+    def __init__(self, is_disputing: bool, confidence_flag: float, path: str = DISPUTER_CONFIG_PATH) -> None:
+        self.is_disputing = is_disputing
+        self.confidence_flag = confidence_flag
+        self.path = path
+        self._stamp = self.file_stamp()
+        self.config = AutoDisputerConfig(is_disputing, confidence_flag, path=path)
+
+    def file_stamp(self) -> Optional[Tuple[int, int]]:
+        """Modification time and size of the config file, or None if it can't be read."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> AutoDisputerConfig:
+        """Current config, recompiled first if the file changed since it was last read."""
+        stamp = self.file_stamp()
+        if stamp == self._stamp:
+            return self.config
+        self._stamp = stamp
+
+        config = AutoDisputerConfig(self.is_disputing, self.confidence_flag, path=self.path)
+        if not config.monitored_feeds:
+            logger.error(f"Invalid or empty {self.path}, keeping the previously loaded feeds")
+            return self.config
+        self.config = config
+        logger.info(f"Reloaded {len(config.monitored_feeds)} monitored feeds from {self.path}")
+        return self.config
+
+
 if __name__ == "__main__":
 
     print(AutoDisputerConfig(is_disputing=False, confidence_flag=0.5))
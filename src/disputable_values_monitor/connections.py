@@ -0,0 +1,119 @@
+"""Web3 connections to RPC endpoints, established once and shared by every caller."""
+import threading
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from telliot_core.model.endpoints import RPCEndpoint
+from web3 import Web3
+
+from disputable_values_monitor.metrics import instrument
+from disputable_values_monitor.rpcbatch import BatchingHTTPProvider
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+POOL_SIZE = 32  # keep-alive connections kept open to each endpoint
+
+
+def keep_alive_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """HTTP session keeping up to pool_size connections open for reuse by any thread."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ConnectionManager:
+    """One Web3 instance per endpoint url, connected on first use and reused after.
+
+    Connecting checks the endpoint's chain id once; every later caller gets
+    the ready Web3 without another request. Each connection posts through its
+    own keep-alive session shared by all threads, batches concurrent requests
+    and records their latency. A connection is only rebuilt after it's
+    dropped, e.g. when the endpoint kept failing.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE) -> None:
+        self.pool_size = pool_size
+        self.connections: Dict[str, Web3] = {}
+        self.sessions: Dict[str, requests.Session] = {}
+        # endpoints handed a connection, so dropping it disconnects them all
+        self.endpoints: Dict[str, List[RPCEndpoint]] = {}
+        self._lock = threading.Lock()
+
+    def web3(self, endpoint: RPCEndpoint) -> Optional[Web3]:
+        """Connected Web3 of an endpoint, or None if it can't connect."""
+        # connected already, by this manager or by whoever set it up
+        w3: Optional[Web3] = endpoint.web3
+        if w3 is not None:
+            return w3
+
+        with self._lock:
+            w3 = self.connections.get(endpoint.url)
+        if w3 is None:
+            w3 = self.connect(endpoint)
+            if w3 is None:
+                return None
+
+            with self._lock:
+                # another caller may have connected meanwhile
+                connected = self.connections.setdefault(endpoint.url, w3)
+                if connected is w3:
+                    self.sessions[endpoint.url] = w3.provider.session  # type: ignore[attr-defined]
+            if connected is not w3:
+                w3.provider.session.close()  # type: ignore[attr-defined]
+                w3 = connected
+
+        with self._lock:
+            self.endpoints.setdefault(endpoint.url, []).append(endpoint)
+        endpoint._web3 = w3
+        return w3
+
+    def connect(self, endpoint: RPCEndpoint) -> Optional[Web3]:
+        """New Web3 of an endpoint, checked to be on the endpoint's chain."""
+        if not endpoint.url.startswith("http"):
+            logger.error(f"unable to connect to endpoint {endpoint.url}: only http endpoints are supported")
+            return None
+
+        session = keep_alive_session(self.pool_size)
+        w3 = Web3(BatchingHTTPProvider(endpoint.url, session=session))
+        try:
+            chain_id = w3.eth.chain_id
+        except Exception as e:
+            logger.warning(f"unable to connect to endpoint {endpoint.url}: {e}")
+            session.close()
+            return None
+        if endpoint.chain_id is not None and chain_id != endpoint.chain_id:
+            logger.error(f"endpoint {endpoint.url} is on chain_id {chain_id} instead of {endpoint.chain_id}")
+            session.close()
+            return None
+
+        instrument(w3, chain_id)
+        logger.debug(f"connected to endpoint {endpoint.url} on chain_id {chain_id}")
+        return w3
+
+    def drop(self, url: str) -> None:
+        """Close the connection to an endpoint; it's made again on its next use."""
+        with self._lock:
+            w3 = self.connections.pop(url, None)
+            session = self.sessions.pop(url, None)
+            endpoints = self.endpoints.pop(url, [])
+        for endpoint in endpoints:
+            if endpoint.web3 is w3:
+                endpoint._web3 = None
+        if session is not None:
+            session.close()
+        if w3 is not None:
+            logger.info(f"dropped the connection to endpoint {url}, reconnecting on its next use")
+
+    def close(self) -> None:
+        """Close every connection."""
+        for url in list(self.connections):
+            self.drop(url)
+
+
+connection_manager = ConnectionManager()
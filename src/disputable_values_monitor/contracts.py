@@ -0,0 +1,120 @@
+"""Connected contract handles of each chain, reused across disputes."""
+import asyncio
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from chained_accounts import ChainedAccount
+from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_core.contract.contract import Contract
+
+from disputable_values_monitor import CONTRACT_HEALTH_CHECK_INTERVAL
+from disputable_values_monitor.data import get_contract
+from disputable_values_monitor.data import get_contract_info
+from disputable_values_monitor.endpoints import endpoint_pool
+from disputable_values_monitor.utils import chain_config
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+# contracts used to send a dispute
+DISPUTE_CONTRACTS = ("trb-token", "tellor-governance", "tellor360-oracle")
+
+# (chain_id, endpoint url, contract name, account name)
+ContractKey = Tuple[int, str, str, Optional[str]]
+
+
+class ContractRegistry:
+    """Contract handles built and connected once per chain, endpoint and account.
+
+    Looking up a contract in the directory, loading its ABI and connecting it
+    to the endpoint happens on first use (or when warmed at startup) instead of
+    on every dispute. A background health check drops the handles of chains
+    whose endpoint stopped answering, so they are rebuilt on their next use.
+    """
+
+    def __init__(self) -> None:
+        self.contracts: Dict[ContractKey, Contract] = {}
+
+    def key(self, cfg: TelliotConfig, name: str, account: Optional[ChainedAccount]) -> ContractKey:
+        """Key of a contract handle on the chain selected in the config."""
+        endpoint = endpoint_pool.get(cfg, cfg.main.chain_id)
+        if endpoint is None:
+            raise ValueError(f"no endpoint of chain_id {cfg.main.chain_id} connects")
+        # handles follow the healthiest endpoint
+        return cfg.main.chain_id, endpoint.url, name, None if account is None else account.name
+
+    def get(self, cfg: TelliotConfig, name: str, account: Optional[ChainedAccount] = None) -> Optional[Contract]:
+        """Connected contract on the chain selected in the config, or None if it can't be built."""
+        try:
+            key = self.key(cfg, name, account)
+        except ValueError as e:
+            logger.error(f"Could not find an endpoint for chain_id {cfg.main.chain_id}: {e}")
+            return None
+        contract = self.contracts.get(key)
+        # built on a connection that was dropped since
+        if contract is not None and contract.contract.w3 is not contract.node.web3:
+            contract = None
+        if contract is None:
+            contract = get_contract(cfg, name=name, account=account)
+            if contract is not None:
+                self.contracts[key] = contract
+        return contract
+
+    def forget(self, chain_id: int) -> None:
+        """Drop the handles of a chain."""
+        for key in [key for key in self.contracts if key[0] == chain_id]:
+            del self.contracts[key]
+
+    def warm(
+        self,
+        cfg: TelliotConfig,
+        chain_ids: Iterable[int],
+        account: Optional[ChainedAccount],
+        names: Iterable[str] = DISPUTE_CONTRACTS,
+    ) -> None:
+        """Build the handles of the given contracts on the chains they are deployed on."""
+        for chain_id in chain_ids:
+            chain_cfg = chain_config(cfg, chain_id)
+            for name in names:
+                addr, _ = get_contract_info(chain_id, name)
+                if addr is not None:
+                    self.get(chain_cfg, name, account)
+
+    def check(self) -> List[int]:
+        """Drop the handles of chains whose endpoint doesn't answer; returns those chain ids."""
+        # handles of a chain and endpoint share the same node
+        nodes = {key[:2]: contract.node for key, contract in list(self.contracts.items())}
+        unhealthy = []
+        for (chain_id, url), node in nodes.items():
+            try:
+                node.web3.eth.get_block_number()
+            except Exception as e:
+                logger.warning(f"endpoint {url} of chain_id {chain_id} failed health check: {e}")
+                unhealthy.append(chain_id)
+        for chain_id in unhealthy:
+            self.forget(chain_id)
+        return unhealthy
+
+    async def maintain(
+        self,
+        cfg: TelliotConfig,
+        chain_ids: Iterable[int],
+        account: Optional[ChainedAccount],
+        interval: float = CONTRACT_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        """Warm the dispute contracts, then health check them every interval seconds until cancelled."""
+        chain_ids = list(chain_ids)
+        while True:
+            try:
+                await asyncio.to_thread(self.warm, cfg, chain_ids, account)
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                logger.error(f"unable to maintain contract handles: {e}")
+                await asyncio.sleep(interval)
+
+
+contract_registry = ContractRegistry()
@@ -1,10 +1,16 @@
 """Get and parse NewReport events from Tellor oracles."""
 import asyncio
-import math
+import copy
+import time
 from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
 from enum import Enum
 from typing import Any
+from typing import Awaitable
+from typing import Callable
 from typing import Dict
+from typing import Iterable
 from typing import List
 from typing import Optional
 from typing import Tuple
@@ -12,7 +18,6 @@ from typing import Union
 
 import eth_abi
 from chained_accounts import ChainedAccount
-from clamfig.base import Registry
 from hexbytes import HexBytes
 from telliot_core.apps.telliot_config import TelliotConfig
 from telliot_core.contract.contract import Contract
@@ -20,26 +25,36 @@ from telliot_core.directory import contract_directory
 from telliot_core.model.base import Base
 from telliot_feeds.datafeed import DataFeed
 from telliot_feeds.datasource import DataSource
-from telliot_feeds.feeds import CATALOG_FEEDS
-from telliot_feeds.feeds import DATAFEED_BUILDER_MAPPING
-from telliot_feeds.queries.abi_query import AbiQuery
-from telliot_feeds.queries.json_query import JsonQuery
 from telliot_feeds.queries.query import OracleQuery
-from telliot_feeds.queries.query_catalog import query_catalog
 from web3 import Web3
 from web3._utils.events import get_event_data
-from web3.exceptions import ExtraDataLengthError
-from web3.middleware import geth_poa_middleware
 from web3.types import LogReceipt
 
 from disputable_values_monitor import ALWAYS_ALERT_QUERY_TYPES
 from disputable_values_monitor import NEW_REPORT_ABI
+from disputable_values_monitor import TOKEN_CONTRACT_ADDRESSES
+from disputable_values_monitor.blocks import block_index
+from disputable_values_monitor.cache import TrustedValueCache
+from disputable_values_monitor.checkpoints import CursorStore
+from disputable_values_monitor.checkpoints import stream_key
+from disputable_values_monitor.checkpoints import StreamKey
 from disputable_values_monitor.discord import send_discord_msg
+from disputable_values_monitor.endpoints import endpoint_pool
+from disputable_values_monitor.logs import log_fetcher
+from disputable_values_monitor.logs import LogFilterPlan
+from disputable_values_monitor.logs import RangeTooLargeError
+from disputable_values_monitor.metrics import events_fetched
+from disputable_values_monitor.metrics import events_parsed
+from disputable_values_monitor.metrics import parse_failures
+from disputable_values_monitor.metrics import trusted_value_latency
+from disputable_values_monitor.multicall import multicall_reader
+from disputable_values_monitor.query_data import query_data_cache
 from disputable_values_monitor.utils import are_all_attributes_none
 from disputable_values_monitor.utils import disputable_str
 from disputable_values_monitor.utils import get_logger
 from disputable_values_monitor.utils import get_tx_explorer_url
 from disputable_values_monitor.utils import NewReport
+from disputable_values_monitor.utils import Topics
 
 logger = get_logger(__name__)
 
@@ -50,7 +65,7 @@ class Metrics(Enum):
     Range = "range"
 
 
-start_block: Dict[int, int] = {}
+REORG_BLOCKS = 10  # number of already scanned blocks fetched again to account for reorgs
 
 
 @dataclass
@@ -93,11 +108,30 @@ Reportable = Union[str, bytes, float, int, tuple[Any], None]
 class MonitoredFeed(Base):
     feed: DataFeed[Any]
     threshold: Threshold
+    # seconds a trusted value of the feed is reused for, None for the cache default
+    ttl: Optional[float] = None
+
+    async def fetch_trusted_value(self, trusted_values: Optional[TrustedValueCache], *args: Any) -> Any:
+        """Fetch the trusted value of the feed, reusing a recently fetched one if there's a cache."""
+        if trusted_values is None:
+            return await general_fetch_new_datapoint(self.feed, *args)
+        try:
+            key = (HexBytes(self.feed.query.query_id).hex(), args)
+        except Exception:
+            # generic feeds without query parameters can't be cached
+            return await general_fetch_new_datapoint(self.feed, *args)
+        return await trusted_values.get(
+            key,
+            lambda: general_fetch_new_datapoint(self.feed, *args),
+            ttl=self.ttl,
+            is_valid=lambda datapoint: datapoint is not None and datapoint[0] is not None,
+        )
 
     async def is_disputable(
         self,
         cfg: TelliotConfig,
         reported_val: Reportable,
+        trusted_values: Optional[TrustedValueCache] = None,
     ) -> Optional[bool]:
         """Check if the reported value is disputable."""
         if reported_val is None:
@@ -113,9 +147,10 @@ class MonitoredFeed(Base):
             reported_val = HexBytes(reported_val[0])
             cfg.main.chain_id = self.feed.query.chainId
 
-            block_number = get_block_number_at_timestamp(cfg, block_timestamp)
+            # the block search makes blocking RPC calls
+            block_number = await asyncio.to_thread(get_block_number_at_timestamp, cfg, block_timestamp)
 
-            trusted_val, _ = await general_fetch_new_datapoint(self.feed, block_number)
+            trusted_val, _ = await self.fetch_trusted_value(trusted_values, block_number)
             if not isinstance(trusted_val, tuple):
                 logger.warning(f"Bad value response for EVMCall: {trusted_val}")
                 return None
@@ -126,7 +161,7 @@ class MonitoredFeed(Base):
             trusted_val = HexBytes(trusted_val[0])
 
         else:
-            trusted_val, _ = await general_fetch_new_datapoint(self.feed)
+            trusted_val, _ = await self.fetch_trusted_value(trusted_values)
 
             if trusted_val is None:
                 logger.warning(f"trusted val was {trusted_val}")
@@ -188,9 +223,50 @@ class MonitoredFeed(Base):
             return None
 
 
+@dataclass
+class FeedIndex:
+    """Monitored feeds by query id, and generic feeds (without query parameters) by query type."""
+
+    by_query_id: Dict[str, MonitoredFeed] = field(default_factory=dict)
+    by_query_type: Dict[str, MonitoredFeed] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, monitored_feeds: Iterable[MonitoredFeed]) -> "FeedIndex":
+        """Index monitored feeds; a later feed for the same query id or type replaces an earlier one."""
+        index = cls()
+        for mf in monitored_feeds:
+            if are_all_attributes_none(mf.feed.query):
+                index.by_query_type[get_query_type(mf.feed.query)] = mf
+                continue
+            try:
+                query_id = HexBytes(mf.feed.query.query_id).hex()
+            except Exception as e:
+                logger.error(f"Error while assembling query id for {mf.feed.query.descriptor}: {e}")
+                continue
+            index.by_query_id[query_id] = mf
+        return index
+
+    def get(self, query_id: str, query_type: str) -> Optional[MonitoredFeed]:
+        """Monitored feed of a query id (0x prefixed), falling back to the generic feed of its query type."""
+        mf = self.by_query_id.get(query_id.lower())
+        if mf is None:
+            mf = self.by_query_type.get(query_type)
+        return mf
+
+
 async def general_fetch_new_datapoint(feed: DataFeed, *args: Any) -> Optional[Any]:
-    """Fetch a new datapoint from a datafeed."""
-    return await feed.source.fetch_new_datapoint(*args)
+    """Fetch a new datapoint from a datafeed.
+
+    Many sources make blocking requests inside their coroutines, so the fetch
+    runs in its own event loop in a thread, letting other reports and chains
+    carry on meanwhile."""
+    with trusted_value_latency.time(source=type(feed.source).__name__):
+        return await asyncio.to_thread(fetch_in_thread, feed, *args)
+
+
+def fetch_in_thread(feed: DataFeed, *args: Any) -> Optional[Any]:
+    """Fetch a new datapoint from a datafeed, blocking until it's in."""
+    return asyncio.run(feed.source.fetch_new_datapoint(*args))
 
 
 def get_contract_info(chain_id: int, name: str) -> Tuple[Optional[str], Optional[str]]:
@@ -219,17 +295,13 @@ def get_contract(cfg: TelliotConfig, account: ChainedAccount, name: str) -> Opti
         logger.error(f"Could not find contract {name} on chain_id {chain_id}")
         return None
 
-    c = Contract(addr, abi, cfg.get_endpoint(), account)
+    endpoint = endpoint_pool.get(cfg, chain_id)
 
-    try:
-        connected_to_node = cfg.get_endpoint().connect()
-    except (ValueError, ConnectionError) as e:
-        logger.error(f"Could not connect to endpoint {cfg.get_endpoint()} for chain_id {chain_id}: " + str(e))
+    if endpoint is None:
+        logger.error(f"Could not connect to an endpoint for chain_id {chain_id}")
         return None
 
-    if not connected_to_node:
-        logger.error(f"Could not connect to endpoint {cfg.get_endpoint()} for chain_id {chain_id}")
-        return None
+    c = Contract(addr, abi, endpoint, account)
 
     status = c.connect()
 
@@ -246,8 +318,8 @@ def get_query_type(q: OracleQuery) -> str:
 
 
 def mk_filter(
-    from_block: int, to_block: Union[str, int], addr: str, topics: list[str]
-) -> dict[str, Union[int, str, list[str]]]:
+    from_block: int, to_block: Union[str, int], addr: Union[str, list[str]], topics: list[Any]
+) -> dict[str, Any]:
     """Create a dict with the given parameters."""
     return {
         "fromBlock": from_block,
@@ -257,27 +329,57 @@ def mk_filter(
     }
 
 
+def plan_stream_keys(plan: LogFilterPlan) -> List[StreamKey]:
+    """Cursor keys of the (address, topic) streams of a filter plan."""
+    return [stream_key(plan.chain_id, address, [topic]) for address, topic in plan.targets]
+
+
 async def log_loop(
-    web3: Web3, chain_id: int, addr: str, topics: list[str], inital_block_offset: int
+    web3: Web3,
+    plan: LogFilterPlan,
+    inital_block_offset: int,
+    cursors: CursorStore,
+    fetch_logs: Optional[Callable[[Dict[str, Any]], Awaitable[List[LogReceipt]]]] = None,
 ) -> list[tuple[int, Any]]:
-    """Generate a list of recent events from a contract."""
+    """Generate a list of recent events from the contracts of a filter plan.
+
+    Scanning resumes from the oldest cursor of the plan's (address, topic)
+    streams; the new cursors are staged and have to be committed once the
+    events were handled. Logs are fetched from web3 unless a fetch_logs
+    function is given."""
+    chain_id = plan.chain_id
     try:
-        block_number = web3.eth.get_block_number()
+        block_number = await asyncio.to_thread(web3.eth.get_block_number)
     except Exception as e:
         if "server rejected" in str(e):
             logger.info(f"Attempted to connect to deprecated infura network. Please check configs! {e}")
         else:
             logger.warning(f"unable to retrieve latest block number from chain_id {chain_id}: {e}")
         return []
-    from_block = start_block.get(chain_id, block_number - inital_block_offset)
-    from_block -= 10  # go back 10 more blocks to account for reorgs
-    event_filter = mk_filter(from_block, block_number, addr, topics)
+    multicall_reader.observe_head(chain_id, block_number)
+    keys = plan_stream_keys(plan)
+    from_blocks = []
+    for key in keys:
+        cursor = cursors.get(key)
+        if cursor is not None and cursor > block_number:
+            logger.warning(f"saved block {cursor} is ahead of chain_id {chain_id} head {block_number}, rescanning")
+            cursors.reset(key)
+            cursor = None
+        from_blocks.append(cursor if cursor is not None else block_number - inital_block_offset)
+    from_block = min(from_blocks)
+    from_block -= REORG_BLOCKS  # go back 10 more blocks to account for reorgs
+    event_filter = mk_filter(from_block, block_number, plan.addresses, plan.topics)
 
     try:
-        events = web3.eth.get_logs(event_filter)  # type: ignore
+        if fetch_logs is None:
+            events = await log_fetcher.get_logs(web3, event_filter)
+        else:
+            events = await fetch_logs(event_filter)
     except Exception as e:
         msg = str(e)
-        if "unknown block" in msg:
+        if isinstance(e, RangeTooLargeError):
+            logger.error(f"unable to gather eth event logs on chain_id {chain_id}: {msg}")
+        elif "unknown block" in msg:
             logger.error(f"waiting for new blocks on chain_id {chain_id}")
         elif "request failed or timed out" in msg:
             logger.error(f"request for eth event logs failed on chain_id {chain_id}")
@@ -287,98 +389,80 @@ async def log_loop(
             logger.error(f"unknown RPC error gathering eth event logs on chain_id {chain_id}\n {msg}")
         return []
 
-    unique_events_list = []
-    for event in events:
-        if (chain_id, event) not in unique_events_list:
-            unique_events_list.append((chain_id, event))
-    start_block[chain_id] = block_number
-    return unique_events_list
-
-
-async def chain_events(
-    cfg: TelliotConfig, chain_addy: dict[int, str], topics: list[list[str]], inital_block_offset: int
-) -> List[List[tuple[int, Any]]]:
-    """"""
-    events_loop = []
-    for topic in topics:
-        for chain_id, address in chain_addy.items():
-            try:
-                endpoint = cfg.endpoints.find(chain_id=chain_id)[0]
-                if endpoint.url.endswith("{INFURA_API_KEY}"):
-                    continue
-                endpoint.connect()
-                w3 = endpoint.web3
-            except (IndexError, ValueError) as e:
-                logger.error(f"Unable to connect to endpoint on chain_id {chain_id}: {e}")
-                continue
-            events_loop.append(log_loop(w3, chain_id, address, topic, inital_block_offset))
-    events: List[List[tuple[int, Any]]] = await asyncio.gather(*events_loop)
+    for key in keys:
+        cursors.stage(key, block_number)
+    events = plan.route(events)
+    events_fetched.inc(len(events), chain_id=chain_id)
+    return [(chain_id, event) for event in events]
 
-    return events
 
+async def get_chain_events(
+    cfg: TelliotConfig, chain_id: int, inital_block_offset: int, cursors: CursorStore
+) -> List[tuple[int, Any]]:
+    """Get new NewReport and oracle address events from a single chain"""
 
-async def get_events(
-    cfg: TelliotConfig, contract_name: str, topics: list[str], inital_block_offset: int
-) -> List[List[tuple[int, Any]]]:
-    """Get all events from all live Tellor networks"""
+    endpoint = endpoint_pool.get(cfg, chain_id)
+    if endpoint is None:
+        logger.warning(f"unable to connect to an endpoint for chain_id {chain_id}")
+        return []
 
-    log_loops = []
+    w3 = endpoint.web3
+    if not w3:
+        return []
 
-    for endpoint in cfg.endpoints.endpoints:
-        if endpoint.url.endswith("{INFURA_API_KEY}"):
-            continue
-        chain_id = endpoint.chain_id
-        try:
-            endpoint.connect()
-        except Exception as e:
-            logger.warning(f"unable to connect to endpoint for chain_id {chain_id}: {e}")
-            continue
+    plan = plan_chain_filter(chain_id)
+    if not plan.targets:
+        return []
 
-        w3 = endpoint.web3
+    async def fetch_logs(event_filter: Dict[str, Any]) -> List[LogReceipt]:
+        """Fetch logs from the healthiest endpoint, failing over (or hedging) to the others."""
 
-        if not w3:
-            continue
+        return await endpoint_pool.call(
+            cfg, chain_id, lambda web3: log_fetcher.get_logs(web3, event_filter), hedge=True
+        )
 
-        addr, _ = get_contract_info(chain_id, contract_name)
+    return await log_loop(w3, plan, inital_block_offset, cursors, fetch_logs=fetch_logs)
 
-        if not addr:
-            continue
 
-        log_loops.append(log_loop(w3, chain_id, addr, topics, inital_block_offset))
+def plan_chain_filter(chain_id: int) -> LogFilterPlan:
+    """Every contract and event the monitor fetches logs for on a chain"""
+    plan = LogFilterPlan(chain_id)
+    for contract_name in ("tellor360-oracle", "tellorflex-oracle"):
+        addr, _ = get_contract_info(chain_id, contract_name)
+        if addr:
+            plan.add(addr, Topics.NEW_REPORT)
 
-    events_lists: List[List[tuple[int, Any]]] = await asyncio.gather(*log_loops)
+    token_addr = TOKEN_CONTRACT_ADDRESSES.get(chain_id)
+    if token_addr:
+        plan.add(token_addr, Topics.NEW_ORACLE_ADDRESS)
+        plan.add(token_addr, Topics.NEW_PROPOSED_ORACLE_ADDRESS)
 
-    return events_lists
+    return plan
 
 
-def get_query_from_data(query_data: bytes) -> Optional[Union[AbiQuery, JsonQuery]]:
-    for q_type in (JsonQuery, AbiQuery):
-        try:
-            return q_type.get_query_from_data(query_data)
-        except ValueError:
-            pass
-    return None
+def get_query_from_data(query_data: bytes) -> Optional[OracleQuery]:
+    """Recreate the query of a queryData field"""
+    return query_data_cache.decode(query_data).query
 
 
 def get_source_from_data(query_data: bytes) -> Optional[DataSource]:
     """Recreate data source using query type thats decoded from query data field"""
-    try:
-        query_type, encoded_param_values = eth_abi.decode(["string", "bytes"], query_data)
-    except OverflowError:
-        logger.error("OverflowError while decoding query data.")
+    # imported on first use, loading the feeds imports every telliot data source
+    from telliot_feeds.feeds import DATAFEED_BUILDER_MAPPING
+
+    decoded = query_data_cache.decode(query_data)
+    if decoded.params is None or decoded.query_type is None:
+        # the reason was logged when the query data was first decoded
         return None
-    try:
-        cls = Registry.registry[query_type]
-    except KeyError:
-        logger.error(f"Unsupported query type: {query_type}")
+
+    template = DATAFEED_BUILDER_MAPPING.get(decoded.query_type)
+    if template is None:
+        logger.error(f"No data source for query type: {decoded.query_type}")
         return None
-    params_abi = cls.abi
-    param_names = [p["name"] for p in params_abi]
-    param_types = [p["type"] for p in params_abi]
-    param_values = eth_abi.decode(param_types, encoded_param_values)
 
-    source = DATAFEED_BUILDER_MAPPING[query_type].source
-    for key, value in zip(param_names, param_values):
+    # copy the template source so concurrently evaluated reports don't share query parameters
+    source = copy.copy(template.source)
+    for key, value in decoded.params:
         setattr(source, key, value)
     return source
 
@@ -389,25 +473,25 @@ async def parse_new_report_event(
     confidence_threshold: float,
     monitored_feeds: List[MonitoredFeed],
     see_all_values: bool = False,
+    trusted_values: Optional[TrustedValueCache] = None,
+    feed_index: Optional[FeedIndex] = None,
 ) -> Optional[NewReport]:
-    """Parse a NewReport event."""
+    """Parse a NewReport event.
+
+    Pass the index of the monitored feeds to skip indexing them for every event."""
+    from telliot_feeds.queries.query_catalog import query_catalog
 
     chain_id = cfg.main.chain_id
-    endpoint = cfg.endpoints.find(chain_id=chain_id)[0]
+    endpoint = endpoint_pool.get(cfg, chain_id)
 
-    new_report = NewReport()
+    new_report = NewReport(detected_at=time.time())
 
     if not endpoint:
         logger.error(f"Unable to find a suitable endpoint for chain_id {chain_id}")
+        parse_failures.inc(chain_id=chain_id, reason="endpoint")
         return None
     else:
-
-        try:
-            endpoint.connect()
-            w3 = endpoint.web3
-        except ValueError as e:
-            logger.error(f"Unable to connect to endpoint on chain_id {chain_id}: {e}")
-            return None
+        w3 = endpoint.web3
 
         codec = w3.codec
         event_data = get_event_data(codec, NEW_REPORT_ABI, log)
@@ -415,10 +499,15 @@ async def parse_new_report_event(
     q = get_query_from_data(event_data.args._queryData)
 
     if q is None:
-        logger.error(f"Unable to form query from queryData of query type {new_report.query_type}")
+        # the query data cache logged why when it first saw the blob
+        logger.debug(f"Unable to form query from queryData of report {event_data.transactionHash.hex()}")
+        parse_failures.inc(chain_id=chain_id, reason="query_data")
         return None
 
+    events_parsed.inc(chain_id=chain_id)
+
     new_report.tx_hash = event_data.transactionHash.hex()
+    new_report.log_index = event_data.logIndex
     new_report.chain_id = chain_id
     new_report.query_id = "0x" + event_data.args._queryId.hex()
     new_report.query_type = get_query_type(q)
@@ -438,42 +527,41 @@ async def parse_new_report_event(
 
     # if query of event matches a query type of the monitored feeds, fill the query parameters
 
+    if feed_index is None:
+        feed_index = FeedIndex.build(monitored_feeds)
+
     monitored_feed = None
+    mf = feed_index.by_query_id.get(new_report.query_id)
 
-    for mf in monitored_feeds:
-        try:
-            feed_qid = HexBytes(mf.feed.query.query_id).hex()
-        except Exception as e:
-            logger.error(f"Error while assembling query id for {mf.feed.query.descriptor}: {e}")
-            feed_qid = None
-
-        if feed_qid is None:
-            if get_query_type(mf.feed.query) == new_report.query_type:
-                # for generic queries the query params are None
-                if are_all_attributes_none(mf.feed.query):
-                    source = get_source_from_data(event_data.args._queryData)
-                    if source is None:
-                        logger.error(f"Unable to form source from queryData of query type {new_report.query_type}")
-                        return None
-                    mf.feed = DataFeed(query=q, source=source)
-                    monitored_feed = mf
-
-        if feed_qid == new_report.query_id:
-            if new_report.query_type == "SpotPrice":
-                catalog_entry = query_catalog.find(query_id=new_report.query_id)
-                mf.feed = get_feed_from_catalog(catalog_entry[0].tag)
+    if mf is not None:
+        if new_report.query_type == "SpotPrice":
+            catalog_entry = query_catalog.find(query_id=new_report.query_id)
+            feed = get_feed_from_catalog(catalog_entry[0].tag)
 
-            else:
+        else:
 
-                source = get_source_from_data(event_data.args._queryData)
+            source = get_source_from_data(event_data.args._queryData)
 
-                if source is None:
-                    logger.error(f"Unable to form source from queryData of query type {new_report.query_type}")
-                    return None
+            if source is None:
+                logger.error(f"Unable to form source from queryData of query type {new_report.query_type}")
+                parse_failures.inc(chain_id=chain_id, reason="source")
+                return None
 
-                mf.feed = DataFeed(query=q, source=source)
+            feed = DataFeed(query=q, source=source)
 
-            monitored_feed = mf
+        # the monitored feeds are shared by all reports, so fill in a copy
+        monitored_feed = replace(mf, feed=feed)
+
+    else:
+        mf = feed_index.by_query_type.get(new_report.query_type)
+        # for generic queries the query params are None
+        if mf is not None:
+            source = get_source_from_data(event_data.args._queryData)
+            if source is None:
+                logger.error(f"Unable to form source from queryData of query type {new_report.query_type}")
+                parse_failures.inc(chain_id=chain_id, reason="source")
+                return None
+            monitored_feed = replace(mf, feed=DataFeed(query=q, source=source))
 
     if new_report.query_type in ALWAYS_ALERT_QUERY_TYPES:
         new_report.status_str = "❗❗❗❗ VERY IMPORTANT DATA SUBMISSION ❗❗❗❗"
@@ -494,6 +582,7 @@ async def parse_new_report_event(
             feed = get_feed_from_catalog(tag)
             if feed is None:
                 logger.error(f"Unable to find feed for tag {tag}")
+                parse_failures.inc(chain_id=chain_id, reason="feed")
                 return None
         else:
             # have to check if feed's source supports generic queries and isn't a manual source
@@ -509,13 +598,15 @@ async def parse_new_report_event(
 
             if new_report.query_type not in auto_types:
                 logger.debug(f"Query type {new_report.query_type} doesn't have an auto source to compare value")
+                parse_failures.inc(chain_id=chain_id, reason="unsupported_query_type")
                 return None
             feed = DataFeed(query=q, source=get_source_from_data(event_data.args._queryData))
 
         monitored_feed = MonitoredFeed(feed, threshold)
 
-    disputable = await monitored_feed.is_disputable(cfg, new_report.value)
+    disputable = await monitored_feed.is_disputable(cfg, new_report.value, trusted_values)
     if disputable is None:
+        parse_failures.inc(chain_id=chain_id, reason="unable_to_check")
 
         if see_all_values:
 
@@ -534,49 +625,17 @@ async def parse_new_report_event(
 
 
 def get_block_number_at_timestamp(cfg: TelliotConfig, timestamp: int) -> Any:
+    """Number of the block mined at timestamp, or of the last block before it"""
 
-    try:
-        endpoint = cfg.get_endpoint()
-        endpoint.connect()
-    except ValueError as e:
-        logger.error(f"Unable to connect to endpoint on chain_id {cfg.main.chain_id}: {e}")
+    endpoint = endpoint_pool.get(cfg, cfg.main.chain_id)
+    if endpoint is None:
+        logger.error(f"Unable to connect to an endpoint on chain_id {cfg.main.chain_id}")
         return None
 
-    w3 = endpoint.web3
-
-    current_block = w3.eth.block_number
-    start_block = 0
-    end_block = current_block
-
-    while start_block <= end_block:
-        midpoint = math.floor((start_block + end_block) / 2)
-        # for poa chains get_block method throws an error if poa middleware is not injected
-        try:
-            block = w3.eth.get_block(midpoint)
-        except ExtraDataLengthError:
-            w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-            block = w3.eth.get_block(midpoint)
-
-        if block.timestamp == timestamp:
-            return midpoint
-        elif block.timestamp < timestamp:
-            start_block = midpoint + 1
-        else:
-            end_block = midpoint - 1
-
-    # If we haven't found an exact match, interpolate between adjacent blocks
-    block_a = w3.eth.get_block(end_block)
-    block_b = w3.eth.get_block(start_block)
-
-    block_delta = block_b.number - block_a.number
-    timestamp_delta = block_b.timestamp - block_a.timestamp
-    target_delta = timestamp - block_a.timestamp
-
-    estimated_block_delta = target_delta * block_delta / timestamp_delta
-    estimated_block_number = block_a.number + estimated_block_delta
-
-    return int(estimated_block_number)
+    return block_index.find_block(endpoint.web3, cfg.main.chain_id, timestamp)
 
 
 def get_feed_from_catalog(tag: str) -> Optional[DataFeed]:
+    from telliot_feeds.feeds import CATALOG_FEEDS
+
     return CATALOG_FEEDS.get(tag)
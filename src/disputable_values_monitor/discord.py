@@ -1,11 +1,30 @@
 """Send text messages using Twilio."""
+import asyncio
 import os
+from contextvars import ContextVar
 from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
 
 import click
 from discordwebhook import Discord
 
 from disputable_values_monitor import ALWAYS_ALERT_QUERY_TYPES
+from disputable_values_monitor.metrics import alert_queue_depth
+from disputable_values_monitor.metrics import alerts_sent
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+ALERT_QUEUE_SIZE = 100  # alerts waiting per webhook before the oldest are dropped
+ALERT_MAX_ATTEMPTS = 5  # attempts to deliver an alert before giving up on it
+ALERT_RETRY_BACKOFF = 1.0  # seconds before the first retry, doubled on each retry
+ALERT_MAX_RETRY_WAIT = 60.0  # longest wait between attempts, in seconds
+
+# while set, alerts are handed to this function instead of Discord, e.g. by a dry-run replay
+alert_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("alert_sink", default=None)
 
 
 def generic_alert(msg: str) -> None:
@@ -72,10 +91,151 @@ def generate_alert_msg(disputable: bool, link: str) -> str:
         return f"\n❗NEW VALUE❗\n{link}"
 
 
+def webhook_urls() -> List[str]:
+    """Discord webhook urls set in the environment."""
+    urls = [os.getenv(f"DISCORD_WEBHOOK_URL_{i}") for i in (1, 2, 3)]
+    return [url for url in urls if url]
+
+
+def retry_after(response: Any) -> Optional[float]:
+    """Seconds Discord asked to wait before posting to a webhook again, if it did."""
+    if response.status_code == 429:
+        try:
+            return float(response.json()["retry_after"])
+        except Exception:
+            return float(response.headers.get("Retry-After", ALERT_RETRY_BACKOFF))
+    # the request went through but the webhook's rate limit bucket is now empty
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return float(response.headers.get("X-RateLimit-Reset-After", 0))
+    return None
+
+
+class AlertDispatcher:
+    """Deliver Discord alerts in the background.
+
+    Each webhook gets a bounded queue and a worker posting its alerts in
+    order, so queuing an alert never waits on Discord. A worker sleeps for
+    as long as Discord's rate limit asks and retries failed posts with
+    exponential backoff. When a webhook falls behind by more than
+    ALERT_QUEUE_SIZE alerts, its oldest alerts are dropped.
+    """
+
+    def __init__(self, queue_size: int = ALERT_QUEUE_SIZE, max_attempts: int = ALERT_MAX_ATTEMPTS) -> None:
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[str, "asyncio.Queue[str]"] = {}
+        self._workers: List["asyncio.Task[None]"] = []
+
+    @property
+    def running(self) -> bool:
+        """Whether alerts are being dispatched in the background."""
+        return self._loop is not None and not self._loop.is_closed()
+
+    def start(self, urls: List[str]) -> None:
+        """Start a worker for each webhook url on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        for url in urls:
+            if url in self._queues:
+                continue
+            queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=self.queue_size)
+            self._queues[url] = queue
+            self._workers.append(asyncio.create_task(self._work(Discord(url=url), queue)))
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Give the workers up to timeout seconds to deliver queued alerts, then stop them."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"stopping with {self.depth} undelivered alerts")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._loop = None
+        self._queues = {}
+        self._workers = []
+        alert_queue_depth.set(0)
+
+    def send(self, content: str) -> None:
+        """Queue an alert for every webhook; safe to call from any thread."""
+        if self._loop is None:
+            raise RuntimeError("alert dispatcher is not running")
+        try:
+            running_loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._enqueue(content)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, content)
+
+    @property
+    def depth(self) -> int:
+        """Alerts waiting to be delivered, over all webhooks."""
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def _enqueue(self, content: str) -> None:
+        for url, queue in self._queues.items():
+            if queue.full():
+                queue.get_nowait()
+                queue.task_done()
+                self.dropped += 1
+                logger.warning(f"too many undelivered alerts, dropped the oldest one for webhook {url[:40]}...")
+            queue.put_nowait(content)
+        alert_queue_depth.set(self.depth)
+
+    async def _work(self, bot: Discord, queue: "asyncio.Queue[str]") -> None:
+        while True:
+            content = await queue.get()
+            alert_queue_depth.set(self.depth)
+            try:
+                await self._deliver(bot, content)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, bot: Discord, content: str) -> None:
+        """Post an alert, waiting out rate limits and retrying failures."""
+        backoff = ALERT_RETRY_BACKOFF
+        for attempt in range(1, self.max_attempts + 1):
+            wait = None
+            try:
+                response = await asyncio.to_thread(bot.post, content=content)
+                wait = retry_after(response)
+                if response.ok:
+                    self.sent += 1
+                    if wait:
+                        await asyncio.sleep(min(wait, ALERT_MAX_RETRY_WAIT))
+                    return
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error(f"Discord rejected alert with status {response.status_code}: {response.text}")
+                    return
+                logger.warning(f"Discord alert attempt {attempt} failed with status {response.status_code}")
+            except Exception as e:
+                logger.warning(f"Discord alert attempt {attempt} failed: {e}")
+            if attempt < self.max_attempts:
+                await asyncio.sleep(min(wait if wait is not None else backoff, ALERT_MAX_RETRY_WAIT))
+                backoff *= 2
+        self.dropped += 1
+        logger.error(f"giving up on Discord alert after {self.max_attempts} attempts")
+
+
+alert_dispatcher = AlertDispatcher()
+
+
 def send_discord_msg(msg: str) -> None:
     """Send Discord alert."""
     MONITOR_NAME = os.getenv("MONITOR_NAME")
     message = f"❗{MONITOR_NAME} Found Something❗\n"
+    sink = alert_sink.get()
+    if sink is not None:
+        sink(message + msg)
+        return
+    alerts_sent.inc()
+    if alert_dispatcher.running:
+        alert_dispatcher.send(message + msg)
+        return
     get_alert_bot_1().post(content=message + msg)
     try:
         get_alert_bot_2().post(content=message + msg)
@@ -1,19 +1,80 @@
 """Utilities for the auto-disputer on Tellor on any EVM network"""
+import asyncio
+import time
+from decimal import Decimal
+from typing import Any
+from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import Union
 
 from chained_accounts import ChainedAccount
 from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_core.contract.contract import Contract
+from telliot_core.utils.response import ResponseStatus
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 
+from disputable_values_monitor.allowances import allowance_tracker
+from disputable_values_monitor.allowances import APPROVAL_FEES
 from disputable_values_monitor.config import AutoDisputerConfig
-from disputable_values_monitor.data import get_contract
+from disputable_values_monitor.contracts import contract_registry
+from disputable_values_monitor.endpoints import endpoint_pool
+from disputable_values_monitor.metrics import dispute_latency
+from disputable_values_monitor.multicall import ContractRead
+from disputable_values_monitor.multicall import encode_call
+from disputable_values_monitor.multicall import multicall_reader
+from disputable_values_monitor.multicall import ReadResult
+from disputable_values_monitor.nonces import nonce_manager
 from disputable_values_monitor.utils import get_logger
 from disputable_values_monitor.utils import NewReport
 
 logger = get_logger(__name__)
 
 
+def meant_to_dispute(disp_cfg: AutoDisputerConfig, new_report: NewReport) -> bool:
+    """Check if a report is of one of the monitored feeds, the ones auto-disputed."""
+    return disp_cfg.feed_index.get(new_report.query_id, new_report.query_type) is not None
+
+
+async def next_nonce(w3: Web3, chain_id: int, address: str) -> Optional[int]:
+    """Nonce of the account's next transaction, or None if it can't be read from the node."""
+    try:
+        return await nonce_manager.allocate(w3, chain_id, address)
+    except Exception as e:
+        logger.error(f"Unable to dispute on chain_id {chain_id}: could not retrieve account nonce: {e}")
+        return None
+
+
+async def gas_price(w3: Web3, chain_id: int) -> Optional[Union[int, Decimal]]:
+    """Gas price in gwei, or None if it can't be read from the node."""
+    try:
+        price = await asyncio.to_thread(lambda: w3.eth.gas_price)
+    except Exception as e:
+        logger.error(f"Unable to dispute on chain_id {chain_id}: could not retrieve gas price: {e}")
+        return None
+    return Web3.from_wei(price, "gwei")
+
+
+def send_and_wait(contract: Contract, func_name: str, **kwargs: Any) -> Tuple[Any, ResponseStatus]:
+    """Sign and send a transaction, then wait for its receipt.
+
+    Contract.write blocks until the transaction is mined, so run this in a thread."""
+    result: Tuple[Any, ResponseStatus] = asyncio.run(contract.write(func_name, **kwargs))
+    return result
+
+
+async def send_transaction(contract: Contract, func_name: str, **kwargs: Any) -> Tuple[Any, ResponseStatus]:
+    """Send a transaction and wait for its receipt without blocking the event loop.
+
+    Errors are returned in the status like Contract.write does, so the caller releases the nonce either way."""
+    try:
+        result: Tuple[Any, ResponseStatus] = await asyncio.to_thread(send_and_wait, contract, func_name, **kwargs)
+    except Exception as e:
+        return None, ResponseStatus(ok=False, e=e, error=f"unable to send {func_name} transaction: {e}")
+    return result
+
+
 async def dispute(
     cfg: TelliotConfig, disp_cfg: AutoDisputerConfig, account: Optional[ChainedAccount], new_report: NewReport
 ) -> str:
@@ -23,17 +84,7 @@ async def dispute(
         logger.info("Currently not auto-dispuing on any feeds. See ./disputer-config.yaml")
         return ""
 
-    disputable_query_ids = []
-    for feed in disp_cfg.monitored_feeds:
-        try:
-            disputable_query_id = feed.feed.query.query_id.hex()
-        except Exception:
-            pass
-        disputable_query_ids.append(disputable_query_id)
-
-    meant_to_dispute = new_report.query_id[2:] in disputable_query_ids
-
-    if not meant_to_dispute:
+    if not meant_to_dispute(disp_cfg, new_report):
         logger.info(
             f"Found disputable new report on chain_id {new_report.chain_id}"
             " outside selected Monitored Feeds, skipping dispute"
@@ -46,20 +97,13 @@ async def dispute(
 
     cfg.main.chain_id = new_report.chain_id
 
-    try:
-        endpoint = cfg.get_endpoint()
-    except ValueError:
-        logger.error(f"Unable to dispute: can't find an endpoint on chain id {new_report.chain_id}")
+    endpoint = endpoint_pool.get(cfg, new_report.chain_id)
+    if endpoint is None:
+        logger.error(f"Unable to dispute: can't connect to an endpoint on chain id {new_report.chain_id}")
         return ""
 
-    try:
-        endpoint.connect()
-    except ValueError:
-        logger.error(f"Unable to dispute: can't connect to endpoint on chain id {new_report.chain_id}")
-        return ""
-    w3 = endpoint.web3
-    token = get_contract(cfg, name="trb-token", account=account)
-    governance = get_contract(cfg, name="tellor-governance", account=account)
+    token = contract_registry.get(cfg, name="trb-token", account=account)
+    governance = contract_registry.get(cfg, name="tellor-governance", account=account)
 
     if token is None:
         logger.error(f"Unable to find token contract on chain_id {new_report.chain_id}")
@@ -69,8 +113,12 @@ async def dispute(
         logger.error(f"Unable to find governance contract on chain_id {new_report.chain_id}")
         return ""
 
-    # read balance of user and log it
-    user_token_balance, status = await token.read("balanceOf", Web3.to_checksum_address(account.address))
+    # the handles are connected to the chain's endpoint
+    w3 = token.node.web3
+
+    # read balance of user along with the dispute fee, at the latest block as an earlier dispute may have changed them
+    balance_read = ContractRead(token, "balanceOf", (Web3.to_checksum_address(account.address),))
+    dispute_fee, [(user_token_balance, status)] = await read_dispute_fee(cfg, new_report, balance_read, latest=True)
 
     if not status.ok:
         logger.error("Unable to retrieve Disputer account balance")
@@ -78,8 +126,6 @@ async def dispute(
 
     logger.info(f"Disputer ({account.address}) balance on chain_id {new_report.chain_id}: " + str(user_token_balance))
 
-    dispute_fee = await get_dispute_fee(cfg, new_report)
-
     if dispute_fee is None:
         logger.error(f"Unable to calculate Dispute Fee from contracts on chain_id {new_report.chain_id}")
         return ""
@@ -93,51 +139,100 @@ async def dispute(
         )
         return ""
 
-    try:
-        acc_nonce = w3.eth.get_transaction_count(Web3.to_checksum_address(account.address))
-    except Exception as e:
-        logger.error(f"Unable to dispute on chain_id {new_report.chain_id}: could not retrieve account nonce: {e}")
-        return ""
+    allowance_key = allowance_tracker.key(new_report.chain_id, account.address, governance.address)
+
+    # concurrent disputes from the account check and approve the allowance one at a time
+    async with allowance_tracker.lock(allowance_key):
+        allowance = await allowance_tracker.get(token, allowance_key)
+
+        if allowance is None:
+            return ""
+
+        if allowance_tracker.needs_approval(allowance, dispute_fee):
+            price = await gas_price(w3, new_report.chain_id)
+            if price is None:
+                return ""
+
+            acc_nonce = await next_nonce(w3, new_report.chain_id, account.address)
+            if acc_nonce is None:
+                return ""
+
+            # write approve(governance contract, disputeFee) and log "token approved" if successful
+            tx_receipt, status = await send_transaction(
+                token,
+                "approve",
+                spender=governance.address,
+                amount=dispute_fee * APPROVAL_FEES,
+                gas_limit=60000,
+                legacy_gas_price=price,
+                acc_nonce=acc_nonce,
+            )
 
-    # write approve(governance contract, disputeFee) and log "token approved" if successful
-    tx_receipt, status = await token.write(
-        "approve",
-        spender=governance.address,
-        amount=dispute_fee * 100,
-        gas_limit=60000,
-        legacy_gas_price=w3.from_wei(w3.eth.gas_price, "gwei"),
-        acc_nonce=acc_nonce,
-    )
+            if not status.ok:
+                logger.error(
+                    f"unable to approve tokens on chain_id {new_report.chain_id} for dispute fee: " + status.error
+                )
+                nonce_manager.failed(new_report.chain_id, account.address, acc_nonce)
+                allowance_tracker.forget(allowance_key)
+                return ""
 
-    if not status.ok:
-        logger.error(f"unable to approve tokens on chain_id {new_report.chain_id} for dispute fee: " + status.error)
-        return ""
+            nonce_manager.sent(new_report.chain_id, account.address, acc_nonce)
+            logger.info("Approval Tx Hash: " + str(tx_receipt.transactionHash.hex()))
+            allowance_tracker.approved(allowance_key, dispute_fee * APPROVAL_FEES)
+        else:
+            logger.info(f"Allowance on chain_id {new_report.chain_id} covers the dispute fee, skipping approval")
 
-    logger.info("Approval Tx Hash: " + str(tx_receipt.transactionHash.hex()))
+        # set the fee aside for this dispute, giving it back if the dispute isn't sent
+        generation = allowance_tracker.spent(allowance_key, dispute_fee)
 
-    begin_dispute_function = governance.contract.get_function_by_name("beginDispute")
-    begin_dispute_tx = begin_dispute_function(
-        _queryId=new_report.query_id,
-        _timestamp=new_report.submission_timestamp,
-    )
+    sent = False
     try:
-        msg = f"Unable to estimate gas usage for dispute on chain_id {new_report.chain_id}:"
-        # Estimate gas usage amount
-        gas_limit: int = begin_dispute_tx.estimate_gas({"from": Web3.to_checksum_address(account.address)})
-    except ContractLogicError as e:
-        logger.error(f"{msg} {e}")
-        return ""
-    except Exception as e:
-        logger.error(f"{msg} {e}")
-        return ""
-    tx_receipt, status = await governance.write(
-        func_name="beginDispute",
-        _queryId=new_report.query_id,
-        _timestamp=new_report.submission_timestamp,
-        gas_limit=int(gas_limit * 1.2),
-        legacy_gas_price=w3.from_wei(w3.eth.gas_price, "gwei"),
-        acc_nonce=acc_nonce + 1,
-    )
+        begin_dispute_tx = {
+            "from": Web3.to_checksum_address(account.address),
+            "to": governance.address,
+            "data": encode_call(
+                ContractRead(governance, "beginDispute", (new_report.query_id, new_report.submission_timestamp))
+            ),
+        }
+        try:
+            msg = f"Unable to estimate gas usage for dispute on chain_id {new_report.chain_id}:"
+            # Estimate gas usage amount on whichever endpoint answers first
+            gas_limit: int = await endpoint_pool.call(
+                cfg,
+                new_report.chain_id,
+                lambda web3: asyncio.to_thread(web3.eth.estimate_gas, begin_dispute_tx),  # type: ignore[arg-type]
+                hedge=True,
+            )
+        except ContractLogicError as e:
+            logger.error(f"{msg} {e}")
+            return ""
+        except Exception as e:
+            logger.error(f"{msg} {e}")
+            return ""
+
+        price = await gas_price(w3, new_report.chain_id)
+        if price is None:
+            return ""
+
+        acc_nonce = await next_nonce(w3, new_report.chain_id, account.address)
+        if acc_nonce is None:
+            return ""
+
+        # the fee may be transferred from here on
+        sent = True
+        # waits for the receipt in a thread, so other reports and chains carry on meanwhile
+        tx_receipt, status = await send_transaction(
+            governance,
+            "beginDispute",
+            _queryId=new_report.query_id,
+            _timestamp=new_report.submission_timestamp,
+            gas_limit=int(gas_limit * 1.2),
+            legacy_gas_price=price,
+            acc_nonce=acc_nonce,
+        )
+    finally:
+        if not sent:
+            allowance_tracker.refund(allowance_key, dispute_fee, generation)
 
     if not status.ok:
         logger.error(
@@ -145,8 +240,17 @@ async def dispute(
             + f"at submission timestamp {new_report.submission_timestamp}:"
             + status.error
         )
+        nonce_manager.failed(new_report.chain_id, account.address, acc_nonce)
+        # the fee may or may not have been transferred
+        allowance_tracker.forget(allowance_key)
         return ""
 
+    nonce_manager.sent(new_report.chain_id, account.address, acc_nonce)
+    # the dispute changed the fees and the balance
+    multicall_reader.forget(new_report.chain_id)
+
+    if new_report.detected_at:
+        dispute_latency.observe(time.time() - new_report.detected_at, chain_id=new_report.chain_id)
     new_report.status_str += ": disputed!"
     explorer = endpoint.explorer
     if not explorer:
@@ -160,43 +264,61 @@ async def dispute(
 
 async def get_dispute_fee(cfg: TelliotConfig, new_report: NewReport) -> Optional[int]:
     """Calculate dispute fee on a Tellor network"""
+    dispute_fee, _ = await read_dispute_fee(cfg, new_report)
+    return dispute_fee
+
 
-    governance = get_contract(cfg, name="tellor-governance", account=None)
-    oracle = get_contract(cfg, name="tellor360-oracle", account=None)
+async def read_dispute_fee(
+    cfg: TelliotConfig, new_report: NewReport, *extra_reads: ContractRead, latest: bool = False
+) -> Tuple[Optional[int], List[ReadResult]]:
+    """Calculate dispute fee on a Tellor network, reading the contracts along with other reads in one batch.
+
+    With latest the contracts are read at the latest block instead of the last seen head.
+    Returns the dispute fee, or None if it couldn't be calculated, and the results of the other reads."""
+
+    governance = contract_registry.get(cfg, name="tellor-governance")
+    oracle = contract_registry.get(cfg, name="tellor360-oracle")
 
     if governance is None:
         logger.error(f"Unable to find governance contract on chain_id {new_report.chain_id}")
-        return None
+        return None, [(None, ResponseStatus(ok=False, error="no governance contract")) for _ in extra_reads]
 
     if oracle is None:
         logger.error(f"Unable to find oracle contract on chain_id {new_report.chain_id}")
-        return None
+        return None, [(None, ResponseStatus(ok=False, error="no oracle contract")) for _ in extra_reads]
+
+    # getOpenDisputesOnId is only needed with a single vote round, but reading it anyway keeps this one call
+    fee_reads = [
+        ContractRead(governance, "getDisputeFee"),
+        ContractRead(governance, "getVoteRounds", (new_report.query_id,)),
+        ContractRead(governance, "getOpenDisputesOnId", (new_report.query_id,)),
+        ContractRead(oracle, "getStakeAmount"),
+    ]
+    results = await multicall_reader.read(cfg.main.chain_id, fee_reads + list(extra_reads), latest=latest)
+    fee_results, extra_results = results[:4], results[4:]
+    dispute_fee, fee_status = fee_results[0]
+    vote_rounds, rounds_status = fee_results[1]
+    open_disputes_on_id, open_status = fee_results[2]
+    stake_amount, stake_status = fee_results[3]
 
     # simple dispute fee
-    dispute_fee, status = await governance.read(func_name="getDisputeFee")
-
-    if not status.ok:
+    if not fee_status.ok:
         logger.error(f"Unable to retrieve Dispute Fee on chain_id {new_report.chain_id}")
-        return None
+        return None, extra_results
 
-    vote_rounds, status = await governance.read("getVoteRounds", _hash=new_report.query_id)
-
-    if not status.ok:
+    if not rounds_status.ok:
         logger.error(
             f"Unable to count Vote Rounds on chain_id {new_report.chain_id} on query id " + new_report.query_id
         )
+        return None, extra_results
 
     if len(vote_rounds) == 1:
         # dispute fee with open disputes on the ID
-        open_disputes_on_id, status = await governance.read(
-            func_name="getOpenDisputesOnId", _queryId=new_report.query_id
-        )
-
-        if not status.ok:
+        if not open_status.ok:
             logger.error(
                 f"Unable to count open disputes on chain_id {new_report.chain_id} on query id " + new_report.query_id
             )
-            return None
+            return None, extra_results
 
         multiplier = open_disputes_on_id - 1 if open_disputes_on_id > 0 else 0
         dispute_fee = dispute_fee * 2 ** (multiplier)
@@ -204,13 +326,11 @@ async def get_dispute_fee(cfg: TelliotConfig, new_report: NewReport) -> Optional
         multiplier = len(vote_rounds) - 1 if len(vote_rounds) > 0 else 0
         dispute_fee = dispute_fee * 2 ** (multiplier)
 
-    stake_amount, status = await oracle.read(func_name="getStakeAmount")
-
-    if not status.ok:
+    if not stake_status.ok:
         logger.error(f"Unable to retrieve Stake Amount on chain_id {new_report.chain_id}")
-        return None
+        return None, extra_results
 
     if dispute_fee > stake_amount:
         dispute_fee = stake_amount
 
-    return int(dispute_fee)
+    return int(dispute_fee), extra_results
@@ -0,0 +1,239 @@
+"""Pick the healthiest RPC endpoint of each chain, failing over when one misbehaves."""
+import asyncio
+import threading
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import HTTPError
+from requests.exceptions import Timeout
+from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_core.model.endpoints import RPCEndpoint
+from web3 import Web3
+from web3.types import RPCEndpoint as RPCMethod
+from web3.types import RPCResponse
+
+from disputable_values_monitor.connections import connection_manager
+from disputable_values_monitor.rpcbatch import request_duration
+from disputable_values_monitor.rpcbatch import start_request_timer
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+HEALTH_ALPHA = 0.2  # weight of the latest request in the rolling latency and error rate
+DEFAULT_LATENCY = 1.0  # seconds assumed for endpoints that weren't used yet
+ERROR_PENALTY = 10  # how much the error rate inflates an endpoint's score
+BREAKER_FAILURES = 5  # consecutive failures that take an endpoint out of rotation
+BREAKER_COOLDOWN = 30  # seconds before an endpoint taken out of rotation is tried again
+HEDGE_DELAY = 1.0  # seconds a hedged call waits for the healthiest endpoint before also asking the next one
+
+# lowercase fragments of errors meaning the endpoint, not the request, is at fault
+ENDPOINT_ERRORS = (
+    "too many requests",
+    "rate limit",
+    "limit exceeded",
+    "timeout",
+    "timed out",
+    "service unavailable",
+    "bad gateway",
+    "internal server error",
+    "connection",
+)
+
+
+def is_endpoint_error(error: Any) -> bool:
+    """Check if an exception or a JSON-RPC error means the endpoint is unhealthy, e.g. rate limited or down."""
+    if isinstance(error, (RequestsConnectionError, Timeout, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, HTTPError):
+        return error.response is None or error.response.status_code == 429 or error.response.status_code >= 500
+    if isinstance(error, dict) and error.get("code") in (-32005, 429):
+        return True
+    msg = str(error).lower()
+    return any(fragment in msg for fragment in ENDPOINT_ERRORS)
+
+
+class EndpointHealth:
+    """Rolling latency and error rate of an endpoint, with a circuit breaker."""
+
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record(self, latency: float, ok: bool, now: float) -> None:
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += HEALTH_ALPHA * (latency - self.latency)
+        self.error_rate += HEALTH_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.failures = 0
+            self.open_until = 0.0
+        else:
+            self.failures += 1
+            # an endpoint tried again after its cooldown goes straight back out if it still fails
+            if self.failures >= BREAKER_FAILURES:
+                self.open_until = now + BREAKER_COOLDOWN
+
+    def available(self, now: float) -> bool:
+        """Check if the circuit breaker lets requests through."""
+        return now >= self.open_until
+
+    @property
+    def score(self) -> float:
+        """Lower is healthier."""
+        latency = DEFAULT_LATENCY if self.latency is None else self.latency
+        return latency * (1 + ERROR_PENALTY * self.error_rate)
+
+
+class EndpointPool:
+    """The configured endpoints of each chain, ranked by health.
+
+    Every request sent through an endpoint updates its rolling latency and
+    error rate. Endpoints failing BREAKER_FAILURES times in a row are taken out
+    of rotation for BREAKER_COOLDOWN seconds and their connection is dropped. Calls go to the healthiest
+    endpoint and fail over to the next ones on endpoint errors; with hedging
+    enabled, calls marked as hedged also go to the second healthiest endpoint
+    if the first hasn't answered within HEDGE_DELAY seconds.
+    """
+
+    def __init__(self, hedging: bool = False, hedge_delay: float = HEDGE_DELAY) -> None:
+        self.hedging = hedging
+        self.hedge_delay = hedge_delay
+        self.health: Dict[str, EndpointHealth] = {}
+        self._lock = threading.Lock()
+
+    def record(self, url: str, latency: float, ok: bool) -> None:
+        """Record the outcome of a request sent to an endpoint."""
+        with self._lock:
+            health = self.health.setdefault(url, EndpointHealth())
+            was_available = health.available(time.monotonic())
+            health.record(latency, ok, time.monotonic())
+            taken_out = was_available and not health.available(time.monotonic())
+        if taken_out:
+            logger.warning(f"endpoint {url} failed {health.failures} times in a row, skipping it for a while")
+            # reconnect once it's tried again
+            connection_manager.drop(url)
+
+    def ranked(self, cfg: TelliotConfig, chain_id: int) -> List[RPCEndpoint]:
+        """Endpoints of a chain, healthiest first; ones out of rotation come last."""
+        now = time.monotonic()
+        endpoints: List[RPCEndpoint] = cfg.endpoints.find(chain_id=chain_id)
+
+        def rank(endpoint: RPCEndpoint) -> Any:
+            health = self.health.get(endpoint.url, EndpointHealth())
+            return not health.available(now), health.score
+
+        # sorting is stable, so untried endpoints keep their config order
+        return sorted(endpoints, key=rank)
+
+    def connect(self, endpoint: RPCEndpoint) -> Optional[Web3]:
+        """Connected Web3 of an endpoint whose requests are tracked, or None if it can't connect."""
+        started = time.monotonic()
+        w3 = connection_manager.web3(endpoint)
+        if w3 is None:
+            self.record(endpoint.url, time.monotonic() - started, ok=False)
+            return None
+        if "dvm_health" not in w3.middleware_onion.keys():
+            w3.middleware_onion.add(self.health_middleware(endpoint.url), "dvm_health")
+        return w3
+
+    def get(self, cfg: TelliotConfig, chain_id: int) -> Optional[RPCEndpoint]:
+        """Healthiest endpoint of a chain that connects, or None if none does."""
+        for endpoint in self.ranked(cfg, chain_id):
+            if self.connect(endpoint) is not None:
+                return endpoint
+        return None
+
+    def health_middleware(self, url: str) -> Callable[..., Callable[[RPCMethod, Any], RPCResponse]]:
+        """Web3 middleware recording the latency and errors of each request to an endpoint."""
+
+        def middleware(
+            make_request: Callable[[RPCMethod, Any], RPCResponse], w3: Web3
+        ) -> Callable[[RPCMethod, Any], RPCResponse]:
+            def tracked_request(method: RPCMethod, params: Any) -> RPCResponse:
+                started = start_request_timer()
+                try:
+                    response = make_request(method, params)
+                except Exception as e:
+                    self.record(url, request_duration(started), ok=not is_endpoint_error(e))
+                    raise
+                # errors like reverts are answers too, only rate limits and the like count against the endpoint
+                ok = "error" not in response or not is_endpoint_error(response["error"])
+                self.record(url, request_duration(started), ok=ok)
+                return response
+
+            return tracked_request
+
+        return middleware
+
+    async def call(
+        self, cfg: TelliotConfig, chain_id: int, request: Callable[[Web3], Awaitable[T]], hedge: bool = False
+    ) -> T:
+        """Run an RPC call on the healthiest endpoint of a chain, failing over to the next ones on endpoint errors.
+
+        Errors that aren't the endpoint's fault, like a reverted call, are raised right away."""
+        # backup endpoints are only connected once they're needed
+        connected = (w3 for w3 in map(self.connect, self.ranked(cfg, chain_id)) if w3 is not None)
+        w3 = next(connected, None)
+        if w3 is None:
+            raise ValueError(f"no endpoint of chain_id {chain_id} connects")
+
+        error: Optional[Exception] = None
+        if hedge and self.hedging:
+            backup = next(connected, None)
+            if backup is not None:
+                try:
+                    return await self.hedged(request, w3, backup)
+                except Exception as e:
+                    if not is_endpoint_error(e):
+                        raise
+                    error = e
+                w3 = next(connected, None)
+
+        while w3 is not None:
+            try:
+                return await request(w3)
+            except Exception as e:
+                if not is_endpoint_error(e):
+                    raise
+                logger.warning(f"endpoint of chain_id {chain_id} failed, trying the next one: {e}")
+                error = e
+            w3 = next(connected, None)
+        assert error is not None
+        raise error
+
+    async def hedged(self, request: Callable[[Web3], Awaitable[T]], first: Web3, second: Web3) -> T:
+        """Result of the first of two endpoints to answer; the second is only asked if the first is slow or down."""
+        tasks = [asyncio.ensure_future(request(first))]
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+        if done:
+            error = tasks[0].exception()
+            if error is None or not is_endpoint_error(error):
+                return tasks[0].result()
+        tasks.append(asyncio.ensure_future(request(second)))
+        pending = {task for task in tasks if not task.done()}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # both failed
+            return tasks[-1].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+endpoint_pool = EndpointPool()
@@ -0,0 +1,161 @@
+"""Fetch event logs over large block ranges."""
+import asyncio
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.types import LogReceipt
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LOG_RANGE = 5000  # blocks per eth_getLogs request until a provider says that's too many
+MAX_CONCURRENT_LOG_REQUESTS = 4  # eth_getLogs requests in flight per fetch
+
+# lowercase fragments of provider errors meaning the block range or the response was too big
+RANGE_TOO_LARGE_ERRORS = (
+    "block range",
+    "range too large",
+    "range is too large",
+    "range is too wide",
+    "max range",
+    "limited to a",
+    "query returned more than",
+    "response size",
+    "too many blocks",
+    "payload too large",
+)
+
+
+class RangeTooLargeError(Exception):
+    """A single block was too big for the provider to return its logs."""
+
+
+def is_range_too_large(e: Exception) -> bool:
+    """Check if a provider rejected a request for covering too many blocks or logs."""
+    msg = str(e).lower()
+    return any(fragment in msg for fragment in RANGE_TOO_LARGE_ERRORS)
+
+
+def provider_id(web3: Web3) -> str:
+    """Identify the provider behind a Web3 connection."""
+    return str(getattr(web3.provider, "endpoint_uri", None) or id(web3.provider))
+
+
+def split_range(from_block: int, to_block: int, size: int) -> List[Tuple[int, int]]:
+    """Split an inclusive block range into consecutive chunks of at most size blocks."""
+    return [(start, min(start + size - 1, to_block)) for start in range(from_block, to_block + 1, size)]
+
+
+@dataclass
+class LogFilterPlan:
+    """Every (contract address, event topic) a chain is monitored for,
+    merged into a single eth_getLogs filter.
+
+    The merged filter matches any of the addresses emitting any of the topics,
+    so route() drops the logs of pairs that weren't asked for.
+    """
+
+    chain_id: int
+    targets: List[Tuple[str, str]] = field(default_factory=list)
+
+    def add(self, address: str, topic: str) -> None:
+        """Monitor a contract address for an event topic."""
+        target = (Web3.to_checksum_address(address), HexBytes(topic).hex())
+        if target not in self.targets:
+            self.targets.append(target)
+
+    @property
+    def addresses(self) -> List[str]:
+        """Contract addresses of the filter."""
+        return list(dict.fromkeys(address for address, _ in self.targets))
+
+    @property
+    def topics(self) -> List[List[str]]:
+        """Topics of the filter: any of the monitored events."""
+        return [list(dict.fromkeys(topic for _, topic in self.targets))]
+
+    def route(self, logs: List[LogReceipt]) -> List[LogReceipt]:
+        """Keep the logs of monitored (address, topic) pairs, once each."""
+        targets = set(self.targets)
+        routed = []
+        seen = set()
+        for log in logs:
+            if not log["topics"]:
+                continue
+            if (Web3.to_checksum_address(log["address"]), HexBytes(log["topics"][0]).hex()) not in targets:
+                continue
+            log_id = (HexBytes(log["transactionHash"]).hex(), log["logIndex"])
+            if log_id in seen:
+                continue
+            seen.add(log_id)
+            routed.append(log)
+        return routed
+
+
+class LogFetcher:
+    """Fetch logs in chunks sized to what each provider accepts.
+
+    A window bigger than a provider's range is split into chunks fetched
+    concurrently. A chunk the provider rejects as too big is halved and
+    retried, and the provider's range is lowered to the halved size so the
+    following fetches don't hit its limit again.
+    """
+
+    def __init__(self, default_range: int = DEFAULT_LOG_RANGE, concurrency: int = MAX_CONCURRENT_LOG_REQUESTS) -> None:
+        self.default_range = default_range
+        self.concurrency = concurrency
+        self.max_ranges: Dict[str, int] = {}
+
+    def max_range(self, web3: Web3) -> int:
+        """Largest block range to request from a provider."""
+        return self.max_ranges.get(provider_id(web3), self.default_range)
+
+    async def _fetch_chunk(
+        self, web3: Web3, semaphore: asyncio.Semaphore, event_filter: Dict[str, Any], from_block: int, to_block: int
+    ) -> List[LogReceipt]:
+        """Fetch one chunk, halving it for as long as the provider rejects it."""
+        chunk_filter = {**event_filter, "fromBlock": from_block, "toBlock": to_block}
+        try:
+            async with semaphore:
+                logs: List[LogReceipt] = await asyncio.to_thread(web3.eth.get_logs, chunk_filter)  # type: ignore
+            return logs
+        except Exception as e:
+            if not is_range_too_large(e):
+                raise
+            if from_block == to_block:
+                raise RangeTooLargeError(f"logs of block {from_block} are too large to fetch: {e}") from e
+
+        size = to_block - from_block + 1
+        provider = provider_id(web3)
+        half = size // 2
+        if half < self.max_ranges.get(provider, self.default_range):
+            logger.info(f"provider rejected a {size} block eth_getLogs range, lowering it to {half} blocks")
+            self.max_ranges[provider] = half
+        first, second = await asyncio.gather(
+            self._fetch_chunk(web3, semaphore, event_filter, from_block, from_block + half - 1),
+            self._fetch_chunk(web3, semaphore, event_filter, from_block + half, to_block),
+        )
+        return first + second
+
+    async def get_logs(self, web3: Web3, event_filter: Dict[str, Any]) -> List[LogReceipt]:
+        """Get the logs matching a filter with numeric fromBlock and toBlock, in chain order."""
+        from_block: int = max(event_filter["fromBlock"], 0)
+        to_block: int = event_filter["toBlock"]
+        if to_block < from_block:
+            return []
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = split_range(from_block, to_block, self.max_range(web3))
+        results = await asyncio.gather(
+            *(self._fetch_chunk(web3, semaphore, event_filter, start, end) for start, end in chunks)
+        )
+        return [log for logs in results for log in logs]
+
+
+log_fetcher = LogFetcher()
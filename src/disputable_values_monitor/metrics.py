@@ -0,0 +1,299 @@
+"""Prometheus metrics of the monitor, served over HTTP in the text exposition format."""
+import abc
+import asyncio
+import math
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from web3 import Web3
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from disputable_values_monitor.rpcbatch import request_duration
+from disputable_values_monitor.rpcbatch import start_request_timer
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_HOST = "127.0.0.1"
+# upper bounds, in seconds, of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DISPUTE_LATENCY_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(abc.ABC):
+    """A metric with a value per combination of its labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # metrics are updated from worker threads too, e.g. in web3 calls
+        self._lock = threading.Lock()
+
+    def label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Sample lines of every label combination."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """A count that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError(f"counter {self.name} can't be decreased")
+        key = self.label_values(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield f"{self.name}{self.format_labels(key)} {format_value(value)}"
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def get(self, **labels: Any) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield f"{self.name}{self.format_labels(key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values, counted in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (count per bucket, sum of the observed values)
+        self.values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def time(self, **labels: Any) -> "Timer":
+        """Context manager observing how long its block took."""
+        return Timer(self, labels)
+
+    def count(self, **labels: Any) -> int:
+        counts, _ = self.values.get(self.label_values(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self.format_labels(key, ("le", format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{self.format_labels(key)} {format_value(total)}"
+            yield f"{self.name}_count{self.format_labels(key)} {cumulative}"
+
+
+class Timer:
+    """Observe the seconds spent in a with block on a histogram."""
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    """Metrics exposed on the metrics endpoint."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+registry = MetricsRegistry()
+
+rpc_latency: Histogram = registry.register(
+    Histogram("dvm_rpc_request_seconds", "Latency of JSON-RPC requests.", ("chain_id", "method"))
+)
+rpc_errors: Counter = registry.register(
+    Counter("dvm_rpc_errors_total", "JSON-RPC requests that failed or returned an error.", ("chain_id", "method"))
+)
+events_fetched: Counter = registry.register(
+    Counter("dvm_events_fetched_total", "Events fetched from the monitored contracts.", ("chain_id",))
+)
+events_parsed: Counter = registry.register(
+    Counter("dvm_events_parsed_total", "NewReport events decoded into a report.", ("chain_id",))
+)
+parse_failures: Counter = registry.register(
+    Counter("dvm_parse_failures_total", "NewReport events that couldn't be evaluated.", ("chain_id", "reason"))
+)
+trusted_value_latency: Histogram = registry.register(
+    Histogram("dvm_trusted_value_fetch_seconds", "Latency of fetching a trusted value from a source.", ("source",))
+)
+alerts_sent: Counter = registry.register(Counter("dvm_alerts_total", "Alerts sent or queued for Discord."))
+alert_queue_depth: Gauge = registry.register(
+    Gauge("dvm_alert_queue_depth", "Alerts waiting to be delivered to Discord, over all webhooks.")
+)
+dispute_latency: Histogram = registry.register(
+    Histogram(
+        "dvm_detection_to_dispute_seconds",
+        "Seconds from detecting a disputable report to sending its dispute.",
+        ("chain_id",),
+        buckets=DISPUTE_LATENCY_BUCKETS,
+    )
+)
+
+
+def rpc_metrics_middleware(chain_id: int) -> Callable[..., Callable[[RPCEndpoint, Any], RPCResponse]]:
+    """Web3 middleware timing each request sent to a chain's endpoint."""
+
+    def middleware(
+        make_request: Callable[[RPCEndpoint, Any], RPCResponse], w3: Web3
+    ) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+        def timed_request(method: RPCEndpoint, params: Any) -> RPCResponse:
+            started = start_request_timer()
+            try:
+                response = make_request(method, params)
+            except Exception:
+                rpc_errors.inc(chain_id=chain_id, method=method)
+                raise
+            finally:
+                rpc_latency.observe(request_duration(started), chain_id=chain_id, method=method)
+            if "error" in response:
+                rpc_errors.inc(chain_id=chain_id, method=method)
+            return response
+
+        return timed_request
+
+    return middleware
+
+
+def instrument(w3: Web3, chain_id: int) -> None:
+    """Record the latency of the requests a Web3 instance sends, once per instance."""
+    if "dvm_metrics" not in w3.middleware_onion.keys():
+        w3.middleware_onion.add(rpc_metrics_middleware(chain_id), "dvm_metrics")
+
+
+async def handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer a GET /metrics request; anything else gets a 404."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # skip the headers
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"unable to answer metrics request: {e}")
+    finally:
+        writer.close()
+
+
+async def serve_metrics(port: int, host: str = METRICS_HOST) -> asyncio.AbstractServer:
+    """Serve the metrics on http://host:port/metrics until the server is closed."""
+    server = await asyncio.start_server(handle_scrape, host, port)
+    logger.info(f"serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,176 @@
+"""Contract reads batched into a single eth_call through Multicall3."""
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from eth_utils.abi import collapse_if_tuple
+from telliot_core.contract.contract import Contract
+from telliot_core.utils.response import ResponseStatus
+from web3 import Web3
+from web3.exceptions import BadFunctionCallOutput
+from web3.types import BlockIdentifier
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+# Multicall3 is deployed at the same address on most chains, see https://www.multicall3.com
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
+]
+
+# a contract read and its result, as returned by Contract.read
+ReadResult = Tuple[Any, ResponseStatus]
+# (contract address, function name, arguments)
+ReadKey = Tuple[str, str, Tuple[Any, ...]]
+
+
+class ContractRead(NamedTuple):
+    """A view function call on a contract."""
+
+    contract: Contract
+    func_name: str
+    args: Tuple[Any, ...] = ()
+
+    @property
+    def key(self) -> ReadKey:
+        return self.contract.address, self.func_name, self.args
+
+
+class MulticallReader:
+    """Contract reads of a chain sent as one Multicall3 aggregate3 eth_call.
+
+    Reads are pinned to the chain head last seen by the log loop and their
+    results are cached for that block, so reads repeated before the next poll
+    cost nothing. Reads that decide a transaction, like a dispute's fee and
+    balance, are made at the latest block instead and never cached. On chains
+    without Multicall3 the reads are sent one by one.
+    """
+
+    def __init__(self) -> None:
+        self.heads: Dict[int, int] = {}
+        # chain_id -> results of reads at the chain's head
+        self.cache: Dict[int, Dict[ReadKey, ReadResult]] = {}
+        # chains where Multicall3 isn't deployed
+        self.unsupported: Set[int] = set()
+
+    def observe_head(self, chain_id: int, block_number: int) -> None:
+        """Record the latest block of a chain; cached results of older blocks are dropped."""
+        if block_number > self.heads.get(chain_id, -1):
+            self.heads[chain_id] = block_number
+            self.cache.pop(chain_id, None)
+
+    def forget(self, chain_id: int) -> None:
+        """Drop the cached results of a chain, e.g. after sending a transaction that changes them."""
+        self.cache.pop(chain_id, None)
+
+    async def read(self, chain_id: int, reads: Sequence[ContractRead], latest: bool = False) -> List[ReadResult]:
+        """Results of the reads in order, each with the status Contract.read would return.
+
+        With latest the reads are made at the latest block rather than the last seen head."""
+        head = None if latest else self.heads.get(chain_id)
+        # without a known head reads are at the latest block and aren't cached
+        cached = self.cache.get(chain_id, {}) if head is not None else {}
+        results = {read.key: cached[read.key] for read in reads if read.key in cached}
+        missing = list({read.key: read for read in reads if read.key not in results}.values())
+        if not missing:
+            return [results[read.key] for read in reads]
+
+        fetched = None
+        if chain_id not in self.unsupported:
+            fetched = await self.aggregate(chain_id, missing, head)
+        if fetched is None:
+            fetched = await asyncio.gather(*(read.contract.read(read.func_name, *read.args) for read in missing))
+
+        # the head may have moved on while reading
+        still_current = head is not None and self.heads.get(chain_id) == head
+        for read, result in zip(missing, fetched):
+            results[read.key] = result
+            if still_current and result[1].ok:
+                self.cache.setdefault(chain_id, {})[read.key] = result
+        return [results[read.key] for read in reads]
+
+    async def aggregate(
+        self, chain_id: int, reads: Sequence[ContractRead], block: Optional[int]
+    ) -> Optional[List[ReadResult]]:
+        """Send the reads in one aggregate3 call, or return None if it failed."""
+        w3: Web3 = reads[0].contract.node.web3
+        try:
+            calls = [(read.contract.address, True, encode_call(read)) for read in reads]
+            multicall = w3.eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+            block_identifier: BlockIdentifier = block if block is not None else "latest"
+            returned = await asyncio.to_thread(
+                multicall.functions.aggregate3(calls).call, block_identifier=block_identifier
+            )
+        except BadFunctionCallOutput as e:
+            logger.info(f"Multicall3 isn't available on chain_id {chain_id}, reading contracts one by one: {e}")
+            self.unsupported.add(chain_id)
+            return None
+        except Exception as e:
+            logger.warning(f"unable to batch contract reads on chain_id {chain_id}, reading them one by one: {e}")
+            return None
+        return [decode_result(w3, read, success, data) for read, (success, data) in zip(reads, returned)]
+
+
+def encode_call(read: ContractRead) -> str:
+    """Calldata of a read."""
+    contract = read.contract.contract
+    # encodeABI was renamed in later web3 versions
+    encode = getattr(contract, "encode_abi", None) or contract.encodeABI
+    return str(encode(fn_name=read.func_name, args=read.args))
+
+
+def decode_result(w3: Web3, read: ContractRead, success: bool, data: bytes) -> ReadResult:
+    """Decode the return data of a read like web3 does for a single call."""
+    if not success:
+        return None, ResponseStatus(ok=False, error=f"{read.func_name} reverted")
+    try:
+        abi = read.contract.contract.get_function_by_name(read.func_name).abi
+        output_types = [collapse_if_tuple(output) for output in abi["outputs"]]
+        # arrays are returned as lists, like web3 does
+        output = [
+            list(value) if output_type.endswith("]") else value
+            for output_type, value in zip(output_types, w3.codec.decode(output_types, data))
+        ]
+    except Exception as e:
+        return None, ResponseStatus(ok=False, e=e, error=f"unable to decode {read.func_name} result")
+    if len(output) == 1:
+        return output[0], ResponseStatus(ok=True)
+    return output, ResponseStatus(ok=True)
+
+
+multicall_reader = MulticallReader()
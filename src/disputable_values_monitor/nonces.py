@@ -0,0 +1,116 @@
+"""Transaction nonces of the disputer's accounts, handed out locally."""
+import asyncio
+import sqlite3
+from typing import Dict
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from web3 import Web3
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+# (chain_id, account address)
+NonceKey = Tuple[int, str]
+
+
+class NonceManager:
+    """Next nonce of each account on each chain.
+
+    An account's nonce is read from its pending transaction count once, then
+    handed out locally, so transactions sent at the same time from the same
+    account each get their own nonce. When a transaction fails the nonce may
+    have been left unused, leaving a gap that would hold up every later
+    transaction: the account is resynced from its pending transaction count
+    once none of its other nonces are still being sent. Once a file is opened,
+    next nonces are saved to it and used on restart if they're ahead of the
+    node, which may not see every pending transaction yet.
+    """
+
+    def __init__(self) -> None:
+        self.next_nonces: Dict[NonceKey, int] = {}
+        # nonces handed out whose transactions weren't sent yet
+        self.in_flight: Dict[NonceKey, Set[int]] = {}
+        # accounts to resync from the node once nothing is in flight
+        self.stale: Set[NonceKey] = set()
+        self.saved: Dict[NonceKey, int] = {}
+        self._locks: Dict[NonceKey, asyncio.Lock] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self, path: str) -> None:
+        """Load the nonces saved in a file and save new ones to it."""
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS nonces ("
+                "chain_id INTEGER NOT NULL, address TEXT NOT NULL, next_nonce INTEGER NOT NULL, "
+                "PRIMARY KEY (chain_id, address))"
+            )
+        for chain_id, address, next_nonce in self._conn.execute("SELECT chain_id, address, next_nonce FROM nonces"):
+            self.saved[(chain_id, address)] = next_nonce
+
+    def close(self) -> None:
+        """Stop saving nonces."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def key(chain_id: int, address: str) -> NonceKey:
+        return chain_id, Web3.to_checksum_address(address)
+
+    async def allocate(self, w3: Web3, chain_id: int, address: str) -> int:
+        """Next nonce of an account, read from the node the first time and after a failure."""
+        key = self.key(chain_id, address)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            in_flight = self.in_flight.setdefault(key, set())
+            if key not in self.next_nonces or (key in self.stale and not in_flight):
+                await self._sync(w3, key)
+            nonce = self.next_nonces[key]
+            self.next_nonces[key] = nonce + 1
+            in_flight.add(nonce)
+            self._save(key)
+            return nonce
+
+    async def _sync(self, w3: Web3, key: NonceKey) -> None:
+        chain_id, address = key
+        pending: int = await asyncio.to_thread(
+            w3.eth.get_transaction_count, Web3.to_checksum_address(address), "pending"
+        )
+        # after a failure the node knows best
+        saved = None if key in self.stale else self.saved.get(key)
+        if saved is not None and saved > pending:
+            logger.info(f"using saved nonce {saved} of {address} on chain_id {chain_id}, the node is at {pending}")
+            pending = saved
+        self.next_nonces[key] = pending
+        self.stale.discard(key)
+        self.saved.pop(key, None)
+
+    def sent(self, chain_id: int, address: str, nonce: int) -> None:
+        """Record that the transaction with a nonce was sent."""
+        self.in_flight.get(self.key(chain_id, address), set()).discard(nonce)
+
+    def failed(self, chain_id: int, address: str, nonce: int) -> None:
+        """Record that the transaction with a nonce failed, so the account is resynced."""
+        key = self.key(chain_id, address)
+        self.in_flight.get(key, set()).discard(nonce)
+        self.stale.add(key)
+        logger.info(f"transaction with nonce {nonce} of {address} on chain_id {chain_id} failed, resyncing nonces")
+
+    def _save(self, key: NonceKey) -> None:
+        if self._conn is None:
+            return
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO nonces (chain_id, address, next_nonce) VALUES (?, ?, ?) "
+                    "ON CONFLICT (chain_id, address) DO UPDATE SET next_nonce = excluded.next_nonce",
+                    (*key, self.next_nonces[key]),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"unable to save nonce of {key[1]} on chain_id {key[0]}: {e}")
+
+
+nonce_manager = NonceManager()
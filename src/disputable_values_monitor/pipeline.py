@@ -0,0 +1,138 @@
+"""Concurrent evaluation of NewReport (and oracle address) events."""
+import asyncio
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from hexbytes import HexBytes
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+ChainEvent = Tuple[int, Any]
+EventHandler = Callable[[int, Any], Awaitable[None]]
+# (chain_id, transaction hash, log index)
+LogKey = Tuple[int, str, Optional[int]]
+
+SEEN_EVENTS = 10_000  # events remembered so refetched ones aren't handled again
+
+
+def event_key(chain_id: int, event: Any) -> Tuple[int, str]:
+    """Ordering key of an event: (chain_id, query_id)
+
+    The query id is the first indexed topic of a NewReport event, so events can be
+    grouped without decoding them. Events without one (e.g. NewOracleAddress) are
+    grouped by their event signature instead.
+    """
+    topics = event.topics
+    if len(topics) > 1:
+        return chain_id, HexBytes(topics[1]).hex()
+    return chain_id, HexBytes(topics[0]).hex()
+
+
+def tx_hash(event: Any) -> str:
+    """Transaction hash of an event as a hex string."""
+    return HexBytes(event.transactionHash).hex()
+
+
+def log_key(chain_id: int, event: Any) -> LogKey:
+    """Key identifying an event across polls and streams."""
+    return chain_id, tx_hash(event), event.get("logIndex")
+
+
+class SeenEvents:
+    """Bounded set of the events already being handled or done.
+
+    Polls fetch the last blocks again to catch reorgs, and streamed chains are
+    polled too, so the same event arrives several times. A key is reserved
+    before the event is evaluated, so concurrent copies of it are skipped
+    right away; the oldest keys are forgotten once `size` are remembered.
+    """
+
+    def __init__(self, size: int = SEEN_EVENTS) -> None:
+        self.size = size
+        self._keys: "OrderedDict[LogKey, None]" = OrderedDict()
+
+    def reserve(self, key: LogKey) -> bool:
+        """Remember an event, returning False if it was already seen."""
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.size:
+            self._keys.popitem(last=False)
+        return True
+
+    def release(self, key: LogKey) -> None:
+        """Forget an event that couldn't be handled, so it's tried again when refetched."""
+        self._keys.pop(key, None)
+
+
+class ReportPipeline:
+    """Evaluate events with a bounded pool of workers.
+
+    Events sharing a (chain_id, query_id) key are handled one after another, in the
+    order they were fetched, while events of different keys run concurrently. At
+    most `workers` events are evaluated at the same time. With one worker events
+    are handled serially, like the monitor always did. The order holds across
+    batches processed at the same time too, e.g. a chain's stream and its poll.
+    """
+
+    def __init__(self, handler: EventHandler, workers: int = 1) -> None:
+        if workers < 1:
+            raise ValueError(f"number of workers must be at least 1, got {workers}")
+        self.handler = handler
+        self.workers = workers
+        self._semaphore = asyncio.Semaphore(workers)
+        # held while a batch's events of a key are handled, so later batches wait their turn
+        self._key_locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+        self._serial = asyncio.Lock()
+
+    @staticmethod
+    def dedupe(events: List[ChainEvent]) -> List[ChainEvent]:
+        """Drop events of transactions that were already seen in the batch."""
+        unique = []
+        seen = set()
+        for chain_id, event in events:
+            tx = tx_hash(event)
+            if tx in seen:
+                continue
+            seen.add(tx)
+            unique.append((chain_id, event))
+        return unique
+
+    @staticmethod
+    def group(events: List[ChainEvent]) -> Dict[Tuple[int, str], List[ChainEvent]]:
+        """Group events by ordering key, keeping their order within each group."""
+        groups: Dict[Tuple[int, str], List[ChainEvent]] = {}
+        for chain_id, event in events:
+            groups.setdefault(event_key(chain_id, event), []).append((chain_id, event))
+        return groups
+
+    async def _run_group(self, group: List[ChainEvent]) -> None:
+        """Handle the events of one key in order, after those of earlier batches."""
+        async with self._key_locks.setdefault(event_key(*group[0]), asyncio.Lock()):
+            await self._run_events(group)
+
+    async def _run_events(self, events: List[ChainEvent]) -> None:
+        """Handle events one after another."""
+        for chain_id, event in events:
+            async with self._semaphore:
+                try:
+                    await self.handler(chain_id, event)
+                except Exception as e:
+                    logger.error(f"unable to handle event {tx_hash(event)} on chain_id {chain_id}: {e}")
+
+    async def process(self, events: List[ChainEvent]) -> None:
+        """Handle a batch of events and wait until all of them are done."""
+        events = self.dedupe(events)
+        if self.workers == 1:
+            async with self._serial:
+                await self._run_events(events)
+            return
+        await asyncio.gather(*(self._run_group(group) for group in self.group(events).values()))
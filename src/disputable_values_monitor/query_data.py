@@ -0,0 +1,111 @@
+"""Decode the queryData of reports once per distinct queryData."""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from typing import Optional
+from typing import Tuple
+
+import eth_abi
+from clamfig.base import deserialize
+from clamfig.base import Registry
+from telliot_feeds.dtypes.value_type import ValueType
+from telliot_feeds.queries.json_query import JsonQuery
+from telliot_feeds.queries.query import OracleQuery
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+QUERY_DATA_CACHE_SIZE = 1024  # distinct queryData blobs kept decoded
+
+
+@dataclass(frozen=True)
+class DecodedQueryData:
+    """A decoded queryData, or why it couldn't be decoded."""
+
+    query: Optional[OracleQuery] = None
+    query_type: Optional[str] = None
+    # (name, value) of each query parameter, None unless the queryData is ABI encoded
+    params: Optional[Tuple[Tuple[str, Any], ...]] = None
+    error: Optional[str] = None
+
+    @property
+    def value_type(self) -> Optional[ValueType]:
+        """Decoder of the reported values of the query."""
+        return None if self.query is None else self.query.value_type
+
+
+def decode_query_data(query_data: bytes) -> DecodedQueryData:
+    """Decode a queryData, either JSON or ABI encoded."""
+    # query types are registered as the feeds using them are imported
+    import telliot_feeds.feeds  # noqa: F401
+
+    query = None
+    try:
+        query = JsonQuery.get_query_from_data(query_data)
+    except ValueError:
+        pass
+
+    try:
+        query_type, encoded_param_values = eth_abi.decode(["string", "bytes"], query_data)
+    except Exception as e:
+        if query is not None:
+            return DecodedQueryData(query=query, query_type=type(query).__name__)
+        return DecodedQueryData(error=f"Unable to decode query data: {e}")
+
+    cls = Registry.registry.get(query_type)
+    if cls is None:
+        if query is not None:
+            return DecodedQueryData(query=query, query_type=type(query).__name__)
+        return DecodedQueryData(query_type=query_type, error=f"Unsupported query type: {query_type}")
+
+    try:
+        param_names = [p["name"] for p in cls.abi]
+        param_values = eth_abi.decode([p["type"] for p in cls.abi], encoded_param_values)
+        params = tuple(zip(param_names, param_values))
+        if query is None:
+            query = deserialize({"type": query_type, **dict(params)})
+    except Exception as e:
+        return DecodedQueryData(query=query, query_type=query_type, error=f"Unable to decode {query_type} query: {e}")
+
+    return DecodedQueryData(query=query, query_type=query_type, params=params)
+
+
+class QueryDataCache:
+    """Least recently used decoded queryData blobs.
+
+    Reporters submit the same few hundred queryData blobs again and again,
+    so each one is decoded once and then served from memory. Blobs that
+    can't be decoded are cached too, and their error is logged only once.
+    """
+
+    def __init__(self, maxsize: int = QUERY_DATA_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._decoded: "OrderedDict[bytes, DecodedQueryData]" = OrderedDict()
+
+    def decode(self, query_data: bytes) -> DecodedQueryData:
+        """Decoded queryData, from the cache if it was decoded before."""
+        query_data = bytes(query_data)
+        decoded = self._decoded.get(query_data)
+        if decoded is not None:
+            self.hits += 1
+            self._decoded.move_to_end(query_data)
+            return decoded
+
+        self.misses += 1
+        decoded = decode_query_data(query_data)
+        if decoded.error is not None:
+            logger.error(decoded.error)
+        self._decoded[query_data] = decoded
+        if len(self._decoded) > self.maxsize:
+            self._decoded.popitem(last=False)
+        return decoded
+
+    def clear(self) -> None:
+        """Forget every decoded queryData."""
+        self._decoded.clear()
+
+
+query_data_cache = QueryDataCache()
@@ -0,0 +1,406 @@
+"""Replay recorded NewReport logs through the monitor, without a node."""
+import json
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import IO
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import click
+from hexbytes import HexBytes
+from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_core.cli.utils import async_run
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from disputable_values_monitor.cache import DEFAULT_TRUSTED_VALUE_TTL
+from disputable_values_monitor.cache import TrustedValueCache
+from disputable_values_monitor.config import AutoDisputerConfig
+from disputable_values_monitor.config import DISPUTER_CONFIG_PATH
+from disputable_values_monitor.data import parse_new_report_event
+from disputable_values_monitor.discord import alert
+from disputable_values_monitor.discord import alert_sink
+from disputable_values_monitor.discord import generic_alert
+from disputable_values_monitor.disputer import meant_to_dispute
+from disputable_values_monitor.pipeline import ChainEvent
+from disputable_values_monitor.pipeline import ReportPipeline
+from disputable_values_monitor.reports import json_record
+from disputable_values_monitor.utils import chain_config
+from disputable_values_monitor.utils import get_logger
+from disputable_values_monitor.utils import get_tx_explorer_url
+from disputable_values_monitor.utils import NewReport
+from disputable_values_monitor.utils import Topics
+
+logger = get_logger(__name__)
+
+REPLAY_BATCH_SIZE = 1000  # recorded logs handed to the pipeline at once
+
+# trusted value recorded with the log being evaluated, if any
+recorded_trusted_value: ContextVar[Any] = ContextVar("recorded_trusted_value", default=None)
+
+
+class ReplayRecord(NamedTuple):
+    """A recorded log, the chain it was emitted on and optionally the trusted value at the time."""
+
+    chain_id: int
+    log: AttributeDict[str, Any]
+    trusted_value: Any = None
+
+
+def as_reportable(value: Any) -> Any:
+    """JSON value as the monitor compares it, with lists (e.g. EVMCall results) as tuples."""
+    if isinstance(value, list):
+        return tuple(as_reportable(v) for v in value)
+    return value
+
+
+def as_json(value: Any) -> Any:
+    """Trusted value as JSON, with bytes as hex strings."""
+    if isinstance(value, bytes):
+        return HexBytes(value).hex()
+    if isinstance(value, (list, tuple)):
+        return [as_json(v) for v in value]
+    return value
+
+
+def parse_record(line: str) -> ReplayRecord:
+    """Record from a line of a replay file.
+
+    Each line is a JSON object with the chain_id, topics and data of the log,
+    its transactionHash (or tx_hash) and blockNumber (or block_number), and
+    optionally its address, blockHash, logIndex, transactionIndex and the
+    trusted_value to compare the reported value against."""
+    raw = json.loads(line)
+    log = AttributeDict(
+        {
+            "address": raw.get("address", "0x" + "00" * 20),
+            "topics": [HexBytes(topic) for topic in raw["topics"]],
+            "data": raw["data"],
+            "blockNumber": raw.get("blockNumber", raw.get("block_number", 0)),
+            "transactionHash": HexBytes(raw.get("transactionHash") or raw["tx_hash"]),
+            "transactionIndex": raw.get("transactionIndex", 0),
+            "blockHash": HexBytes(raw.get("blockHash", "0x" + "00" * 32)),
+            "logIndex": raw.get("logIndex", 0),
+            "removed": False,
+        }
+    )
+    return ReplayRecord(int(raw["chain_id"]), log, as_reportable(raw.get("trusted_value")))
+
+
+def log_record(chain_id: int, log: Any, trusted_value: Any = None) -> Dict[str, Any]:
+    """Line of a replay file for a log, as a JSON object."""
+    record = {
+        "chain_id": chain_id,
+        "address": log["address"],
+        "topics": [HexBytes(topic).hex() for topic in log["topics"]],
+        "data": log["data"] if isinstance(log["data"], str) else HexBytes(log["data"]).hex(),
+        "transactionHash": HexBytes(log["transactionHash"]).hex(),
+        "blockNumber": log["blockNumber"],
+        "blockHash": HexBytes(log["blockHash"]).hex(),
+        "logIndex": log["logIndex"],
+        "transactionIndex": log["transactionIndex"],
+    }
+    if trusted_value is not None:
+        record["trusted_value"] = as_json(trusted_value)
+    return record
+
+
+def read_records(path: str) -> Iterator[ReplayRecord]:
+    """Records of a replay file, one JSON object per line, skipping lines that can't be parsed."""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield parse_record(line)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"unable to parse line {number} of {path}: {e}")
+
+
+class OfflineProvider(BaseProvider):
+    """Provider of a replay: logs can be decoded, but any request to a node fails."""
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        raise RuntimeError(f"replays don't send RPC requests, tried {method}")
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return False
+
+
+def offline_config() -> TelliotConfig:
+    """Config whose endpoints are all 'connected' to the offline provider."""
+    cfg = TelliotConfig()
+    w3 = Web3(OfflineProvider())
+    for endpoint in cfg.endpoints.endpoints:
+        endpoint._web3 = w3
+    return cfg
+
+
+class RecordedTrustedValues(TrustedValueCache):
+    """Trusted values recorded with the logs, or else fetched from the feed's sources and cached."""
+
+    async def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        is_valid: Callable[[Any], bool] = lambda value: value is not None,
+    ) -> Any:
+        value = recorded_trusted_value.get()
+        if value is not None:
+            self.hits += 1
+            # as a datapoint: (value, timestamp)
+            return value, None
+        return await super().get(key, fetch, ttl, is_valid)
+
+
+class ReplaySink:
+    """Dry-run destination of the alerts and disputes of a replay; drops them."""
+
+    def alert(self, msg: str) -> None:
+        pass
+
+    def dispute(self, new_report: NewReport) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class PrintSink(ReplaySink):
+    """Print alerts and the disputes that would be sent."""
+
+    def alert(self, msg: str) -> None:
+        click.echo(f"[alert] {msg.strip()}")
+
+    def dispute(self, new_report: NewReport) -> None:
+        click.echo(
+            f"[dispute] {new_report.query_type} {new_report.value!r} on chain_id {new_report.chain_id}: "
+            f"{new_report.link}"
+        )
+
+
+class JsonlSink(ReplaySink):
+    """Write alerts and the disputes that would be sent to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: IO[str] = open(path, "w", encoding="utf-8")
+
+    def alert(self, msg: str) -> None:
+        self._write({"type": "alert", "message": msg})
+
+    def dispute(self, new_report: NewReport) -> None:
+        self._write({"type": "dispute", **json_record(new_report)})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class ReplayStats:
+    """Counts of a replay."""
+
+    events: int = 0
+    reports: int = 0  # events evaluated into a report
+    disputable: int = 0
+    alerts: int = 0
+    disputes: int = 0  # disputes the auto-disputer would send
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.seconds if self.seconds else 0.0
+
+
+class Replay:
+    """Evaluate recorded logs like the monitor does: parse, compare, alert and decide on disputes.
+
+    Alerts and disputes go to a dry-run sink instead of Discord and the chain,
+    and the logs are evaluated as fast as the workers allow. No request is sent
+    to a node, so reports that need one (e.g. the block lookup of an EVMCall)
+    fail and are counted as errors. Trusted values recorded with the logs are
+    used as is; for logs without one the feed's sources are asked, as usual.
+    """
+
+    def __init__(
+        self,
+        disp_cfg: AutoDisputerConfig,
+        sink: ReplaySink,
+        all_values: bool = False,
+        confidence_threshold: float = 0.1,
+        workers: int = 1,
+        trusted_value_ttl: float = DEFAULT_TRUSTED_VALUE_TTL,
+    ) -> None:
+        self.cfg = offline_config()
+        self.disp_cfg = disp_cfg
+        self.sink = sink
+        self.all_values = all_values
+        self.confidence_threshold = confidence_threshold
+        self.trusted_values = RecordedTrustedValues(ttl=trusted_value_ttl)
+        self.pipeline = ReportPipeline(self.handle_event, workers=workers)
+        self.stats = ReplayStats()
+        # recorded trusted values of the batch being evaluated, by transaction hash
+        self._trusted: Dict[str, Any] = {}
+
+    def send_alert(self, msg: str) -> None:
+        self.stats.alerts += 1
+        self.sink.alert(msg)
+
+    async def handle_event(self, chain_id: int, event: Any) -> None:
+        """Parse, alert on and decide whether to dispute a single recorded event."""
+        self.stats.events += 1
+        chain_cfg = chain_config(self.cfg, chain_id)
+        tx_hash = event.transactionHash.hex()
+        if (
+            HexBytes(Topics.NEW_ORACLE_ADDRESS) in event.topics
+            or HexBytes(Topics.NEW_PROPOSED_ORACLE_ADDRESS) in event.topics
+        ):
+            link = get_tx_explorer_url(cfg=chain_cfg, tx_hash=tx_hash)
+            generic_alert(msg=f"\n❗NEW ORACLE ADDRESS ALERT❗\n{link}")
+            return
+
+        token = recorded_trusted_value.set(self._trusted.pop(tx_hash, None))
+        try:
+            new_report = await parse_new_report_event(
+                cfg=chain_cfg,
+                monitored_feeds=self.disp_cfg.monitored_feeds or [],
+                log=event,
+                confidence_threshold=self.confidence_threshold,
+                trusted_values=self.trusted_values,
+                feed_index=self.disp_cfg.feed_index,
+            )
+        except Exception as e:
+            self.stats.errors += 1
+            logger.error(f"unable to parse new report event {tx_hash} on chain_id {chain_id}: {e}")
+            return
+        finally:
+            recorded_trusted_value.reset(token)
+
+        if new_report is None:
+            return
+        self.stats.reports += 1
+        if new_report.disputable:
+            self.stats.disputable += 1
+
+        alert(self.all_values, new_report)
+
+        if new_report.disputable and meant_to_dispute(self.disp_cfg, new_report):
+            self.stats.disputes += 1
+            self.sink.dispute(new_report)
+
+    async def run(self, records: Iterable[ReplayRecord], batch_size: int = REPLAY_BATCH_SIZE) -> ReplayStats:
+        """Evaluate the records in batches and return the counts."""
+        token = alert_sink.set(self.send_alert)
+        started = time.perf_counter()
+        try:
+            batch: List[ChainEvent] = []
+            for record in records:
+                batch.append((record.chain_id, record.log))
+                if record.trusted_value is not None:
+                    self._trusted[record.log["transactionHash"].hex()] = record.trusted_value
+                if len(batch) >= batch_size:
+                    await self.pipeline.process(batch)
+                    batch = []
+            await self.pipeline.process(batch)
+        finally:
+            self.stats.seconds = time.perf_counter() - started
+            self._trusted = {}
+            alert_sink.reset(token)
+        return self.stats
+
+
+@click.command()
+@click.argument("records", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-av", "--all-values", is_flag=True, default=False, show_default=True, help="if set, get alerts for all values"
+)
+@click.option(
+    "-c",
+    "--confidence-threshold",
+    help="set general confidence percentage threshold for monitoring only",
+    type=float,
+    default=0.1,
+)
+@click.option(
+    "--config",
+    "config_path",
+    help="disputer config with the feeds and thresholds to evaluate the reports against",
+    type=click.Path(exists=True, dir_okay=False),
+    default=DISPUTER_CONFIG_PATH,
+    show_default=True,
+)
+@click.option(
+    "--workers",
+    help="the number of reports to evaluate concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--trusted-value-ttl",
+    help="seconds a fetched trusted value is reused for reports of the same query",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TRUSTED_VALUE_TTL,
+    show_default=True,
+)
+@click.option("-o", "--output", help="file to write alerts and disputes to as JSON lines", type=click.Path())
+@click.option("-q", "--quiet", is_flag=True, help="drop alerts and disputes, only print the summary")
+@async_run
+async def main(
+    records: str,
+    all_values: bool,
+    confidence_threshold: float,
+    config_path: str,
+    workers: int,
+    trusted_value_ttl: float,
+    output: Optional[str],
+    quiet: bool,
+) -> None:
+    """Replay recorded NewReport logs, as JSON lines, without sending alerts, disputes or RPC requests."""
+    disp_cfg = AutoDisputerConfig(is_disputing=True, confidence_flag=confidence_threshold, path=config_path)
+    if output is not None:
+        sink: ReplaySink = JsonlSink(output)
+    elif quiet:
+        sink = ReplaySink()
+    else:
+        sink = PrintSink()
+
+    replay = Replay(
+        disp_cfg,
+        sink,
+        all_values=all_values,
+        confidence_threshold=confidence_threshold,
+        workers=workers,
+        trusted_value_ttl=trusted_value_ttl,
+    )
+    try:
+        stats = await replay.run(read_records(records))
+    finally:
+        sink.close()
+
+    click.echo(
+        f"replayed {stats.events} events in {stats.seconds:.2f}s ({stats.events_per_second:.0f} events/s): "
+        f"{stats.reports} reports, {stats.disputable} disputable, {stats.alerts} alerts, "
+        f"{stats.disputes} disputes, {stats.errors} errors"
+    )
+
+
+if __name__ == "__main__":
+    main()
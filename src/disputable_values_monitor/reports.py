@@ -0,0 +1,175 @@
+"""Append each evaluated report once to a CSV or NDJSON file."""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from disputable_values_monitor.utils import format_values
+from disputable_values_monitor.utils import get_logger
+from disputable_values_monitor.utils import NewReport
+
+logger = get_logger(__name__)
+
+REPORT_FILE = "table.csv"
+REPORT_FORMATS = ("csv", "ndjson")
+REPORT_FLUSH_INTERVAL = 2.0  # seconds a report may wait in the buffer
+REPORT_BUFFER_SIZE = 100  # reports buffered before they're written regardless of the interval
+REPORT_FILE_MAX_BYTES = 64 * 1024 * 1024  # size at which the file is rotated
+REPORT_FILE_BACKUPS = 5  # rotated files kept, as <file>.1 (newest) to <file>.5
+WRITTEN_REPORTS = 10_000  # reports remembered so one handled again isn't written twice
+
+# (chain_id, transaction hash, log index)
+ReportKey = Tuple[int, str, int]
+
+CSV_COLUMNS = ("When", "Transaction", "QueryType", "Asset", "Currency", "Value", "Disputable", "ChainId")
+
+
+def infer_report_format(path: str) -> str:
+    """Format of a report file from its extension: ndjson for .ndjson/.jsonl files, csv otherwise."""
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def csv_row(new_report: NewReport) -> List[Any]:
+    """Report as a row of the dashboard table."""
+    return [
+        new_report.submission_timestamp,
+        new_report.link,
+        new_report.query_type,
+        new_report.asset,
+        new_report.currency,
+        format_values(new_report.value),
+        new_report.status_str,
+        new_report.chain_id,
+    ]
+
+
+def json_record(new_report: NewReport) -> Dict[str, Any]:
+    """Report as a JSON object, with its full value."""
+    value = new_report.value
+    if isinstance(value, bytes):
+        value = "0x" + value.hex()
+    elif not isinstance(value, (str, int, float)):
+        value = str(value)
+    return {
+        "tx_hash": new_report.tx_hash,
+        "log_index": new_report.log_index,
+        "submission_timestamp": new_report.submission_timestamp,
+        "chain_id": new_report.chain_id,
+        "query_id": new_report.query_id,
+        "query_type": new_report.query_type,
+        "asset": new_report.asset,
+        "currency": new_report.currency,
+        "value": value,
+        "disputable": new_report.disputable,
+        "status": new_report.status_str,
+        "link": new_report.link,
+    }
+
+
+class ReportSink:
+    """Buffered, append-only file of evaluated reports.
+
+    Each report is written exactly once: the last `remember` reports
+    written are keyed by chain, transaction and log index, and skipped if
+    they come again, e.g. when rescanned for reorgs. Reports are buffered and
+    written together once REPORT_BUFFER_SIZE of them are waiting or the
+    oldest has waited flush_interval seconds. When the file grows past max_bytes it is
+    renamed to <file>.1 (shifting older files up to <file>.<backups>) and a
+    new file is started.
+    """
+
+    def __init__(
+        self,
+        path: str = REPORT_FILE,
+        fmt: str = "csv",
+        flush_interval: float = REPORT_FLUSH_INTERVAL,
+        buffer_size: int = REPORT_BUFFER_SIZE,
+        max_bytes: int = REPORT_FILE_MAX_BYTES,
+        backups: int = REPORT_FILE_BACKUPS,
+        remember: int = WRITTEN_REPORTS,
+    ) -> None:
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"unsupported report format {fmt}, expected one of {REPORT_FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        self.remember = remember
+        self._keys: "OrderedDict[ReportKey, None]" = OrderedDict()
+        self._buffer: List[str] = []
+        self._oldest: float = 0.0
+
+    def write(self, new_report: NewReport) -> None:
+        """Buffer a report, flushing if the buffer is full or has waited long enough."""
+        key = (new_report.chain_id, new_report.tx_hash, new_report.log_index)
+        if key in self._keys:
+            logger.debug(f"report {new_report.tx_hash} on chain_id {new_report.chain_id} was already written")
+            return
+        self._keys[key] = None
+        if len(self._keys) > self.remember:
+            self._keys.popitem(last=False)
+        if not self._buffer:
+            self._oldest = time.monotonic()
+        self._buffer.append(self.encode(new_report))
+        if len(self._buffer) >= self.buffer_size or time.monotonic() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def encode(self, new_report: NewReport) -> str:
+        """Line of the file for a report."""
+        if self.fmt == "ndjson":
+            return json.dumps(json_record(new_report), ensure_ascii=False) + "\n"
+        line = io.StringIO()
+        csv.writer(line).writerow(csv_row(new_report))
+        return line.getvalue()
+
+    def flush(self) -> None:
+        """Write the buffered reports."""
+        if not self._buffer:
+            return
+        try:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                if new_file and self.fmt == "csv":
+                    csv.writer(f).writerow(CSV_COLUMNS)
+                f.writelines(self._buffer)
+                size = f.tell()
+        except OSError as e:
+            logger.error(f"unable to write {len(self._buffer)} reports to {self.path}: {e}")
+            return
+        self.written += len(self._buffer)
+        self._buffer = []
+        if size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        """Move the file to <file>.1, shifting the older ones."""
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+        except OSError as e:
+            logger.error(f"unable to rotate {self.path}: {e}")
+
+    async def autoflush(self) -> None:
+        """Flush buffered reports every flush_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self) -> None:
+        """Write whatever is still buffered."""
+        self.flush()
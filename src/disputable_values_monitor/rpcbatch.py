@@ -0,0 +1,223 @@
+"""JSON-RPC requests made at the same time to an endpoint, sent as one HTTP batch."""
+import json
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import requests
+from eth_typing import URI
+from requests.exceptions import HTTPError
+from web3 import HTTPProvider
+from web3._utils.request import make_post_request
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_WINDOW = 0.002  # seconds a request waits for others to join its batch
+MAX_BATCH_SIZE = 50
+# statuses of providers refusing batches, as opposed to failing or rate limiting
+REJECTED_STATUSES = (400, 404, 405, 413, 415, 501)
+# error messages of providers refusing batches, lowercased
+REJECTED_MESSAGES = ("batch",)
+REQUEST_TIMEOUT = 10  # seconds, like web3's default
+# requests that can return large responses and shouldn't hold up the rest of a batch
+UNBATCHED_METHODS = ("eth_getLogs",)
+
+_timing = threading.local()
+
+
+def start_request_timer() -> float:
+    """Start timing a request made from this thread."""
+    _timing.duration = None
+    return time.perf_counter()
+
+
+def request_duration(started: float) -> float:
+    """Seconds a request timed with start_request_timer took.
+
+    For requests sent by a BatchingHTTPProvider that's the time its POST
+    took, not counting the time spent waiting for the batch to fill up."""
+    duration: Optional[float] = getattr(_timing, "duration", None)
+    return duration if duration is not None else time.perf_counter() - started
+
+
+class PendingRequest:
+    """A request waiting for its batch to be answered."""
+
+    def __init__(self, method: RPCEndpoint, params: Any) -> None:
+        self.method = method
+        self.params = params
+        self.response: Optional[RPCResponse] = None
+        self.error: Optional[Exception] = None
+        # seconds the POST answering the request took
+        self.duration: Optional[float] = None
+        self.ready = threading.Event()
+
+    def answer(
+        self, response: Optional[RPCResponse] = None, error: Optional[Exception] = None, duration: float = 0.0
+    ) -> None:
+        self.response = response
+        self.error = error
+        self.duration = duration
+        self.ready.set()
+
+
+class BatchingHTTPProvider(HTTPProvider):
+    """HTTP provider sending requests made at the same time as one JSON-RPC batch.
+
+    The first request of a burst waits `window` seconds, then sends every
+    request made meanwhile in one POST and hands each thread its response.
+    Requests made after that start the next batch right away, so several
+    batches can be in flight at once. eth_getLogs requests are always sent on
+    their own, and providers refusing batches get every request on its own
+    from then on. Requests are posted through `session` from every thread if
+    one is given, instead of through a session per thread like web3 does.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: str,
+        request_kwargs: Optional[Any] = None,
+        window: float = BATCH_WINDOW,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        super().__init__(endpoint_uri, request_kwargs)
+        self.uri = URI(endpoint_uri)
+        self.session = session
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batches_supported = True
+        # the batch still taking requests
+        self._open: Optional[List[PendingRequest]] = None
+        self._lock = threading.Lock()
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if not self.batches_supported or method in UNBATCHED_METHODS:
+            started = time.perf_counter()
+            try:
+                return self.make_single_request(method, params)
+            finally:
+                _timing.duration = time.perf_counter() - started
+
+        request = PendingRequest(method, params)
+        with self._lock:
+            batch = self._open
+            leading = batch is None
+            if batch is None:
+                batch = self._open = []
+            batch.append(request)
+            # full batches are sent by their leader without taking more requests
+            if len(batch) >= self.max_batch_size:
+                self._open = None
+
+        if leading:
+            if self.window:
+                time.sleep(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._send(batch)
+        else:
+            request.ready.wait()
+
+        _timing.duration = request.duration
+        if request.error is not None:
+            raise request.error
+        assert request.response is not None
+        return request.response
+
+    def _send(self, batch: List[PendingRequest]) -> None:
+        started = time.perf_counter()
+        if len(batch) == 1:
+            request = batch[0]
+            try:
+                response = self.make_single_request(request.method, request.params)
+            except Exception as e:
+                request.answer(error=e, duration=time.perf_counter() - started)
+            else:
+                request.answer(response, duration=time.perf_counter() - started)
+            return
+        try:
+            responses = self.make_batch_request([(request.method, request.params) for request in batch])
+        except Exception as e:
+            for request in batch:
+                request.answer(error=e, duration=time.perf_counter() - started)
+        else:
+            for request, response in zip(batch, responses):
+                request.answer(response, duration=time.perf_counter() - started)
+
+    def make_batch_request(self, requests: Sequence[Tuple[RPCEndpoint, Any]]) -> List[RPCResponse]:
+        """Responses to the requests, sent as one batch if the provider accepts batches."""
+        if not self.batches_supported:
+            return [self.make_single_request(method, params) for method, params in requests]
+
+        encoded = [self.encode_rpc_request(method, params) for method, params in requests]
+        ids = [json.loads(request)["id"] for request in encoded]
+        try:
+            raw_response = self.post(b"[" + b",".join(encoded) + b"]")
+        except HTTPError as e:
+            if e.response is None or e.response.status_code not in REJECTED_STATUSES:
+                raise
+            return self.reject_batches(requests)
+        try:
+            decoded: Any = self.decode_rpc_response(raw_response)
+        except ValueError as e:
+            logger.warning(f"unable to decode the batch response of {self.endpoint_uri}, sending it one by one: {e}")
+            return [self.make_single_request(method, params) for method, params in requests]
+
+        if isinstance(decoded, dict) and rejects_batches(decoded):
+            return self.reject_batches(requests)
+        if isinstance(decoded, dict) and "error" in decoded:
+            # an error for the whole batch, e.g. a rate limit, is every request's error
+            return [{**decoded, "id": request_id} for request_id in ids]  # type: ignore[typeddict-item]
+        if not isinstance(decoded, list):
+            raise ValueError(f"unexpected batch response from {self.endpoint_uri}: {decoded!r}")
+
+        by_id: Dict[Any, RPCResponse] = {
+            response.get("id"): response for response in decoded if isinstance(response, dict)
+        }
+        responses = []
+        for (method, params), request_id in zip(requests, ids):
+            response = by_id.get(request_id)
+            if response is None:
+                # left out of the batch response, e.g. by a provider capping batch sizes
+                response = self.make_single_request(method, params)
+            responses.append(response)
+        return responses
+
+    def reject_batches(self, requests: Sequence[Tuple[RPCEndpoint, Any]]) -> List[RPCResponse]:
+        """Send requests one by one from now on, starting with these."""
+        logger.info(f"{self.endpoint_uri} doesn't accept batched requests, sending them one by one")
+        self.batches_supported = False
+        return self.make_batch_request(requests)
+
+    def make_single_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Response to a request sent on its own."""
+        response: RPCResponse = self.decode_rpc_response(self.post(self.encode_rpc_request(method, params)))
+        return response
+
+    def post(self, data: bytes) -> bytes:
+        """Raw response to a JSON-RPC payload."""
+        if self.session is None:
+            return make_post_request(self.uri, data, **self.get_request_kwargs())
+        kwargs = self.get_request_kwargs()
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        response = self.session.post(self.uri, data=data, **kwargs)
+        response.raise_for_status()
+        return response.content
+
+
+def rejects_batches(response: Dict[str, Any]) -> bool:
+    """Whether an error response says the provider doesn't accept batches."""
+    error = response.get("error")
+    message = str(error.get("message", "")) if isinstance(error, dict) else str(error or "")
+    return any(rejected in message.lower() for rejected in REJECTED_MESSAGES)
@@ -0,0 +1,123 @@
+"""Poll each chain on its own schedule."""
+import asyncio
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from telliot_core.apps.telliot_config import TelliotConfig
+from web3 import Web3
+
+from disputable_values_monitor import MAX_POLL_INTERVAL
+from disputable_values_monitor import MIN_POLL_INTERVAL
+from disputable_values_monitor import STREAMING_POLL_INTERVAL
+from disputable_values_monitor import WAIT_PERIOD
+from disputable_values_monitor.blocks import get_block
+from disputable_values_monitor.endpoints import endpoint_pool
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+BLOCK_TIME_SAMPLE = 100  # number of blocks used to estimate a chain's block time
+
+
+def estimate_block_time(w3: Web3, sample: int = BLOCK_TIME_SAMPLE) -> Optional[float]:
+    """Average time between the latest blocks of a chain, in seconds."""
+    latest = get_block(w3, "latest")
+    latest_number: int = latest["number"]
+    earlier_number = max(latest_number - sample, 0)
+    if earlier_number == latest_number:
+        return None
+    earlier = get_block(w3, earlier_number)
+    return float(latest["timestamp"] - earlier["timestamp"]) / (latest_number - earlier_number)
+
+
+def poll_interval(block_time: Optional[float]) -> float:
+    """Seconds between polls of a chain with the given block time."""
+    if block_time is None:
+        return WAIT_PERIOD
+    return min(max(block_time, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+
+
+def monitored_chain_ids(cfg: TelliotConfig) -> List[int]:
+    """Chain ids of the configured endpoints, in config order."""
+    chain_ids = []
+    for endpoint in cfg.endpoints.endpoints:
+        if endpoint.url.endswith("{INFURA_API_KEY}"):
+            continue
+        if endpoint.chain_id is not None and endpoint.chain_id not in chain_ids:
+            chain_ids.append(endpoint.chain_id)
+    return chain_ids
+
+
+class ChainScheduler:
+    """Run one polling task per chain.
+
+    Each chain is polled at its own interval: the fixed `wait` if one is given,
+    otherwise the chain's block time. A chain whose poll is slow or failing only
+    delays itself. Chains whose logs are streamed are only polled every
+    STREAMING_POLL_INTERVAL seconds, to catch anything the stream missed, and
+    can be woken up to poll right away.
+    """
+
+    def __init__(
+        self,
+        cfg: TelliotConfig,
+        poll: Callable[[int], Awaitable[None]],
+        wait: Optional[float] = None,
+    ) -> None:
+        self.cfg = cfg
+        self.poll = poll
+        self.wait = wait
+        self.intervals: Dict[int, float] = {}
+        # chains whose logs are currently pushed by a websocket
+        self.streaming: Set[int] = set()
+        self._wakeups: Dict[int, asyncio.Event] = {}
+
+    def wake(self, chain_id: int) -> None:
+        """Poll a chain now instead of at its next interval."""
+        self._wakeups.setdefault(chain_id, asyncio.Event()).set()
+
+    async def interval(self, chain_id: int) -> float:
+        """Seconds between polls of a chain."""
+        if chain_id in self.streaming:
+            return max(self.wait or 0, STREAMING_POLL_INTERVAL)
+        if self.wait is not None:
+            return self.wait
+        if chain_id not in self.intervals:
+            block_time = None
+            try:
+                endpoint = endpoint_pool.get(self.cfg, chain_id)
+                if endpoint is None:
+                    raise ValueError("no endpoint connects")
+                block_time = await asyncio.to_thread(estimate_block_time, endpoint.web3)
+            except Exception as e:
+                logger.warning(f"unable to estimate block time on chain_id {chain_id}: {e}")
+                # try again next poll
+                return WAIT_PERIOD
+            self.intervals[chain_id] = poll_interval(block_time)
+            logger.info(f"polling chain_id {chain_id} every {self.intervals[chain_id]:.2f} seconds")
+        return self.intervals[chain_id]
+
+    async def run_chain(self, chain_id: int) -> None:
+        """Poll a single chain forever."""
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll(chain_id)
+            except Exception as e:
+                logger.error(f"unable to poll chain_id {chain_id}: {e}")
+            interval = await self.interval(chain_id)
+            wakeup = self._wakeups.setdefault(chain_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=max(interval - (time.monotonic() - started), 0))
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    async def run(self, chain_ids: List[int]) -> None:
+        """Poll the given chains until cancelled."""
+        await asyncio.gather(*(self.run_chain(chain_id) for chain_id in chain_ids))
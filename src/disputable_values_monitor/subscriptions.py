@@ -0,0 +1,137 @@
+"""Logs pushed by a websocket endpoint as soon as they're mined."""
+import asyncio
+import json
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import websockets
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.types import LogReceipt
+
+from disputable_values_monitor.logs import LogFilterPlan
+from disputable_values_monitor.metrics import events_fetched
+from disputable_values_monitor.pipeline import ChainEvent
+from disputable_values_monitor.utils import get_logger
+
+logger = get_logger(__name__)
+
+SUBSCRIBE_TIMEOUT = 10  # seconds to wait for a subscription to be confirmed
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)  # seconds between reconnection attempts, the last one repeated
+PING_INTERVAL = 20  # seconds between keepalive pings
+
+LogsHandler = Callable[[List[ChainEvent]], Awaitable[None]]
+
+
+def format_log(log: Dict[str, Any]) -> LogReceipt:
+    """A log of a subscription in the format of the logs returned by eth_getLogs."""
+    formatted = AttributeDict(
+        {
+            "address": Web3.to_checksum_address(log["address"]),
+            "blockHash": HexBytes(log["blockHash"]),
+            "blockNumber": int(log["blockNumber"], 16),
+            "data": HexBytes(log["data"]),
+            "logIndex": int(log["logIndex"], 16),
+            "removed": bool(log.get("removed", False)),
+            "topics": [HexBytes(topic) for topic in log["topics"]],
+            "transactionHash": HexBytes(log["transactionHash"]),
+            "transactionIndex": int(log["transactionIndex"], 16),
+        }
+    )
+    return formatted  # type: ignore
+
+
+def parse_ws_url(value: str) -> Optional[Tuple[int, str]]:
+    """Parse a CHAIN_ID=URL pair, or return None if it isn't one."""
+    chain_id, _, url = value.partition("=")
+    if not chain_id.strip().isdigit() or not url.startswith(("ws://", "wss://")):
+        return None
+    return int(chain_id), url
+
+
+class LogStream:
+    """Stream the logs of a chain's filter plan from a websocket endpoint.
+
+    Logs are handed to `on_logs` as soon as the endpoint pushes them. When the
+    connection drops it's retried with a growing delay; every time the
+    subscription is (re)established `on_connect` is called so the caller can
+    backfill the blocks mined meanwhile with eth_getLogs, and `on_disconnect`
+    when it's lost so the caller can fall back to polling.
+    """
+
+    def __init__(
+        self,
+        chain_id: int,
+        url: str,
+        plan: LogFilterPlan,
+        on_logs: LogsHandler,
+        on_connect: Optional[Callable[[], None]] = None,
+        on_disconnect: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.chain_id = chain_id
+        self.url = url
+        self.plan = plan
+        self.on_logs = on_logs
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.connected = False
+
+    async def subscribe(self, ws: Any) -> str:
+        """Subscribe to the plan's logs, returning the subscription id."""
+        log_filter = {"address": self.plan.addresses, "topics": self.plan.topics}
+        await ws.send(
+            json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["logs", log_filter]})
+        )
+        while True:
+            response = json.loads(await asyncio.wait_for(ws.recv(), timeout=SUBSCRIBE_TIMEOUT))
+            if response.get("id") != 1:
+                continue
+            if "error" in response:
+                raise ValueError(f"subscription rejected: {response['error']}")
+            return str(response["result"])
+
+    async def listen(self) -> None:
+        """Connect, subscribe and hand over logs until the connection drops."""
+        async with websockets.connect(self.url, ping_interval=PING_INTERVAL) as ws:
+            subscription = await self.subscribe(ws)
+            self.connected = True
+            logger.info(f"streaming logs of chain_id {self.chain_id} from its websocket endpoint")
+            if self.on_connect is not None:
+                self.on_connect()
+            async for message in ws:
+                notification = json.loads(message)
+                params = notification.get("params") or {}
+                if notification.get("method") != "eth_subscription" or params.get("subscription") != subscription:
+                    continue
+                log = format_log(params["result"])
+                # logs of reorged blocks are pushed again with removed set; the new chain's logs follow
+                if log["removed"]:
+                    continue
+                routed = self.plan.route([log])
+                if routed:
+                    events_fetched.inc(len(routed), chain_id=self.chain_id)
+                    await self.on_logs([(self.chain_id, routed_log) for routed_log in routed])
+
+    async def run(self) -> None:
+        """Stream logs until cancelled, reconnecting whenever the connection drops."""
+        attempt = 0
+        while True:
+            try:
+                await self.listen()
+            except Exception as e:
+                logger.warning(f"websocket of chain_id {self.chain_id} failed: {e}")
+            if self.connected:
+                self.connected = False
+                attempt = 0
+                if self.on_disconnect is not None:
+                    self.on_disconnect()
+            delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+            attempt += 1
+            logger.info(f"reconnecting to the websocket of chain_id {self.chain_id} in {delay} seconds")
+            await asyncio.sleep(delay)
@@ -1,4 +1,5 @@
 """Helper functions."""
+import copy
 import logging
 import os
 from dataclasses import dataclass
@@ -23,6 +24,17 @@ def get_tx_explorer_url(tx_hash: str, cfg: TelliotConfig) -> str:
         return f"Explorer not defined for chain_id {cfg.main.chain_id}"
 
 
+def chain_config(cfg: TelliotConfig, chain_id: int) -> TelliotConfig:
+    """Copy of the config selecting chain_id, sharing endpoints with the original.
+
+    Lets concurrent tasks each work on their own chain without overwriting
+    the chain selected in the shared config."""
+    chain_cfg = copy.copy(cfg)
+    chain_cfg.main = copy.copy(cfg.main)
+    chain_cfg.main.chain_id = chain_id
+    return chain_cfg
+
+
 @dataclass
 class Topics:
     """Topics for Tellor events."""
@@ -54,6 +66,8 @@ class NewReport:
     query_id: str = ""
     disputable: Optional[bool] = None
     status_str: str = ""
+    detected_at: float = 0.0  # unix time the DVM parsed the event
+    log_index: int = 0  # index of the NewReport log in its block
 
 
 def disputable_str(disputable: Optional[bool], query_id: str) -> str:
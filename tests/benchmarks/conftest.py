@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(scope="function", autouse=True)
+def reset_chain():
+    """Benchmarks run without a local node, so there is no chain to reset"""
+    yield
@@ -0,0 +1,35 @@
+"""A local, in-memory chain that counts the RPC calls made to it."""
+import random
+from collections import Counter
+
+
+class MockEth:
+    def __init__(self, chain):
+        self.chain = chain
+
+    @property
+    def block_number(self):
+        self.chain.calls["eth_blockNumber"] += 1
+        return len(self.chain.timestamps) - 1
+
+    def get_block(self, block):
+        self.chain.calls["eth_getBlockByNumber"] += 1
+        number = len(self.chain.timestamps) - 1 if block == "latest" else block
+        return {"number": number, "timestamp": self.chain.timestamps[number]}
+
+
+class MockChain:
+    """Web3 stand-in with irregular block times and an RPC call counter"""
+
+    def __init__(self, num_blocks: int = 1_000_000, block_time: int = 12, missed_slots: float = 0.02, seed: int = 0):
+        rng = random.Random(seed)
+        self.timestamps = [1_600_000_000]
+        for _ in range(num_blocks - 1):
+            # regular blocks with some missed slots
+            self.timestamps.append(self.timestamps[-1] + block_time * (2 if rng.random() < missed_slots else 1))
+        self.calls = Counter()
+        self.eth = MockEth(self)
+
+    @property
+    def rpc_calls(self) -> int:
+        return sum(self.calls.values())
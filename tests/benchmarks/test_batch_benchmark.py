@@ -0,0 +1,44 @@
+"""Benchmark: checking thousands of historical reports, one by one vs in a batch."""
+import asyncio
+import random
+import time
+from unittest import mock
+
+from telliot_feeds.feeds import eth_usd_median_feed
+
+from disputable_values_monitor.batch import disputable_mask
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import MonitoredFeed
+from disputable_values_monitor.data import Threshold
+
+
+async def scalar_results(feed: MonitoredFeed, reported: list, trusted: list) -> list:
+    trusted_values = [(trusted_val, None) for trusted_val in trusted]
+    with mock.patch.object(MonitoredFeed, "fetch_trusted_value", mock.AsyncMock(side_effect=trusted_values)):
+        return [await feed.is_disputable(None, reported_val) for reported_val in reported]
+
+
+def test_batch_vs_scalar():
+    rng = random.Random(7)
+    count = 5_000
+    trusted = [rng.uniform(1000, 4000) for _ in range(count)]
+    reported = [t * rng.uniform(0.3, 1.7) for t in trusted]
+    # a few rows the scalar path can't evaluate either
+    trusted[::500] = [0.0] * len(trusted[::500])
+
+    feed = MonitoredFeed(eth_usd_median_feed, Threshold(Metrics.Percentage, amount=0.5))
+
+    started = time.perf_counter()
+    scalar = asyncio.run(scalar_results(feed, reported, trusted))
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = disputable_mask(feed.threshold, reported, trusted)
+    batch_seconds = time.perf_counter() - started
+
+    print(
+        f"\n{count} percentage checks: scalar {scalar_seconds * 1e3:.1f} ms, batch {batch_seconds * 1e3:.2f} ms "
+        f"({scalar_seconds / batch_seconds:.0f}x)"
+    )
+    assert [None if not e else bool(d) for d, e in zip(batch.disputable, batch.evaluated)] == scalar
+    assert batch_seconds * 10 < scalar_seconds
@@ -0,0 +1,36 @@
+"""Benchmark: RPC calls per block-by-timestamp lookup."""
+import math
+import random
+
+from disputable_values_monitor.blocks import BlockIndex
+from tests.benchmarks.mock_chain import MockChain
+
+
+def binary_search_calls(chain: MockChain) -> float:
+    """calls made by a plain binary search over the whole chain, as the monitor used to do"""
+    return math.log2(len(chain.timestamps)) + 3
+
+
+def test_rpc_calls_per_lookup():
+    chain = MockChain(num_blocks=1_000_000)
+    index = BlockIndex()
+    rng = random.Random(42)
+    # EVMCall reports ask for recent blocks
+    head = chain.timestamps[-1]
+    timestamps = [head - rng.randint(0, 7 * 24 * 3600) for _ in range(200)]
+
+    index.find_block(chain, 1, timestamps[0])
+    cold_calls = chain.rpc_calls
+
+    chain.calls.clear()
+    for timestamp in timestamps[1:]:
+        index.find_block(chain, 1, timestamp)
+    warm_calls = chain.rpc_calls / (len(timestamps) - 1)
+
+    print(
+        f"\nblock lookups on a {len(chain.timestamps)} block chain: "
+        f"first lookup {cold_calls} rpc calls, then {warm_calls:.2f} per lookup "
+        f"(binary search: ~{binary_search_calls(chain):.0f})"
+    )
+    assert cold_calls < binary_search_calls(chain)
+    assert warm_calls <= 4
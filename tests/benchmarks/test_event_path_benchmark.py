@@ -0,0 +1,226 @@
+"""Benchmark: each stage of handling a NewReport event, from the raw log to the alert.
+
+Runs offline on recorded logs, with the price sources and block lookups stubbed,
+and writes the results as JSON to $BENCHMARK_RESULTS (benchmark-results.json
+by default) so runs before and after an upgrade can be compared.
+"""
+import asyncio
+import json
+import os
+import platform
+import statistics
+import time
+from importlib.metadata import version
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from unittest import mock
+
+import pytest
+from hexbytes import HexBytes
+from telliot_core.apps.telliot_config import TelliotConfig
+from telliot_feeds.datafeed import DataFeed
+from telliot_feeds.feeds import eth_usd_median_feed
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+from disputable_values_monitor import EXAMPLE_NEW_REPORT_EVENT_TX_RECEIPT
+from disputable_values_monitor import NEW_REPORT_ABI
+from disputable_values_monitor.data import FeedIndex
+from disputable_values_monitor.data import get_query_from_data
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import MonitoredFeed
+from disputable_values_monitor.data import parse_new_report_event
+from disputable_values_monitor.data import Threshold
+from disputable_values_monitor.discord import alert
+from disputable_values_monitor.query_data import decode_query_data
+from disputable_values_monitor.reports import csv_row
+from disputable_values_monitor.reports import json_record
+from disputable_values_monitor.utils import NewReport
+
+RESULTS_FILE = os.getenv("BENCHMARK_RESULTS", "benchmark-results.json")
+ITERATIONS = 2000
+# trusted values equal to the recorded reports: the ETH/USD price and the total supply returned by the EVMCall
+ETH_USD_PRICE = 1293.51
+EVM_CALL_RESULT = HexBytes("0x000000000000000000000000000000000000000000020c4abd206827e8190955")
+
+
+def offline_config() -> TelliotConfig:
+    """Config selecting mainnet, whose endpoint has a web3 instance that never sends a request."""
+    cfg = TelliotConfig()
+    cfg.main.chain_id = 1
+    endpoint = cfg.endpoints.find(chain_id=1)[0]
+    endpoint._web3 = Web3()
+    return cfg
+
+
+async def fake_fetch(feed: Any, *args: Any) -> Any:
+    """Trusted values of the recorded reports, without asking a source."""
+    if args:
+        return (EVM_CALL_RESULT, 1681397830), None
+    return ETH_USD_PRICE, None
+
+
+def latency(run: Callable[[], Any], iterations: int = ITERATIONS) -> Dict[str, float]:
+    """Per call latency of run, in microseconds, and the calls per second it adds up to."""
+    run()  # warm up caches and imports
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return summarize(samples)
+
+
+async def async_latency(run: Callable[[], Any], iterations: int = ITERATIONS) -> Dict[str, float]:
+    """latency() of a coroutine function"""
+    await run()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await run()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return summarize(samples)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "iterations": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p95_us": samples[int(len(samples) * 0.95)] * 1e6,
+        "max_us": samples[-1] * 1e6,
+        "per_second": len(samples) / sum(samples),
+    }
+
+
+@pytest.fixture(scope="module")
+def results():
+    """Stage results, written to RESULTS_FILE once every benchmark of the module has run."""
+    stages: Dict[str, Dict[str, float]] = {}
+    yield stages
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "packages": {name: version(name) for name in ("web3", "eth-abi", "telliot-core", "telliot-feeds")},
+        "stages": stages,
+    }
+    with open(RESULTS_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'stage':<34} | {'p50':>10} | {'p95':>10} | {'per second':>10}")
+    for stage, r in stages.items():
+        print(f"{stage:<34} | {r['p50_us']:>7.1f} us | {r['p95_us']:>7.1f} us | {r['per_second']:>10.0f}")
+    print(f"results written to {RESULTS_FILE}")
+
+
+@pytest.fixture
+def logs(eth_usd_report_log, evm_call_log):
+    return {"SpotPrice": eth_usd_report_log, "EVMCall": evm_call_log}
+
+
+@pytest.fixture
+def monitored_feeds(logs):
+    """Monitored feeds matching the recorded logs"""
+    codec = Web3().codec
+    evm_call = get_query_from_data(get_event_data(codec, NEW_REPORT_ABI, logs["EVMCall"]).args._queryData)
+    return [
+        MonitoredFeed(eth_usd_median_feed, Threshold(Metrics.Percentage, amount=0.75)),
+        MonitoredFeed(
+            DataFeed(query=evm_call, source=eth_usd_median_feed.source),
+            Threshold(Metrics.Equality, amount=None),
+        ),
+    ]
+
+
+def test_event_decoding(results, logs):
+    codec = Web3().codec
+    for query_type, log in logs.items():
+        assert get_event_data(codec, NEW_REPORT_ABI, log).args._time > 0
+        results[f"get_event_data[{query_type}]"] = latency(lambda: get_event_data(codec, NEW_REPORT_ABI, log))
+
+
+def test_query_data_decoding(results, logs):
+    codec = Web3().codec
+    for query_type, log in logs.items():
+        query_data = get_event_data(codec, NEW_REPORT_ABI, log).args._queryData
+        assert get_query_from_data(query_data).__class__.__name__ == query_type
+        # cold decodes, as for a queryData seen for the first time
+        results[f"decode_query_data[{query_type}]"] = latency(lambda: decode_query_data(query_data), 200)
+        results[f"get_query_from_data[{query_type}]"] = latency(lambda: get_query_from_data(query_data))
+
+
+def test_feed_matching(results, logs, monitored_feeds):
+    codec = Web3().codec
+    index = FeedIndex.build(monitored_feeds)
+    for query_type, log in logs.items():
+        query_id = "0x" + get_event_data(codec, NEW_REPORT_ABI, log).args._queryId.hex()
+        assert index.get(query_id, query_type) is not None
+        results[f"feed_index[{query_type}]"] = latency(lambda: index.get(query_id, query_type))
+
+
+def test_is_disputable(results, monitored_feeds):
+    cfg = offline_config()
+    reported = {
+        "SpotPrice": ETH_USD_PRICE * 1.01,
+        "EVMCall": (bytes(EVM_CALL_RESULT), 1681397830),
+    }
+
+    async def run() -> None:
+        for mf in monitored_feeds:
+            query_type = mf.feed.query.__class__.__name__
+            assert await mf.is_disputable(cfg, reported[query_type]) is False
+            results[f"is_disputable[{query_type}]"] = await async_latency(
+                lambda: mf.is_disputable(cfg, reported[query_type])
+            )
+
+    with mock.patch("disputable_values_monitor.data.general_fetch_new_datapoint", fake_fetch), mock.patch(
+        "disputable_values_monitor.data.get_block_number_at_timestamp", return_value=34326172
+    ):
+        asyncio.run(run())
+
+
+def test_alert_and_format(results):
+    args = EXAMPLE_NEW_REPORT_EVENT_TX_RECEIPT[0].args
+    new_report = NewReport(
+        chain_id=1,
+        tx_hash="0x" + "ab" * 32,
+        submission_timestamp=args._time,
+        link="https://etherscan.io/tx/0x" + "ab" * 32,
+        query_type="SpotPrice",
+        value=1292.956937,
+        status_str="yes ❗📲",
+        asset="ohm",
+        currency="eth",
+        query_id="0x" + args._queryId.hex(),
+        disputable=True,
+    )
+    with mock.patch("disputable_values_monitor.discord.send_discord_msg") as send:
+        results["alert"] = latency(lambda: alert(False, new_report))
+        assert send.called
+    results["csv_row"] = latency(lambda: csv_row(new_report))
+    results["json_record"] = latency(lambda: json_record(new_report))
+
+
+def test_parse_new_report_event(results, logs, monitored_feeds):
+    """Whole path of an event, with events per second as per_second"""
+    cfg = offline_config()
+    index = FeedIndex.build(monitored_feeds)
+
+    async def run() -> None:
+        for query_type, log in logs.items():
+            new_report = await parse_new_report_event(cfg, log, 0.75, monitored_feeds, feed_index=index)
+            assert new_report is not None and new_report.disputable is False
+            results[f"parse_new_report_event[{query_type}]"] = await async_latency(
+                lambda: parse_new_report_event(cfg, log, 0.75, monitored_feeds, feed_index=index), 500
+            )
+            # parsing switches the chain to the one of an EVMCall query
+            cfg.main.chain_id = 1
+
+    with mock.patch("disputable_values_monitor.data.general_fetch_new_datapoint", fake_fetch), mock.patch(
+        "disputable_values_monitor.data.get_block_number_at_timestamp", return_value=34326172
+    ):
+        asyncio.run(run())
@@ -0,0 +1,63 @@
+"""Benchmark: matching a report to its monitored feed as the feed list grows."""
+import timeit
+
+from hexbytes import HexBytes
+from telliot_feeds.datafeed import DataFeed
+from telliot_feeds.feeds import eth_usd_median_feed
+from telliot_feeds.queries.evm_call import EVMCall
+
+from disputable_values_monitor.data import FeedIndex
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import MonitoredFeed
+from disputable_values_monitor.data import Threshold
+
+
+ADDRESS = "0x88dF592F8eb5D7Bd38bFeF7dEb0fBc02cf3778a0"
+
+
+def monitored_feeds(n: int) -> list:
+    threshold = Threshold(Metrics.Percentage, amount=0.75)
+    return [
+        MonitoredFeed(
+            DataFeed(query=EVMCall(1, ADDRESS, i.to_bytes(4, "big")), source=eth_usd_median_feed.source), threshold
+        )
+        for i in range(n)
+    ]
+
+
+def linear_match(feeds: list, query_id: str) -> object:
+    """match by scanning every feed, as parse_new_report_event used to"""
+    match = None
+    for mf in feeds:
+        if HexBytes(mf.feed.query.query_id).hex() == query_id:
+            match = mf
+    return match
+
+
+def seconds_per_match(match, number: int) -> float:
+    return min(timeit.repeat(match, number=number, repeat=3)) / number
+
+
+def test_match_cost_stays_flat():
+    results = {}
+    for n in (10, 100, 1000):
+        feeds = monitored_feeds(n)
+        index = FeedIndex.build(feeds)
+        # worst case for the scan: the last configured feed
+        query_id = HexBytes(feeds[-1].feed.query.query_id).hex()
+        assert index.get(query_id, "EVMCall") is feeds[-1]
+        assert linear_match(feeds, query_id) is feeds[-1]
+
+        results[n] = (
+            seconds_per_match(lambda: index.get(query_id, "EVMCall"), number=10_000),
+            seconds_per_match(lambda: linear_match(feeds, query_id), number=max(1000 // n, 2)),
+        )
+
+    print("\nfeeds | indexed match | linear scan")
+    for n, (indexed, linear) in results.items():
+        print(f"{n:>5} | {indexed * 1e6:>10.2f} us | {linear * 1e6:>10.2f} us")
+
+    indexed_10, _ = results[10]
+    indexed_1000, linear_1000 = results[1000]
+    assert indexed_1000 < indexed_10 * 5
+    assert indexed_1000 * 100 < linear_1000
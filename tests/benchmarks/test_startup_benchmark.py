@@ -0,0 +1,79 @@
+"""Benchmark: cold start of the monitor, from interpreter start to the first poll."""
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# runs start() until it polls the first chain, with the poll itself stubbed out
+FIRST_POLL = """
+import time
+started = time.perf_counter()
+
+import asyncio
+import os
+from unittest import mock
+
+from disputable_values_monitor import cli
+
+imported = time.perf_counter()
+
+
+async def first_poll(**kwargs):
+    print(f"{imported - started:.3f} {time.perf_counter() - started:.3f}", flush=True)
+    os._exit(0)
+
+
+with mock.patch.object(cli, "get_chain_events", first_poll), mock.patch.object(
+    cli, "monitored_chain_ids", return_value=[1]
+), mock.patch.object(cli, "clear_console"):
+    asyncio.run(cli.start(False, None, None, False, 0.1, 0, report_file=os.devnull))
+"""
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in seconds of each module imported by `python -X importtime -c 'import module'`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_time():
+    times = import_times("disputable_values_monitor.cli")
+
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+    print(f"\nimport disputable_values_monitor.cli: {times['disputable_values_monitor.cli']:.2f}s")
+    for name, seconds in slowest:
+        print(f"{seconds:>8.3f}s {name}")
+
+    # the feed catalog and pandas are imported on first use
+    assert "telliot_feeds.feeds" not in times
+    assert "pandas" not in times
+
+
+def test_time_to_first_poll():
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_POLL], input="y\n", capture_output=True, text=True, timeout=120, cwd=REPO_ROOT
+    )
+    total = time.perf_counter() - started
+
+    # the last line also holds the alerts-only prompt
+    imported, first_poll = (float(t) for t in result.stdout.split()[-2:])
+    print(
+        f"\ncold start: {total:.2f}s to first poll including the interpreter "
+        f"(imports {imported:.2f}s, first poll at {first_poll:.2f}s)"
+    )
+    assert imported < first_poll < total
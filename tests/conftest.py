@@ -1,4 +1,9 @@
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 
 import pytest
 from chained_accounts import ChainedAccount
@@ -139,3 +144,70 @@ def setup():
     yield cfg
 
     # cfg.endpoints.endpoints.remove(ganache_endpoint)
+
+
+class RPCNodeHandler(BaseHTTPRequestHandler):
+    """Answers JSON-RPC requests, single or batched, like a node at block server.head."""
+
+    # keep connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def answer(self, request):
+        method = request["method"]
+        if method == "eth_chainId":
+            result = hex(self.server.chain_id)
+        elif method == "eth_getLogs":
+            result = []
+        elif method == "eth_getBlockByNumber":
+            number = self.server.head if request["params"][0] == "latest" else int(request["params"][0], 16)
+            result = {"number": hex(number), "timestamp": hex(1_600_000_000 + 12 * number), "extraData": "0x"}
+        else:
+            result = hex(self.server.head)
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.posts.append(body)
+        self.server.clients.add(self.client_address)
+        methods = [request["method"] for request in body] if isinstance(body, list) else [body["method"]]
+        self.server.methods.extend(methods)
+        time.sleep(max(self.server.delays.get(method, 0) for method in methods))
+        if isinstance(body, list) and self.server.reject_batches:
+            response = {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batches not supported"}}
+        elif isinstance(body, list) and self.server.batch_error is not None:
+            response = {"jsonrpc": "2.0", "id": None, "error": self.server.batch_error}
+        elif isinstance(body, list):
+            response = [self.answer(request) for request in body]
+        else:
+            response = self.answer(body)
+        content = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rpc_node():
+    """Fake JSON-RPC node over HTTP, recording the requests it gets"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RPCNodeHandler)
+    server.chain_id = 137
+    server.head = 1000
+    server.posts = []
+    server.methods = []
+    server.clients = set()
+    server.reject_batches = False
+    # error answering every batch, e.g. a rate limit
+    server.batch_error = None
+    # seconds the node takes to answer a method
+    server.delays = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+from hexbytes import HexBytes
+from telliot_core.utils.response import ResponseStatus
+from web3.datastructures import AttributeDict
+
+from disputable_values_monitor.allowances import AllowanceTracker
+from disputable_values_monitor.allowances import APPROVAL_FEES
+from disputable_values_monitor.disputer import dispute
+from disputable_values_monitor.nonces import NonceManager
+from disputable_values_monitor.utils import NewReport
+
+OWNER = "0x" + "11" * 20
+GOVERNANCE = "0x" + "22" * 20
+DISPUTE_FEE = 10**18
+TX = (AttributeDict({"transactionHash": HexBytes("0x" + "ab" * 32)}), ResponseStatus(ok=True))
+
+
+def mock_token(allowance):
+    token = mock.Mock()
+
+    async def read(func_name, *args, **kwargs):
+        assert func_name == "allowance"
+        return allowance, ResponseStatus(ok=True)
+
+    token.read = mock.AsyncMock(side_effect=read)
+    token.write = mock.AsyncMock(return_value=TX)
+    token.node.web3.eth.get_transaction_count.return_value = 7
+    token.node.web3.eth.gas_price = 1
+    return token
+
+
+def mock_governance():
+    governance = mock.Mock(address=GOVERNANCE)
+    governance.write = mock.AsyncMock(return_value=TX)
+    return governance
+
+
+async def run_dispute(tracker, token, governance, nonces=None, disputes=1):
+    """Dispute a report `disputes` times at once, returning the last result."""
+    report = NewReport(
+        tx_hash="0xabc", submission_timestamp=1679497091, chain_id=1337, query_id="0x83a7", disputable=True
+    )
+    contracts = {"trb-token": token, "tellor-governance": governance}
+    with mock.patch("disputable_values_monitor.disputer.allowance_tracker", tracker), mock.patch(
+        "disputable_values_monitor.disputer.nonce_manager", nonces or NonceManager()
+    ), mock.patch(
+        "disputable_values_monitor.disputer.contract_registry.get",
+        side_effect=lambda cfg, name, account: contracts[name],
+    ), mock.patch(
+        "disputable_values_monitor.disputer.endpoint_pool",
+        mock.Mock(get=mock.Mock(return_value=mock.Mock(explorer=None)), call=mock.AsyncMock(return_value=100_000)),
+    ), mock.patch(
+        "disputable_values_monitor.disputer.read_dispute_fee",
+        mock.AsyncMock(return_value=(DISPUTE_FEE, [(1000 * DISPUTE_FEE, ResponseStatus(ok=True))])),
+    ):
+        cfg = mock.Mock()
+        results = await asyncio.gather(
+            *(dispute(cfg, mock.Mock(), mock.Mock(address=OWNER), report) for _ in range(disputes))
+        )
+        return results[-1]
+
+
+@pytest.mark.asyncio
+async def test_allowance_is_read_once():
+    tracker = AllowanceTracker()
+    token = mock_token(5)
+    key = tracker.key(1, OWNER, GOVERNANCE)
+
+    assert await tracker.get(token, key) == 5
+    tracker.spent(key, 2)
+    assert await tracker.get(token, key) == 3
+    assert token.read.call_count == 1
+
+    tracker.spent(key, 10)
+    assert await tracker.get(token, key) == 0
+    tracker.forget(key)
+    assert await tracker.get(token, key) == 5
+    assert token.read.call_count == 2
+
+
+def test_needs_approval():
+    assert AllowanceTracker(floor=1).needs_approval(9, 10)
+    assert not AllowanceTracker(floor=1).needs_approval(10, 10)
+    assert AllowanceTracker(floor=3).needs_approval(25, 10)
+    assert not AllowanceTracker(floor=3).needs_approval(30, 10)
+
+
+@pytest.mark.asyncio
+async def test_dispute_only_approves_when_allowance_runs_low():
+    tracker = AllowanceTracker()
+    token = mock_token(0)
+    governance = mock_governance()
+
+    # nothing approved yet: approve, then dispute with the next nonce
+    nonces = NonceManager()
+    assert await run_dispute(tracker, token, governance, nonces)
+    assert token.write.call_count == 1
+    assert token.write.call_args.kwargs["amount"] == DISPUTE_FEE * APPROVAL_FEES
+    assert token.write.call_args.kwargs["acc_nonce"] == 7
+    assert governance.write.call_args.kwargs["acc_nonce"] == 8
+
+    # the approval covers the next disputes, which are a single transaction
+    assert await run_dispute(tracker, token, governance, nonces)
+    assert token.write.call_count == 1
+    assert governance.write.call_args.kwargs["acc_nonce"] == 9
+    key = tracker.key(1337, OWNER, GOVERNANCE)
+    assert tracker.allowances[key] == DISPUTE_FEE * (APPROVAL_FEES - 2)
+
+    # approve again once the allowance can't cover a fee
+    tracker.allowances[key] = DISPUTE_FEE - 1
+    assert await run_dispute(tracker, token, governance, nonces)
+    assert token.write.call_count == 2
+    assert token.read.call_args_list.count(mock.call("allowance", owner=mock.ANY, spender=mock.ANY)) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_dispute_forgets_allowance():
+    tracker = AllowanceTracker()
+    token = mock_token(DISPUTE_FEE * 50)
+    governance = mock_governance()
+    governance.write.return_value = (None, ResponseStatus(ok=False, error="reverted"))
+
+    assert await run_dispute(tracker, token, governance) == ""
+    assert token.write.call_count == 0
+    assert tracker.key(1337, OWNER, GOVERNANCE) not in tracker.allowances
+
+
+@pytest.mark.asyncio
+async def test_dispute_raising_releases_its_nonce():
+    tracker = AllowanceTracker()
+    token = mock_token(DISPUTE_FEE * 50)
+    governance = mock_governance()
+    governance.write.side_effect = ConnectionError("connection reset")
+    nonces = NonceManager()
+
+    assert await run_dispute(tracker, token, governance, nonces) == ""
+    key = nonces.key(1337, OWNER)
+    assert not nonces.in_flight[key]
+    assert key in nonces.stale
+    assert tracker.key(1337, OWNER, GOVERNANCE) not in tracker.allowances
+
+
+@pytest.mark.asyncio
+async def test_unsent_dispute_gives_the_fee_back():
+    tracker = AllowanceTracker()
+    token = mock_token(DISPUTE_FEE * 50)
+    governance = mock_governance()
+    key = tracker.key(1337, OWNER, GOVERNANCE)
+
+    with mock.patch("disputable_values_monitor.disputer.next_nonce", mock.AsyncMock(return_value=None)):
+        assert await run_dispute(tracker, token, governance) == ""
+    assert governance.write.call_count == 0
+    assert tracker.allowances[key] == DISPUTE_FEE * 50
+
+
+def test_refunds_skip_replaced_allowances():
+    tracker = AllowanceTracker()
+    key = tracker.key(1, OWNER, GOVERNANCE)
+    tracker.approved(key, 10)
+
+    generation = tracker.spent(key, 4)
+    tracker.refund(key, 4, generation)
+    assert tracker.allowances[key] == 10
+
+    generation = tracker.spent(key, 4)
+    # approved again by another dispute meanwhile
+    tracker.approved(key, 100)
+    tracker.refund(key, 4, generation)
+    assert tracker.allowances[key] == 100
+
+
+@pytest.mark.asyncio
+async def test_concurrent_disputes_approve_once():
+    tracker = AllowanceTracker()
+    token = mock_token(0)
+    governance = mock_governance()
+
+    assert await run_dispute(tracker, token, governance, disputes=3)
+    assert token.write.call_count == 1
+    dispute_nonces = sorted(call.kwargs["acc_nonce"] for call in governance.write.call_args_list)
+    assert dispute_nonces == [8, 9, 10]
+    assert token.node.web3.eth.get_transaction_count.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_disputes_wait_for_receipts_off_the_event_loop():
+    tracker = AllowanceTracker()
+    token = mock_token(DISPUTE_FEE * 50)
+    governance = mock_governance()
+
+    def mined_slowly(*args, **kwargs):
+        # Contract.write blocks until the receipt is in
+        time.sleep(0.2)
+        return TX
+
+    governance.write = mock.AsyncMock(side_effect=mined_slowly)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.ensure_future(tick())
+    assert await run_dispute(tracker, token, governance, disputes=2)
+    ticker.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await ticker
+
+    # the loop kept running and both disputes were mined at once
+    assert ticks >= 10
+    assert governance.write.call_count == 2
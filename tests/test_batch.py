@@ -0,0 +1,58 @@
+"""Tests for batch disputability checks."""
+import numpy as np
+import pytest
+
+from disputable_values_monitor.batch import disputable_mask
+from disputable_values_monitor.batch import evaluate_reports
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import Threshold
+
+
+def test_percentage():
+    threshold = Threshold(Metrics.Percentage, amount=0.5)
+    reported = [400.0, 1001.0, 1.0, "0xabc", None, 5]
+    trusted = [1000.0, 1000.0, 0.0, 1000.0, 1000.0, 10]
+
+    result = disputable_mask(threshold, reported, trusted)
+
+    assert result.disputable.tolist() == [True, False, False, False, False, True]
+    # zero trusted values and non-numeric values can't be evaluated
+    assert result.evaluated.tolist() == [True, True, False, False, False, True]
+
+
+def test_range_on_arrays():
+    threshold = Threshold(Metrics.Range, amount=500)
+    reported = np.array([250.0, 501.0, np.nan])
+    trusted = np.array([1000.0, 1000.0, 1000.0])
+
+    result = disputable_mask(threshold, reported, trusted)
+
+    assert result.disputable.tolist() == [True, False, False]
+    assert result.evaluated.tolist() == [True, True, False]
+
+
+def test_equality():
+    threshold = Threshold(Metrics.Equality, amount=None)
+    reported = ["0xABC", "abc123", b"\x01", 1.0, None]
+    trusted = ["0xabc", "abc1234", b"\x01", 2.0, "0xabc"]
+
+    result = disputable_mask(threshold, reported, trusted)
+
+    assert result.disputable.tolist() == [False, True, False, True, False]
+    assert result.evaluated.tolist() == [True, True, True, True, False]
+
+
+def test_mixed_thresholds():
+    percentage = Threshold(Metrics.Percentage, amount=0.5)
+    range_ = Threshold(Metrics.Range, amount=10)
+    rows = [(percentage, 400.0, 1000.0), (range_, 105.0, 100.0), (percentage, 900.0, 1000.0), (range_, 0.0, 100.0)]
+
+    result = evaluate_reports(rows)
+
+    assert result.disputable.tolist() == [True, False, False, True]
+    assert result.evaluated.all()
+
+
+def test_mismatched_lengths():
+    with pytest.raises(ValueError):
+        disputable_mask(Threshold(Metrics.Range, amount=1), [1.0, 2.0], [1.0])
@@ -0,0 +1,75 @@
+"""Tests for finding blocks by timestamp."""
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+from disputable_values_monitor.blocks import BlockIndex
+from tests.benchmarks.mock_chain import MockChain
+
+
+def expected_block(chain, timestamp):
+    """block at the timestamp, or the last one before it"""
+    return bisect.bisect_right(chain.timestamps, timestamp) - 1
+
+
+def test_find_block():
+    """test lookups match a scan of the whole chain"""
+    chain = MockChain(num_blocks=10_000, missed_slots=0.3)
+    index = BlockIndex()
+
+    # exact block timestamps, timestamps between blocks, and past the head
+    timestamps = [chain.timestamps[0], chain.timestamps[1234], chain.timestamps[5000] + 1, chain.timestamps[-1] + 100]
+    for timestamp in timestamps:
+        assert index.find_block(chain, 1, timestamp) == expected_block(chain, timestamp)
+
+
+def test_anchors_are_saved(tmp_path):
+    """test anchors are reused after a restart"""
+    chain = MockChain(num_blocks=10_000)
+    path = str(tmp_path / "blocks.db")
+    index = BlockIndex()
+    index.open(path)
+    index.find_block(chain, 1, chain.timestamps[4321])
+    index.close()
+
+    index = BlockIndex()
+    index.open(path)
+    chain.calls.clear()
+    assert index.find_block(chain, 1, chain.timestamps[4321]) == 4321
+    assert chain.rpc_calls == 0
+    # anchors are per chain
+    assert index.bracket(5, chain.timestamps[4321]) == (None, None)
+
+
+def test_stale_anchors_are_dropped(caplog):
+    """test anchors of a chain that was reset don't give wrong blocks"""
+    index = BlockIndex()
+    # anchors left over from a chain with 12 second blocks
+    index.add(1337, 0, 1_600_000_000)
+    index.add(1337, 100, 1_600_001_200)
+
+    reset_chain = MockChain(num_blocks=5_000, block_time=20)
+    timestamp = reset_chain.timestamps[50]
+    assert index.find_block(reset_chain, 1337, timestamp) == expected_block(reset_chain, timestamp)
+    assert "dropping saved block timestamps of chain_id 1337" in caplog.text
+
+
+def test_concurrent_lookups(tmp_path):
+    """test lookups from several threads at once keep the anchors sorted and saved once"""
+    chain = MockChain(num_blocks=10_000, missed_slots=0.3)
+    path = str(tmp_path / "blocks.db")
+    index = BlockIndex()
+    index.open(path)
+
+    timestamps = chain.timestamps[::97]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        found = list(pool.map(lambda timestamp: index.find_block(chain, 1, timestamp), timestamps))
+    index.close()
+
+    assert found == [expected_block(chain, timestamp) for timestamp in timestamps]
+    anchors = index.anchors[1]
+    assert anchors == sorted(set(anchors))
+    assert len({number for number, _ in anchors}) == len(anchors)
+
+    index = BlockIndex()
+    index.open(path)
+    assert index.anchors[1] == anchors
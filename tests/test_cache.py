@@ -0,0 +1,78 @@
+"""Tests for the trusted value cache."""
+import asyncio
+from unittest import mock
+
+import pytest
+from telliot_feeds.feeds import eth_usd_median_feed
+
+from disputable_values_monitor.cache import TrustedValueCache
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import MonitoredFeed
+from disputable_values_monitor.data import Threshold
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_fetch():
+    """test a burst of reports for the same query fetches the trusted value once"""
+    fetches = 0
+
+    async def fetch():
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.01)
+        return 3400.0, None
+
+    cache = TrustedValueCache(ttl=5)
+    values = await asyncio.gather(*(cache.get("eth-usd", fetch) for _ in range(5)))
+
+    assert values == [(3400.0, None)] * 5
+    assert fetches == 1
+    assert cache.stats() == {"hits": 4, "misses": 1, "size": 1}
+
+    # still fresh
+    assert await cache.get("eth-usd", fetch) == (3400.0, None)
+    assert fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_and_invalid_values_are_fetched_again():
+    fetch = mock.AsyncMock(return_value=None)
+    cache = TrustedValueCache(ttl=5)
+
+    await cache.get("btc-usd", fetch)
+    await cache.get("btc-usd", fetch)
+    assert fetch.await_count == 2
+
+    fetch.return_value = 60000.0
+    await cache.get("btc-usd", fetch, ttl=0.01)
+    await asyncio.sleep(0.02)
+    await cache.get("btc-usd", fetch, ttl=0.01)
+    assert fetch.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_fetch_errors_reach_every_waiter():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("source down")
+
+    cache = TrustedValueCache()
+    results = await asyncio.gather(*(cache.get("eth-usd", fetch) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_is_disputable_uses_cache():
+    """test reports of the same feed reuse the trusted value within the feed's ttl"""
+    feed = MonitoredFeed(eth_usd_median_feed, Threshold(Metrics.Percentage, amount=0.5), ttl=60)
+    cache = TrustedValueCache()
+
+    with mock.patch.object(
+        eth_usd_median_feed.source, "fetch_new_datapoint", mock.AsyncMock(return_value=(1000.0, None))
+    ) as fetch:
+        assert await feed.is_disputable(None, 400.0, cache)
+        assert not await feed.is_disputable(None, 1001.0, cache)
+
+    assert fetch.await_count == 1
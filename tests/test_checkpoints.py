@@ -0,0 +1,127 @@
+"""Tests for the persistent block cursor store."""
+from unittest import mock
+
+import pytest
+
+from disputable_values_monitor.checkpoints import CursorStore
+from disputable_values_monitor.checkpoints import stream_key
+from disputable_values_monitor.data import log_loop
+from disputable_values_monitor.logs import LogFilterPlan
+from disputable_values_monitor.utils import Topics
+
+ORACLE = "0xD9157453E2668B2fc45b7A803D3FEF3642430cC0"
+TOKEN = "0x88dF592F8eb5D7Bd38bFeF7dEb0fBc02cf3778a0"
+
+
+def test_stream_key():
+    """test streams are told apart by chain, address and topics"""
+    key = stream_key(1, ORACLE, [Topics.NEW_REPORT])
+    assert key == stream_key(1, ORACLE.lower(), [Topics.NEW_REPORT.upper()])
+    assert key != stream_key(5, ORACLE, [Topics.NEW_REPORT])
+    assert key != stream_key(1, TOKEN, [Topics.NEW_REPORT])
+    assert stream_key(1, TOKEN, [Topics.NEW_ORACLE_ADDRESS]) != stream_key(
+        1, TOKEN, [Topics.NEW_PROPOSED_ORACLE_ADDRESS]
+    )
+
+
+def test_resume_after_restart(tmp_path):
+    """test committed cursors survive a restart and staged ones don't"""
+    path = str(tmp_path / "cursors.db")
+    reports = stream_key(1, ORACLE, [Topics.NEW_REPORT])
+    oracle_address = stream_key(1, TOKEN, [Topics.NEW_ORACLE_ADDRESS])
+    other_chain = stream_key(137, ORACLE, [Topics.NEW_REPORT])
+
+    cursors = CursorStore(path)
+    cursors.stage(reports, 100)
+    cursors.stage(oracle_address, 90)
+    cursors.stage(other_chain, 5000)
+    assert cursors.get(reports) == 100
+    cursors.commit(1)
+    cursors.stage(reports, 110)
+    cursors.close()
+
+    cursors = CursorStore(path)
+    assert cursors.get(reports) == 100
+    assert cursors.get(oracle_address) == 90
+    assert cursors.get(other_chain) is None
+
+    cursors.reset(reports)
+    assert cursors.get(reports) is None
+
+
+def test_streamed_cursors_only_move_forward():
+    """test cursors advanced from streamed logs leave staged cursors alone and never move back"""
+    reports = stream_key(1, ORACLE, [Topics.NEW_REPORT])
+    cursors = CursorStore()
+    cursors.stage(reports, 100)
+    cursors.advance([reports], 120)
+    # the poll's own cursor is still the one it resumes from until it's committed
+    assert cursors.get(reports) == 100
+
+    cursors.commit(1)
+    assert cursors.get(reports) == 120
+    cursors.advance([reports], 110)
+    assert cursors.get(reports) == 120
+
+
+def plan(chain_id, address, topic):
+    filter_plan = LogFilterPlan(chain_id)
+    filter_plan.add(address, topic)
+    return filter_plan
+
+
+def mock_web3(block_number):
+    w3 = mock.Mock()
+    w3.eth.get_block_number.return_value = block_number
+    w3.eth.get_logs.return_value = []
+    return w3
+
+
+@pytest.mark.asyncio
+async def test_log_loop_resumes_from_cursor():
+    """test log_loop scans from the stream's cursor instead of the initial block offset"""
+    cursors = CursorStore()
+    key = stream_key(1, ORACLE, [Topics.NEW_REPORT])
+
+    w3 = mock_web3(1000)
+    await log_loop(w3, plan(1, ORACLE, Topics.NEW_REPORT), 100, cursors)
+    assert w3.eth.get_logs.call_args[0][0]["fromBlock"] == 890
+    assert cursors.get(key) == 1000
+
+    # another stream on the same chain doesn't move this one
+    await log_loop(mock_web3(1200), plan(1, TOKEN, Topics.NEW_ORACLE_ADDRESS), 0, cursors)
+    assert cursors.get(key) == 1000
+
+    w3 = mock_web3(1020)
+    await log_loop(w3, plan(1, ORACLE, Topics.NEW_REPORT), 100, cursors)
+    assert w3.eth.get_logs.call_args[0][0]["fromBlock"] == 990
+
+
+@pytest.mark.asyncio
+async def test_log_loop_cursor_ahead_of_chain(caplog):
+    """test a cursor past the chain head (e.g. a reset test chain) is dropped"""
+    cursors = CursorStore()
+    cursors.stage(stream_key(1337, ORACLE, [Topics.NEW_REPORT]), 5000)
+
+    w3 = mock_web3(100)
+    await log_loop(w3, plan(1337, ORACLE, Topics.NEW_REPORT), 0, cursors)
+
+    assert w3.eth.get_logs.call_args[0][0]["fromBlock"] == 90
+    assert "ahead of chain_id 1337 head" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_log_loop_merged_plan_starts_at_oldest_cursor():
+    """test a plan of several streams scans from the stream that is furthest behind and moves all of them"""
+    cursors = CursorStore()
+    merged = plan(1, ORACLE, Topics.NEW_REPORT)
+    merged.add(TOKEN, Topics.NEW_ORACLE_ADDRESS)
+    cursors.stage(stream_key(1, ORACLE, [Topics.NEW_REPORT]), 1000)
+    cursors.stage(stream_key(1, TOKEN, [Topics.NEW_ORACLE_ADDRESS]), 950)
+
+    w3 = mock_web3(1100)
+    await log_loop(w3, merged, 0, cursors)
+
+    assert w3.eth.get_logs.call_args[0][0]["fromBlock"] == 940
+    assert cursors.get(stream_key(1, ORACLE, [Topics.NEW_REPORT])) == 1100
+    assert cursors.get(stream_key(1, TOKEN, [Topics.NEW_ORACLE_ADDRESS])) == 1100
@@ -4,6 +4,7 @@ from unittest import mock
 from telliot_feeds.feeds import evm_call_feed
 
 from disputable_values_monitor.config import AutoDisputerConfig
+from disputable_values_monitor.config import DisputerConfigWatcher
 from disputable_values_monitor.data import Metrics
 from disputable_values_monitor.data import MonitoredFeed
 from disputable_values_monitor.data import Threshold
@@ -95,3 +96,66 @@ def test_form_evm_call_feed_from_yaml():
 
     threshold = Threshold(Metrics.Equality, amount=None)
     assert auto_disp_cfg.monitored_feeds[0] == MonitoredFeed(evm_call_feed, threshold)
+
+
+def test_config_watcher_reloads_changed_file(tmp_path):
+    """test the config is only recompiled when its file changes, and invalid changes are ignored"""
+    path = tmp_path / "disputer-config.yaml"
+    path.write_text(
+        """
+    feeds:
+    - query_type: "EVMCall"
+      threshold:
+        type: Equality
+    """
+    )
+    watcher = DisputerConfigWatcher(is_disputing=True, confidence_flag=None, path=str(path))
+    config = watcher.config
+    assert len(config.monitored_feeds) == 1
+
+    assert watcher.reload() is config
+
+    path.write_text(
+        """
+    feeds:
+    - query_type: "EVMCall"
+      threshold:
+        type: Equality
+    - query_id: "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+      threshold:
+        type: Percentage
+        amount: 0.75
+    """
+    )
+    reloaded = watcher.reload()
+    assert reloaded is not config
+    assert len(reloaded.monitored_feeds) == 2
+    # the previous snapshot is untouched
+    assert len(config.monitored_feeds) == 1
+
+    path.write_text("feeds: [")
+    assert watcher.reload() is reloaded
+
+
+def test_feed_index():
+    """test monitored feeds are looked up by query id, and generic feeds by query type"""
+
+    yaml_content = """
+    feeds:
+    - query_id: "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+      threshold:
+        type: Percentage
+        amount: 0.75
+    - query_type: "EVMCall"
+      threshold:
+        type: Equality
+    """
+
+    with mock.patch("builtins.open", mock.mock_open(read_data=yaml_content)):
+        auto_disp_cfg = AutoDisputerConfig(is_disputing=True, confidence_flag=None)
+
+    eth_usd, evm_call = auto_disp_cfg.monitored_feeds
+    index = auto_disp_cfg.feed_index
+    assert index.get("0x83A7F3D48786AC2667503A61E8C415438ED2922EB86A2906E4EE66D9A2CE4992", "SpotPrice") is eth_usd
+    assert index.get("0x" + "ab" * 32, "EVMCall") is evm_call
+    assert index.get("0x" + "ab" * 32, "SpotPrice") is None
@@ -0,0 +1,56 @@
+"""Tests for sharing one connection per RPC endpoint."""
+import threading
+
+from telliot_core.model.endpoints import RPCEndpoint
+
+from disputable_values_monitor.connections import ConnectionManager
+
+
+def test_endpoints_connect_once(rpc_node):
+    manager = ConnectionManager()
+    endpoint = RPCEndpoint(chain_id=rpc_node.chain_id, url=rpc_node.url)
+    # the same endpoint in another copy of the config
+    other = RPCEndpoint(chain_id=rpc_node.chain_id, url=rpc_node.url)
+
+    w3 = manager.web3(endpoint)
+    assert w3 is not None
+    assert manager.web3(endpoint) is w3
+    assert manager.web3(other) is w3
+    assert endpoint.web3 is w3 and other.web3 is w3
+    assert rpc_node.methods == ["eth_chainId"]
+    manager.close()
+
+
+def test_endpoints_on_another_chain_are_refused(rpc_node):
+    manager = ConnectionManager()
+    endpoint = RPCEndpoint(chain_id=1, url=rpc_node.url)
+
+    assert manager.web3(endpoint) is None
+    assert endpoint.web3 is None
+    assert manager.connections == {}
+
+
+def test_dropped_connections_are_made_again(rpc_node):
+    manager = ConnectionManager()
+    endpoint = RPCEndpoint(chain_id=rpc_node.chain_id, url=rpc_node.url)
+    w3 = manager.web3(endpoint)
+
+    manager.drop(rpc_node.url)
+    assert endpoint.web3 is None
+    assert manager.web3(endpoint) not in (None, w3)
+    assert rpc_node.methods == ["eth_chainId", "eth_chainId"]
+    manager.close()
+
+
+def test_threads_share_the_keep_alive_connection(rpc_node):
+    manager = ConnectionManager()
+    w3 = manager.web3(RPCEndpoint(chain_id=rpc_node.chain_id, url=rpc_node.url))
+
+    for _ in range(5):
+        thread = threading.Thread(target=w3.eth.get_block_number)
+        thread.start()
+        thread.join()
+
+    assert rpc_node.methods.count("eth_blockNumber") == 5
+    assert len(rpc_node.clients) == 1
+    manager.close()
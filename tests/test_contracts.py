@@ -0,0 +1,69 @@
+"""Tests for the contract registry."""
+from unittest import mock
+
+from disputable_values_monitor.contracts import ContractRegistry
+
+
+def chain_cfg(chain_id, url="http://localhost:8545"):
+    cfg = mock.Mock()
+    cfg.main.chain_id = chain_id
+    cfg.endpoints.find.return_value = [mock.MagicMock(url=url)]
+    return cfg
+
+
+def handle(*args, **kwargs):
+    contract = mock.Mock()
+    contract.contract.w3 = contract.node.web3
+    return contract
+
+
+def test_contracts_are_built_once():
+    """test repeated disputes reuse the connected contract handles"""
+    registry = ContractRegistry()
+    account = mock.Mock()
+    account.name = "disputer"
+
+    with mock.patch("disputable_values_monitor.contracts.get_contract", side_effect=handle) as get:
+        token = registry.get(chain_cfg(1), "trb-token", account)
+        assert registry.get(chain_cfg(1), "trb-token", account) is token
+        # read only handles and other chains get their own
+        assert registry.get(chain_cfg(1), "trb-token") is not token
+        assert registry.get(chain_cfg(137), "trb-token", account) is not token
+
+    assert get.call_count == 3
+
+
+def test_contracts_are_rebuilt_after_reconnecting():
+    registry = ContractRegistry()
+
+    with mock.patch("disputable_values_monitor.contracts.get_contract", side_effect=handle) as get:
+        token = registry.get(chain_cfg(1), "trb-token")
+        # the endpoint's connection was dropped and made again
+        token.node.web3 = mock.Mock()
+        assert registry.get(chain_cfg(1), "trb-token") is not token
+
+    assert get.call_count == 2
+
+
+def test_missing_contracts_are_not_cached():
+    registry = ContractRegistry()
+
+    with mock.patch("disputable_values_monitor.contracts.get_contract", return_value=None) as get:
+        assert registry.get(chain_cfg(1), "tellor-governance") is None
+        assert registry.get(chain_cfg(1), "tellor-governance") is None
+
+    assert get.call_count == 2
+    assert registry.contracts == {}
+
+
+def test_unhealthy_chains_are_dropped():
+    registry = ContractRegistry()
+    healthy, unhealthy = handle(), handle()
+    unhealthy.node.web3.eth.get_block_number.side_effect = ConnectionError("endpoint down")
+
+    with mock.patch("disputable_values_monitor.contracts.get_contract", side_effect=[healthy, unhealthy]):
+        registry.get(chain_cfg(1), "trb-token")
+        registry.get(chain_cfg(137), "trb-token")
+
+    assert registry.check() == [137]
+    assert list(registry.contracts.values()) == [healthy]
@@ -3,10 +3,12 @@ import time
 from unittest import mock
 from unittest import TestCase
 
+import pytest
 from discordwebhook import Discord
 
 from disputable_values_monitor.data import NewReport
 from disputable_values_monitor.discord import alert
+from disputable_values_monitor.discord import AlertDispatcher
 from disputable_values_monitor.discord import generate_alert_msg
 from disputable_values_monitor.discord import get_alert_bot_1
 
@@ -142,3 +144,78 @@ def test_alert_bot_if_no_webhook(mock_getenv):
     assert isinstance(alert_bot, Discord)
     assert alert_bot.url == "a"
     assert alert_bot.url is not None
+
+
+def discord_response(status_code, retry_after=None):
+    response = mock.Mock(status_code=status_code, ok=status_code < 400, headers={}, text="")
+    response.json.return_value = {"retry_after": retry_after}
+    return response
+
+
+@pytest.mark.asyncio
+async def test_alert_dispatcher_does_not_wait_on_discord():
+    """test alerts are queued right away and posted to every webhook in the background"""
+    posted = []
+
+    def post(self, content):
+        time.sleep(0.05)
+        posted.append((self.url, content))
+        return discord_response(204)
+
+    dispatcher = AlertDispatcher()
+    with mock.patch.object(Discord, "post", post):
+        dispatcher.start(["https://webhook/1", "https://webhook/2"])
+        started = time.monotonic()
+        dispatcher.send("first")
+        dispatcher.send("second")
+        assert time.monotonic() - started < 0.05
+
+        await dispatcher.stop()
+
+    assert sorted(posted) == [
+        ("https://webhook/1", "first"),
+        ("https://webhook/1", "second"),
+        ("https://webhook/2", "first"),
+        ("https://webhook/2", "second"),
+    ]
+    assert dispatcher.sent == 4
+    assert not dispatcher.running
+
+
+@pytest.mark.asyncio
+async def test_alert_dispatcher_retries():
+    """test rate limited and failed posts are retried"""
+    responses = [discord_response(429, retry_after=0.01), discord_response(502), discord_response(200)]
+    post = mock.Mock(side_effect=responses)
+
+    dispatcher = AlertDispatcher()
+    with mock.patch.object(Discord, "post", post), mock.patch(
+        "disputable_values_monitor.discord.ALERT_RETRY_BACKOFF", 0.01
+    ):
+        dispatcher.start(["https://webhook/1"])
+        dispatcher.send("disputable value")
+        await dispatcher.stop()
+
+    assert post.call_count == 3
+    assert dispatcher.sent == 1
+
+
+@pytest.mark.asyncio
+async def test_alert_dispatcher_drops_oldest_alerts():
+    """test alerts queued behind a stuck webhook are bounded"""
+    posted = []
+
+    def post(self, content):
+        posted.append(content)
+        return discord_response(204)
+
+    dispatcher = AlertDispatcher(queue_size=2)
+    with mock.patch.object(Discord, "post", post):
+        dispatcher.start(["https://webhook/1"])
+        # fill the queue before the worker gets a chance to run
+        for i in range(5):
+            dispatcher.send(str(i))
+        await dispatcher.stop()
+
+    assert posted == ["3", "4"]
+    assert dispatcher.dropped == 3
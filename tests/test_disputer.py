@@ -52,6 +52,36 @@ async def test_not_meant_to_dispute(caplog, disputer_account):
     )
 
 
+@pytest.mark.asyncio
+async def test_meant_to_dispute_generic_query_type(caplog):
+    """test reports of a query type monitored without query parameters are meant to be disputed"""
+
+    report = NewReport(
+        "0xabc123",
+        1679425719,
+        1337,
+        "etherscan.io/",
+        "EVMCall",
+        b"",
+        "N/A",
+        "N/A",
+        "0xd4ba3f5e2fd5bbb6b6b8c5fd6c1c2c4a6b7ee7d3fb0b1c69b1c9a5b5d1a4e2c1",
+        True,
+        "status ",
+    )
+
+    with mock.patch(
+        "builtins.open", mock.mock_open(read_data='feeds:\n- query_type: "EVMCall"\n  threshold:\n    type: Equality\n')
+    ):
+        disp_config = AutoDisputerConfig(is_disputing=True, confidence_flag=None)
+
+    await dispute(TelliotConfig(), disp_config, account=None, new_report=report)
+
+    assert "No account provided, skipping eligible dispute on chain_id 1337" in caplog.text
+    # the config's generic feed is left as is
+    assert disp_config.monitored_feeds[0].feed.query.chainId is None
+
+
 @pytest.mark.asyncio
 async def test_dispute_on_empty_block(setup, caplog: pytest.LogCaptureFixture, disputer_account: ChainedAccount):
     """
@@ -0,0 +1,113 @@
+"""Tests for ranking RPC endpoints by health and failing over between them."""
+import asyncio
+from unittest import mock
+
+import pytest
+from requests.exceptions import HTTPError
+from web3.exceptions import ContractLogicError
+
+from disputable_values_monitor import endpoints
+from disputable_values_monitor.endpoints import BREAKER_COOLDOWN
+from disputable_values_monitor.endpoints import BREAKER_FAILURES
+from disputable_values_monitor.endpoints import EndpointPool
+from disputable_values_monitor.endpoints import is_endpoint_error
+
+
+def chain_cfg(*urls):
+    cfg = mock.Mock()
+    nodes = [mock.MagicMock(url=url) for url in urls]
+    for node in nodes:
+        node.web3.url = node.url
+    cfg.endpoints.find.return_value = nodes
+    return cfg
+
+
+def rate_limited():
+    return ValueError({"code": -32005, "message": "daily request count exceeded, request rate limited"})
+
+
+def test_endpoint_errors():
+    assert is_endpoint_error(rate_limited())
+    assert is_endpoint_error(HTTPError(response=mock.Mock(status_code=429)))
+    assert is_endpoint_error({"code": -32005, "message": "limit exceeded"})
+    assert not is_endpoint_error(HTTPError(response=mock.Mock(status_code=400)))
+    assert not is_endpoint_error(ContractLogicError("execution reverted: dispute already started"))
+    assert not is_endpoint_error({"code": 3, "message": "execution reverted"})
+
+
+@pytest.mark.asyncio
+async def test_calls_fail_over_to_the_next_endpoint():
+    pool = EndpointPool()
+    cfg = chain_cfg("http://a", "http://b")
+    asked = []
+
+    async def request(w3):
+        asked.append(w3.url)
+        if w3.url == "http://a":
+            raise rate_limited()
+        return 42
+
+    assert await pool.call(cfg, 1, request) == 42
+    assert asked == ["http://a", "http://b"]
+
+    # the rate limited endpoint now ranks last
+    pool.record("http://a", 0.1, ok=False)
+    pool.record("http://b", 0.1, ok=True)
+    assert [node.url for node in pool.ranked(cfg, 1)] == ["http://b", "http://a"]
+    assert pool.get(cfg, 1).url == "http://b"
+
+
+@pytest.mark.asyncio
+async def test_reverts_are_not_failed_over():
+    pool = EndpointPool()
+    cfg = chain_cfg("http://a", "http://b")
+    request = mock.AsyncMock(side_effect=ContractLogicError("execution reverted"))
+
+    with pytest.raises(ContractLogicError):
+        await pool.call(cfg, 1, request)
+    assert request.call_count == 1
+
+
+def test_failing_endpoints_are_taken_out_of_rotation(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(endpoints.time, "monotonic", lambda: now)
+    pool = EndpointPool()
+    cfg = chain_cfg("http://a", "http://b")
+    # a is faster than b, as long as it works
+    pool.record("http://a", 0.1, ok=True)
+    pool.record("http://b", 2.0, ok=True)
+
+    for _ in range(BREAKER_FAILURES - 1):
+        pool.record("http://a", 0.1, ok=False)
+    assert pool.health["http://a"].available(now)
+    pool.record("http://a", 0.1, ok=False)
+    assert not pool.health["http://a"].available(now)
+    assert [node.url for node in pool.ranked(cfg, 1)] == ["http://b", "http://a"]
+
+    now += BREAKER_COOLDOWN
+    assert pool.health["http://a"].available(now)
+    # one more failure takes it straight back out
+    pool.record("http://a", 0.1, ok=False)
+    assert not pool.health["http://a"].available(now)
+
+    now += BREAKER_COOLDOWN
+    for _ in range(20):
+        pool.record("http://a", 0.1, ok=True)
+    assert [node.url for node in pool.ranked(cfg, 1)] == ["http://a", "http://b"]
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_are_hedged():
+    pool = EndpointPool(hedging=True, hedge_delay=0.01)
+    cfg = chain_cfg("http://a", "http://b")
+
+    async def request(w3):
+        if w3.url == "http://a":
+            await asyncio.sleep(1)
+            return "a"
+        return "b"
+
+    assert await pool.call(cfg, 1, request, hedge=True) == "b"
+    # calls that aren't marked as hedged wait for the healthiest endpoint
+    pool.hedge_delay = 0
+    assert await pool.call(cfg, 1, mock.AsyncMock(side_effect=lambda w3: w3.url)) == "http://a"
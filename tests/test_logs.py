@@ -0,0 +1,121 @@
+"""Tests for fetching event logs in adaptive chunks."""
+from unittest import mock
+
+import pytest
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from disputable_values_monitor.data import mk_filter
+from disputable_values_monitor.logs import is_range_too_large
+from disputable_values_monitor.logs import LogFetcher
+from disputable_values_monitor.logs import LogFilterPlan
+from disputable_values_monitor.logs import RangeTooLargeError
+from disputable_values_monitor.logs import split_range
+from disputable_values_monitor.utils import Topics
+
+ORACLE = "0xD9157453E2668B2fc45b7A803D3FEF3642430cC0"
+TOKEN = "0x88dF592F8eb5D7Bd38bFeF7dEb0fBc02cf3778a0"
+
+
+def limited_web3(max_range: int, uri: str = "https://rpc.example") -> mock.Mock:
+    """web3 whose provider rejects ranges over max_range blocks and has one log per block"""
+    w3 = mock.Mock()
+    w3.provider.endpoint_uri = uri
+
+    def get_logs(event_filter):
+        size = event_filter["toBlock"] - event_filter["fromBlock"] + 1
+        if size > max_range:
+            raise ValueError({"code": -32600, "message": f"exceed maximum block range: {max_range}"})
+        return [{"blockNumber": n} for n in range(event_filter["fromBlock"], event_filter["toBlock"] + 1)]
+
+    w3.eth.get_logs.side_effect = get_logs
+    return w3
+
+
+def test_split_range():
+    assert split_range(0, 9, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert split_range(5, 5, 100) == [(5, 5)]
+
+
+def test_is_range_too_large():
+    assert is_range_too_large(ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+    assert is_range_too_large(ValueError("Log response size exceeded."))
+    assert not is_range_too_large(ValueError("429 Client Error: Too Many Requests"))
+
+
+@pytest.mark.asyncio
+async def test_large_window_is_chunked():
+    """test a window bigger than the default range is fetched in chunks, in order"""
+    w3 = limited_web3(max_range=10_000)
+    fetcher = LogFetcher(default_range=1000)
+
+    logs = await fetcher.get_logs(w3, mk_filter(0, 4999, ORACLE, [Topics.NEW_REPORT]))
+
+    assert [log["blockNumber"] for log in logs] == list(range(5000))
+    assert w3.eth.get_logs.call_count == 5
+
+
+@pytest.mark.asyncio
+async def test_rejected_chunks_are_halved_and_remembered():
+    """test a provider's limit is learned from its errors and used for later fetches"""
+    w3 = limited_web3(max_range=300)
+    fetcher = LogFetcher(default_range=1000)
+
+    logs = await fetcher.get_logs(w3, mk_filter(0, 1999, ORACLE, [Topics.NEW_REPORT]))
+
+    assert [log["blockNumber"] for log in logs] == list(range(2000))
+    assert fetcher.max_range(w3) <= 300
+
+    # another provider keeps the default range
+    assert fetcher.max_range(limited_web3(max_range=300, uri="https://other.example")) == 1000
+
+    w3.eth.get_logs.reset_mock()
+    await fetcher.get_logs(w3, mk_filter(2000, 3999, ORACLE, [Topics.NEW_REPORT]))
+    assert w3.eth.get_logs.call_count == len(split_range(2000, 3999, fetcher.max_range(w3)))
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_raised():
+    w3 = mock.Mock()
+    w3.eth.get_logs.side_effect = ValueError("429 Client Error: Too Many Requests")
+
+    with pytest.raises(ValueError, match="Too Many Requests"):
+        await LogFetcher().get_logs(w3, mk_filter(0, 10, ORACLE, [Topics.NEW_REPORT]))
+
+
+@pytest.mark.asyncio
+async def test_single_block_too_large():
+    w3 = limited_web3(max_range=0)
+
+    with pytest.raises(RangeTooLargeError):
+        await LogFetcher().get_logs(w3, mk_filter(0, 3, ORACLE, [Topics.NEW_REPORT]))
+
+
+def make_log(address, topic, tx, log_index=0):
+    return AttributeDict(
+        {
+            "address": address,
+            "topics": [HexBytes(topic)],
+            "transactionHash": HexBytes(tx.to_bytes(32, "big")),
+            "logIndex": log_index,
+        }
+    )
+
+
+def test_filter_plan():
+    """test monitored contracts and events are merged into one filter and logs are routed back"""
+    plan = LogFilterPlan(1)
+    plan.add(ORACLE, Topics.NEW_REPORT)
+    plan.add(ORACLE.lower(), Topics.NEW_REPORT)
+    plan.add(TOKEN, Topics.NEW_ORACLE_ADDRESS)
+    plan.add(TOKEN, Topics.NEW_PROPOSED_ORACLE_ADDRESS)
+
+    assert plan.addresses == [ORACLE, TOKEN]
+    assert plan.topics == [[Topics.NEW_REPORT, Topics.NEW_ORACLE_ADDRESS, Topics.NEW_PROPOSED_ORACLE_ADDRESS]]
+
+    report = make_log(ORACLE, Topics.NEW_REPORT, 1)
+    oracle_address = make_log(TOKEN.lower(), Topics.NEW_ORACLE_ADDRESS, 2)
+    # matches the merged filter but isn't monitored
+    token_report = make_log(TOKEN, Topics.NEW_REPORT, 3)
+
+    assert plan.route([report, token_report, oracle_address, report]) == [report, oracle_address]
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from disputable_values_monitor import metrics
+from disputable_values_monitor.metrics import Counter
+from disputable_values_monitor.metrics import Gauge
+from disputable_values_monitor.metrics import Histogram
+from disputable_values_monitor.metrics import instrument
+from disputable_values_monitor.metrics import MetricsRegistry
+from disputable_values_monitor.metrics import serve_metrics
+
+
+class FakeProvider(BaseProvider):
+    def make_request(self, method, params):
+        if method == "eth_getLogs":
+            return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32005, "message": "Too Many Requests"}}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x10"}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("test_events_total", "Events.", ("chain_id",)))
+    gauge = registry.register(Gauge("test_depth", "Depth."))
+    histogram = registry.register(Histogram("test_seconds", "Latency.", ("method",), buckets=(0.1, 1.0)))
+
+    counter.inc(chain_id=1)
+    counter.inc(2, chain_id=1)
+    counter.inc(chain_id=137)
+    gauge.set(4)
+    histogram.observe(0.05, method="eth_call")
+    histogram.observe(0.5, method="eth_call")
+    histogram.observe(5, method="eth_call")
+
+    text = registry.render()
+    assert "# TYPE test_events_total counter\n" in text
+    assert 'test_events_total{chain_id="1"} 3\n' in text
+    assert 'test_events_total{chain_id="137"} 1\n' in text
+    assert "# TYPE test_depth gauge\ntest_depth 4\n" in text
+    assert 'test_seconds_bucket{method="eth_call",le="0.1"} 1\n' in text
+    assert 'test_seconds_bucket{method="eth_call",le="1"} 2\n' in text
+    assert 'test_seconds_bucket{method="eth_call",le="+Inf"} 3\n' in text
+    assert 'test_seconds_sum{method="eth_call"} 5.55\n' in text
+    assert 'test_seconds_count{method="eth_call"} 3\n' in text
+
+
+def test_labels_are_checked():
+    counter = Counter("test_total", "Test.", ("chain_id",))
+    with pytest.raises(ValueError):
+        counter.inc(method="eth_call")
+    with pytest.raises(ValueError):
+        counter.inc(-1, chain_id=1)
+
+
+def test_rpc_requests_are_timed():
+    w3 = Web3(FakeProvider())
+    instrument(w3, 80001)
+    instrument(w3, 80001)
+    before = metrics.rpc_latency.count(chain_id=80001, method="eth_blockNumber")
+
+    assert w3.eth.get_block_number() == 16
+    with pytest.raises(ValueError):
+        w3.eth.get_logs({"fromBlock": 1, "toBlock": 2})
+
+    # instrumenting twice doesn't time requests twice
+    assert metrics.rpc_latency.count(chain_id=80001, method="eth_blockNumber") == before + 1
+    assert metrics.rpc_errors.get(chain_id=80001, method="eth_getLogs") >= 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    metrics.events_fetched.inc(3, chain_id=5)
+    server = await serve_metrics(0)
+    host, port = server.sockets[0].getsockname()[:2]
+    # only served locally unless another host is given
+    assert host == "127.0.0.1"
+
+    async def get(path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    try:
+        response = await get("/metrics")
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "text/plain; version=0.0.4" in response
+        assert 'dvm_events_fetched_total{chain_id="5"}' in response
+        assert "# TYPE dvm_rpc_request_seconds histogram" in response
+
+        assert (await get("/other")).startswith("HTTP/1.1 404")
+    finally:
+        server.close()
+        await server.wait_closed()
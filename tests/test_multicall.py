@@ -0,0 +1,168 @@
+import pytest
+from eth_abi import decode
+from eth_abi import encode
+from telliot_core.contract.contract import Contract
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from disputable_values_monitor.multicall import ContractRead
+from disputable_values_monitor.multicall import MULTICALL3_ADDRESS
+from disputable_values_monitor.multicall import MulticallReader
+
+GOVERNANCE = Web3.to_checksum_address("0x" + "22" * 20)
+ACCOUNT = Web3.to_checksum_address("0x" + "11" * 20)
+QUERY_ID = "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+ABI = [
+    {"inputs": [], "name": "getDisputeFee", "outputs": [{"name": "", "type": "uint256"}], "type": "function"},
+    {
+        "inputs": [{"name": "_hash", "type": "bytes32"}],
+        "name": "getVoteRounds",
+        "outputs": [{"name": "", "type": "uint256[]"}],
+        "type": "function",
+    },
+    {
+        "inputs": [{"name": "_account", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "", "type": "uint256"}],
+        "type": "function",
+    },
+]
+SELECTORS = {
+    Web3.keccak(text=sig)[:4]: name
+    for sig, name in [
+        ("getDisputeFee()", "getDisputeFee"),
+        ("getVoteRounds(bytes32)", "getVoteRounds"),
+        ("balanceOf(address)", "balanceOf"),
+    ]
+}
+
+
+class FakeChain(BaseProvider):
+    """Node answering the reads of one contract, with or without Multicall3."""
+
+    def __init__(self, multicall=True):
+        self.multicall = multicall
+        self.calls = []
+        self.reverting = set()
+
+    def answer(self, data):
+        name = SELECTORS[bytes(data[:4])]
+        if name in self.reverting:
+            return False, b""
+        if name == "getDisputeFee":
+            return True, encode(["uint256"], [10**18])
+        if name == "getVoteRounds":
+            return True, encode(["uint256[]"], [[1, 2]])
+        return True, encode(["uint256"], [5 * 10**18])
+
+    def make_request(self, method, params):
+        if method != "eth_call":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+        tx, block = params
+        self.calls.append((tx["to"], block))
+        data = Web3.to_bytes(hexstr=tx["data"])
+        if Web3.to_checksum_address(tx["to"]) == MULTICALL3_ADDRESS:
+            if not self.multicall:
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x"}
+            (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+            results = [self.answer(call_data) for _, _, call_data in calls]
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x" + encode(["(bool,bytes)[]"], [results]).hex()}
+        success, result = self.answer(data)
+        if not success:
+            return {"jsonrpc": "2.0", "id": 1, "error": {"code": 3, "message": "execution reverted"}}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x" + result.hex()}
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def governance_contract(chain):
+    w3 = Web3(chain)
+    node = type("Node", (), {"web3": w3})()
+    contract = Contract(GOVERNANCE, ABI, node)
+    contract.contract = w3.eth.contract(address=GOVERNANCE, abi=ABI)
+    return contract
+
+
+def reads(contract):
+    return [
+        ContractRead(contract, "getDisputeFee"),
+        ContractRead(contract, "getVoteRounds", (QUERY_ID,)),
+        ContractRead(contract, "balanceOf", (ACCOUNT,)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reads_are_batched_and_cached_per_block():
+    chain = FakeChain()
+    contract = governance_contract(chain)
+    reader = MulticallReader()
+    reader.observe_head(1, 100)
+
+    results = await reader.read(1, reads(contract))
+
+    assert [value for value, _ in results] == [10**18, [1, 2], 5 * 10**18]
+    assert all(status.ok for _, status in results)
+    assert len(chain.calls) == 1
+    assert chain.calls[0][1] == hex(100)
+
+    # same block: served from the cache
+    assert await reader.read(1, reads(contract)[:1]) == results[:1]
+    assert len(chain.calls) == 1
+
+    # new block or a sent transaction: read again
+    reader.observe_head(1, 101)
+    await reader.read(1, reads(contract))
+    reader.forget(1)
+    await reader.read(1, reads(contract))
+    assert len(chain.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_reads_are_not_cached():
+    chain = FakeChain()
+    chain.reverting.add("balanceOf")
+    contract = governance_contract(chain)
+    reader = MulticallReader()
+    reader.observe_head(1, 100)
+
+    fee, balance = await reader.read(1, [reads(contract)[0], reads(contract)[2]])
+    assert fee[1].ok
+    assert balance == (None, balance[1]) and not balance[1].ok
+
+    chain.reverting.clear()
+    _, balance = await reader.read(1, [reads(contract)[0], reads(contract)[2]])
+    assert balance[0] == 5 * 10**18
+    # only the failed read is sent again
+    assert len(chain.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_chains_without_multicall_read_one_by_one():
+    chain = FakeChain(multicall=False)
+    contract = governance_contract(chain)
+    reader = MulticallReader()
+
+    results = await reader.read(1, reads(contract))
+
+    assert [value for value, _ in results] == [10**18, [1, 2], 5 * 10**18]
+    assert 1 in reader.unsupported
+    # one failed multicall, then the reads
+    assert len(chain.calls) == 4
+
+    await reader.read(1, reads(contract))
+    assert len(chain.calls) == 7
+
+
+@pytest.mark.asyncio
+async def test_latest_reads_skip_the_head_and_the_cache():
+    chain = FakeChain()
+    contract = governance_contract(chain)
+    reader = MulticallReader()
+    reader.observe_head(1, 100)
+    await reader.read(1, reads(contract))
+
+    # e.g. the balance before another dispute, which the head may not include yet
+    await reader.read(1, reads(contract), latest=True)
+    await reader.read(1, reads(contract), latest=True)
+    assert [block for _, block in chain.calls] == [hex(100), "latest", "latest"]
@@ -0,0 +1,70 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from disputable_values_monitor.nonces import NonceManager
+
+ACCOUNT = "0x" + "11" * 20
+
+
+def mock_web3(pending):
+    w3 = mock.Mock()
+    w3.eth.get_transaction_count.return_value = pending
+    return w3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_allocations_get_their_own_nonce():
+    nonces = NonceManager()
+    w3 = mock_web3(4)
+
+    allocated = await asyncio.gather(*(nonces.allocate(w3, 1, ACCOUNT) for _ in range(5)))
+
+    assert sorted(allocated) == [4, 5, 6, 7, 8]
+    w3.eth.get_transaction_count.assert_called_once_with(ACCOUNT, "pending")
+    # other chains keep their own nonces
+    assert await nonces.allocate(w3, 137, ACCOUNT) == 4
+
+
+@pytest.mark.asyncio
+async def test_failure_resyncs_once_nothing_is_in_flight():
+    nonces = NonceManager()
+    w3 = mock_web3(10)
+
+    first = await nonces.allocate(w3, 1, ACCOUNT)
+    second = await nonces.allocate(w3, 1, ACCOUNT)
+    nonces.failed(1, ACCOUNT, first)
+
+    # the second transaction is still being sent, so keep counting
+    assert await nonces.allocate(w3, 1, ACCOUNT) == 12
+    nonces.sent(1, ACCOUNT, second)
+    nonces.failed(1, ACCOUNT, 12)
+
+    # the node saw the second transaction only
+    w3.eth.get_transaction_count.return_value = 11
+    assert await nonces.allocate(w3, 1, ACCOUNT) == 11
+    assert w3.eth.get_transaction_count.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_nonces_are_saved(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    nonces = NonceManager()
+    nonces.open(path)
+    w3 = mock_web3(3)
+    assert await nonces.allocate(w3, 1, ACCOUNT) == 3
+    assert await nonces.allocate(w3, 1, ACCOUNT) == 4
+    nonces.close()
+
+    # the node hasn't seen the pending transactions yet
+    restarted = NonceManager()
+    restarted.open(path)
+    assert await restarted.allocate(mock_web3(3), 1, ACCOUNT) == 5
+    restarted.close()
+
+    # the node is ahead of the saved nonce
+    restarted = NonceManager()
+    restarted.open(path)
+    assert await restarted.allocate(mock_web3(20), 1, ACCOUNT) == 20
+    restarted.close()
@@ -0,0 +1,175 @@
+"""Tests for the concurrent report evaluation pipeline."""
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+from hexbytes import HexBytes
+from telliot_feeds.queries.evm_call import EVMCall
+from web3.datastructures import AttributeDict
+
+from disputable_values_monitor.data import Metrics
+from disputable_values_monitor.data import MonitoredFeed
+from disputable_values_monitor.data import Threshold
+from disputable_values_monitor.pipeline import event_key
+from disputable_values_monitor.pipeline import log_key
+from disputable_values_monitor.pipeline import ReportPipeline
+from disputable_values_monitor.pipeline import SeenEvents
+from disputable_values_monitor.utils import Topics
+
+
+def make_event(query_id: int, tx: int, log_index: int = 0) -> AttributeDict:
+    return AttributeDict(
+        {
+            "topics": [HexBytes(Topics.NEW_REPORT), HexBytes(query_id.to_bytes(32, "big"))],
+            "transactionHash": HexBytes(tx.to_bytes(32, "big")),
+            "logIndex": log_index,
+        }
+    )
+
+
+def test_event_key():
+    """test events are keyed by chain id and query id"""
+    assert event_key(1, make_event(7, 1)) == event_key(1, make_event(7, 2))
+    assert event_key(1, make_event(7, 1)) != event_key(10, make_event(7, 1))
+    assert event_key(1, make_event(7, 1)) != event_key(1, make_event(8, 1))
+
+    oracle_address_event = AttributeDict({"topics": [HexBytes(Topics.NEW_ORACLE_ADDRESS)]})
+    assert event_key(1, oracle_address_event) == (1, Topics.NEW_ORACLE_ADDRESS)
+
+
+@pytest.mark.asyncio
+async def test_keeps_order_per_query_id():
+    """test events of one query id are handled in order while other query ids run concurrently"""
+    handled = []
+
+    async def handler(chain_id, event):
+        # the first report of each query id is the slowest
+        tx = int.from_bytes(event.transactionHash, "big")
+        await asyncio.sleep(0.05 if tx % 10 == 0 else 0)
+        handled.append((chain_id, tx))
+
+    pipeline = ReportPipeline(handler, workers=4)
+    events = [(1, make_event(1, 10)), (1, make_event(2, 20)), (1, make_event(1, 11)), (1, make_event(2, 21))]
+    await pipeline.process(events)
+
+    assert [tx for _, tx in handled if tx < 20] == [10, 11]
+    assert [tx for _, tx in handled if tx >= 20] == [20, 21]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.asyncio
+async def test_keeps_order_across_concurrent_batches(workers):
+    """test events of a query id wait for those of a batch already being handled, e.g. a stream's and a poll's"""
+    handled = []
+
+    async def handler(chain_id, event):
+        tx = int.from_bytes(event.transactionHash, "big")
+        await asyncio.sleep(0.05 if tx == 10 else 0)
+        handled.append(tx)
+
+    pipeline = ReportPipeline(handler, workers=workers)
+    await asyncio.gather(
+        pipeline.process([(1, make_event(1, 10)), (1, make_event(2, 20))]),
+        pipeline.process([(1, make_event(1, 11)), (1, make_event(3, 30))]),
+    )
+
+    assert [tx for tx in handled if tx < 20] == [10, 11]
+    if workers > 1:
+        # other query ids don't wait
+        assert handled.index(30) < handled.index(10)
+
+
+@pytest.mark.asyncio
+async def test_bounded_concurrency():
+    """test no more than the configured number of events are evaluated at once"""
+    running = 0
+    max_running = 0
+
+    async def handler(chain_id, event):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    pipeline = ReportPipeline(handler, workers=3)
+    await pipeline.process([(1, make_event(i, i)) for i in range(10)])
+
+    assert max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_dedupe_and_errors(caplog):
+    """test duplicate transactions are handled once and a failing event doesn't stop the batch"""
+    handled = []
+
+    async def handler(chain_id, event):
+        tx = int.from_bytes(event.transactionHash, "big")
+        if tx == 2:
+            raise ValueError("bad event")
+        handled.append(tx)
+
+    pipeline = ReportPipeline(handler, workers=1)
+    await pipeline.process([(1, make_event(1, 1)), (1, make_event(1, 1)), (1, make_event(2, 2)), (1, make_event(3, 3))])
+
+    assert handled == [1, 3]
+    assert "bad event" in caplog.text
+
+
+def test_invalid_workers():
+    with pytest.raises(ValueError):
+        ReportPipeline(lambda chain_id, event: asyncio.sleep(0), workers=0)
+
+
+def test_seen_events():
+    """test events are reserved once, can be released, and the oldest are forgotten"""
+    seen = SeenEvents(size=2)
+    first, second, third = (log_key(1, make_event(1, tx)) for tx in (1, 2, 3))
+    assert log_key(1, make_event(1, 1)) != log_key(1, make_event(1, 1, log_index=1))
+
+    assert seen.reserve(first)
+    assert not seen.reserve(first)
+    seen.release(first)
+    assert seen.reserve(first)
+
+    assert seen.reserve(second)
+    assert seen.reserve(third)
+    # only the two latest are remembered
+    assert not seen.reserve(third)
+    assert seen.reserve(first)
+
+
+class BlockingSource:
+    """Source making a blocking request inside its coroutine, like most price sources do."""
+
+    async def fetch_new_datapoint(self, *args):
+        time.sleep(0.2)
+        return ((b"\x01", 1_600_000_000), None) if args else (1.0, None)
+
+
+def find_block_slowly(cfg, timestamp):
+    time.sleep(0.2)
+    return 100
+
+
+@pytest.mark.asyncio
+async def test_blocking_evaluation_runs_concurrently():
+    """test blocking block searches and trusted value fetches don't hold up the other workers"""
+    query = EVMCall(chainId=1, contractAddress="0x88df592f8eb5d7bd38bfef7deb0fbc02cf3778a0", calldata=b"\x18")
+    monitored_feed = MonitoredFeed(
+        feed=mock.Mock(query=query, source=BlockingSource()), threshold=Threshold(Metrics.Equality, amount=None)
+    )
+    results = []
+
+    async def handler(chain_id, event):
+        results.append(await monitored_feed.is_disputable(mock.Mock(), (b"\x01", 1_600_000_000)))
+
+    pipeline = ReportPipeline(handler, workers=4)
+    started = time.monotonic()
+    with mock.patch("disputable_values_monitor.data.get_block_number_at_timestamp", find_block_slowly):
+        await pipeline.process([(1, make_event(query_id, query_id)) for query_id in range(4)])
+
+    assert results == [False] * 4
+    # each report blocks for 0.4 seconds; one after another they'd take 1.6
+    assert time.monotonic() - started < 0.8
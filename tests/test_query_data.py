@@ -0,0 +1,63 @@
+"""Tests for decoding queryData."""
+import eth_abi
+from telliot_feeds.queries.evm_call import EVMCall
+from telliot_feeds.queries.price.spot_price import SpotPrice
+
+from disputable_values_monitor.data import get_query_from_data
+from disputable_values_monitor.data import get_source_from_data
+from disputable_values_monitor.query_data import QueryDataCache
+
+EVM_CALL = EVMCall(
+    chainId=1, contractAddress="0x88df592f8eb5d7bd38bfef7deb0fbc02cf3778a0", calldata=b"\x18\x16\x0d\xdd"
+)
+
+
+def test_repeated_query_data_is_decoded_once():
+    cache = QueryDataCache()
+
+    decoded = cache.decode(EVM_CALL.query_data)
+    assert cache.decode(EVM_CALL.query_data) is decoded
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert decoded.query_type == "EVMCall"
+    assert decoded.query == EVM_CALL
+    assert decoded.value_type is not None
+    assert dict(decoded.params)["calldata"] == b"\x18\x16\x0d\xdd"
+
+
+def test_unsupported_query_type_is_logged_once(caplog):
+    cache = QueryDataCache()
+    query_data = eth_abi.encode(["string", "bytes"], ["NotAQueryType", b""])
+
+    for _ in range(3):
+        decoded = cache.decode(query_data)
+
+    assert decoded.query is None
+    assert caplog.text.count("Unsupported query type: NotAQueryType") == 1
+
+
+def test_least_recently_used_query_data_is_evicted():
+    cache = QueryDataCache(maxsize=2)
+    eth_usd, btc_usd = SpotPrice("eth", "usd").query_data, SpotPrice("btc", "usd").query_data
+
+    cache.decode(eth_usd)
+    cache.decode(btc_usd)
+    cache.decode(eth_usd)
+    cache.decode(EVM_CALL.query_data)
+
+    # btc/usd was the least recently used
+    assert cache.decode(eth_usd).query == SpotPrice("eth", "usd")
+    assert cache.misses == 3
+    cache.decode(btc_usd)
+    assert cache.misses == 4
+
+
+def test_sources_from_cached_query_data_are_independent():
+    """test each report gets its own source even when its queryData was decoded before"""
+    assert get_query_from_data(EVM_CALL.query_data) == EVM_CALL
+
+    first = get_source_from_data(EVM_CALL.query_data)
+    second = get_source_from_data(EVM_CALL.query_data)
+
+    assert first is not second
+    assert first.chainId == second.chainId == 1
@@ -0,0 +1,127 @@
+import json
+from unittest import mock
+
+import pytest
+from click.testing import CliRunner
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+
+from disputable_values_monitor.config import AutoDisputerConfig
+from disputable_values_monitor.replay import log_record
+from disputable_values_monitor.replay import main
+from disputable_values_monitor.replay import parse_record
+from disputable_values_monitor.replay import Replay
+from disputable_values_monitor.replay import ReplaySink
+
+ETH_USD_CONFIG = """
+feeds:
+  - query_id: "0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992"
+    threshold:
+      type: Percentage
+      amount: 0.75
+  - query_type: EVMCall
+    threshold:
+      type: Equality
+"""
+
+
+class RecordingSink(ReplaySink):
+    def __init__(self):
+        self.alerts = []
+        self.disputes = []
+
+    def alert(self, msg):
+        self.alerts.append(msg)
+
+    def dispute(self, new_report):
+        self.disputes.append(new_report)
+
+
+def with_tx_hash(log, tx_hash):
+    return AttributeDict({**log, "transactionHash": HexBytes(tx_hash)})
+
+
+@pytest.fixture
+def disp_cfg(tmp_path):
+    path = tmp_path / "disputer-config.yaml"
+    path.write_text(ETH_USD_CONFIG)
+    return AutoDisputerConfig(is_disputing=True, confidence_flag=0.1, path=str(path))
+
+
+def test_record_round_trip(eth_usd_report_log):
+    record = parse_record(json.dumps(log_record(1, eth_usd_report_log, trusted_value=1293.51)))
+
+    assert record.chain_id == 1
+    assert record.trusted_value == 1293.51
+    for key in ("topics", "data", "transactionHash", "blockNumber", "blockHash", "logIndex"):
+        assert record.log[key] == eth_usd_report_log[key]
+
+    # trusted values of EVMCall queries are (value, timestamp) tuples
+    record = parse_record(json.dumps(log_record(1, eth_usd_report_log, trusted_value=(b"\x01", 5))))
+    assert record.trusted_value == ("0x01", 5)
+
+
+@pytest.mark.asyncio
+async def test_replay_with_recorded_trusted_values(eth_usd_report_log, evm_call_log, disp_cfg):
+    """reports are evaluated against the recorded trusted values, without Discord or a node"""
+    records = [
+        parse_record(json.dumps(log_record(1, eth_usd_report_log, trusted_value=1293.51))),
+        # reported value of 1293.51 is far from 100
+        parse_record(json.dumps(log_record(1, with_tx_hash(eth_usd_report_log, "0x" + "11" * 32), 100.0))),
+        # checking an EVMCall needs the block of the report, which only a node knows
+        parse_record(json.dumps(log_record(1, evm_call_log))),
+    ]
+    sink = RecordingSink()
+
+    with mock.patch("disputable_values_monitor.discord.get_alert_bot_1") as bot:
+        stats = await Replay(disp_cfg, sink, workers=2).run(records)
+
+    bot.assert_not_called()
+    assert stats.events == 3
+    assert stats.reports == 2
+    assert stats.disputable == 1
+    assert stats.errors == 1
+    assert stats.disputes == 1
+    assert sink.disputes[0].tx_hash == "0x" + "11" * 32
+    assert sink.disputes[0].value == pytest.approx(1293.51)
+    assert stats.alerts == len(sink.alerts) == 1
+    assert "DISPUTABLE VALUE" in sink.alerts[0]
+
+
+@pytest.mark.asyncio
+async def test_replay_with_new_thresholds(eth_usd_report_log, tmp_path):
+    """the same report is only disputed under the stricter threshold"""
+    # reported value of 1293.51 is 29% off
+    records = [parse_record(json.dumps(log_record(1, eth_usd_report_log, trusted_value=1000.0)))]
+    disputes = {}
+    for amount in (0.75, 0.25):
+        path = tmp_path / f"disputer-config-{amount}.yaml"
+        path.write_text(ETH_USD_CONFIG.replace("amount: 0.75", f"amount: {amount}"))
+        disp_cfg = AutoDisputerConfig(is_disputing=True, confidence_flag=0.1, path=str(path))
+
+        stats = await Replay(disp_cfg, RecordingSink()).run(records)
+
+        assert stats.reports == 1
+        disputes[amount] = stats.disputes
+
+    assert disputes == {0.75: 0, 0.25: 1}
+
+
+def test_replay_command(eth_usd_report_log, tmp_path):
+    config = tmp_path / "disputer-config.yaml"
+    config.write_text(ETH_USD_CONFIG)
+    records = tmp_path / "logs.jsonl"
+    records.write_text(
+        json.dumps(log_record(1, eth_usd_report_log, trusted_value=100.0)) + "\n\nnot json\n",
+    )
+    output = tmp_path / "decisions.jsonl"
+
+    result = CliRunner().invoke(main, [str(records), "--config", str(config), "-o", str(output)])
+
+    assert result.exit_code == 0, result.output
+    assert "replayed 1 events" in result.output
+    assert "1 disputes, 0 errors" in result.output
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [line["type"] for line in lines] == ["alert", "dispute"]
+    assert lines[1]["query_type"] == "SpotPrice"
+    assert lines[1]["disputable"] is True
@@ -0,0 +1,90 @@
+"""Tests for the report file."""
+import csv
+import json
+
+from disputable_values_monitor.reports import infer_report_format
+from disputable_values_monitor.reports import ReportSink
+from disputable_values_monitor.utils import NewReport
+
+
+def new_report(i, value=3400.12345):
+    return NewReport(
+        tx_hash=f"0x{i:064x}",
+        submission_timestamp=1700000000 + i,
+        chain_id=1337,
+        link=f"etherscan.io/tx/{i}",
+        query_type="SpotPrice",
+        value=value,
+        asset="eth",
+        currency="usd",
+        query_id="0x83a7f3d48786ac2667503a61e8c415438ed2922eb86a2906e4ee66d9a2ce4992",
+        disputable=False,
+        status_str="no ✔️",
+    )
+
+
+def test_reports_are_written_once(tmp_path):
+    path = tmp_path / "table.csv"
+    sink = ReportSink(str(path), flush_interval=60)
+
+    for i in range(3):
+        sink.write(new_report(i))
+    # still buffered
+    assert not path.exists()
+
+    sink.close()
+    sink.write(new_report(3))
+    sink.close()
+
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["When", "Transaction", "QueryType", "Asset", "Currency", "Value", "Disputable", "ChainId"]
+    assert [row[0] for row in rows[1:]] == ["1700000000", "1700000001", "1700000002", "1700000003"]
+    assert "SpotPrice,eth,usd,3400.1235,no ✔️,1337" in ",".join(rows[1])
+    assert sink.written == 4
+
+
+def test_repeated_reports_are_skipped(tmp_path):
+    path = tmp_path / "table.csv"
+    sink = ReportSink(str(path), buffer_size=1, remember=2)
+
+    sink.write(new_report(0))
+    sink.write(new_report(0))
+    # another NewReport log of the same transaction
+    second_log = new_report(0)
+    second_log.log_index = 1
+    sink.write(second_log)
+    assert sink.written == 2
+
+    # only the latest reports are remembered
+    sink.write(new_report(1))
+    sink.write(new_report(0))
+    assert sink.written == 4
+
+
+def test_ndjson_reports(tmp_path):
+    path = tmp_path / "reports.ndjson"
+    sink = ReportSink(str(path), fmt=infer_report_format(str(path)), buffer_size=1)
+
+    sink.write(new_report(0, value=(b"\x01\x02", 1700000000)))
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]["tx_hash"] == f"0x{0:064x}"
+    assert records[0]["log_index"] == 0
+    assert records[0]["value"] == "(b'\\x01\\x02', 1700000000)"
+    assert records[0]["disputable"] is False
+
+
+def test_report_file_rotation(tmp_path):
+    path = tmp_path / "table.csv"
+    sink = ReportSink(str(path), buffer_size=1, max_bytes=200, backups=2)
+
+    # a header and two reports fill a file
+    for i in range(7):
+        sink.write(new_report(i))
+
+    rotated = sorted(p.name for p in tmp_path.iterdir())
+    assert rotated == ["table.csv", "table.csv.1", "table.csv.2"]
+    # every file starts with a header
+    for p in tmp_path.iterdir():
+        assert p.read_text().startswith("When,")
@@ -0,0 +1,120 @@
+"""Tests for batching JSON-RPC requests."""
+import threading
+import time
+
+from web3 import Web3
+
+from disputable_values_monitor.blocks import BlockIndex
+from disputable_values_monitor.rpcbatch import BatchingHTTPProvider
+from disputable_values_monitor.rpcbatch import request_duration
+from disputable_values_monitor.rpcbatch import start_request_timer
+
+
+def get_block_numbers(w3, count):
+    results = [None] * count
+
+    def get(i):
+        results[i] = w3.eth.get_block_number()
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_share_a_batch(rpc_node):
+    w3 = Web3(BatchingHTTPProvider(rpc_node.url, window=0.05))
+
+    assert get_block_numbers(w3, 5) == [rpc_node.head] * 5
+    assert len(rpc_node.posts) == 1
+    assert [request["method"] for request in rpc_node.posts[0]] == ["eth_blockNumber"] * 5
+
+    # a request on its own isn't wrapped in a batch
+    assert w3.eth.get_block_number() == rpc_node.head
+    assert isinstance(rpc_node.posts[1], dict)
+
+
+def test_batches_fall_back_to_single_requests(rpc_node):
+    rpc_node.reject_batches = True
+    provider = BatchingHTTPProvider(rpc_node.url, window=0.05)
+    w3 = Web3(provider)
+
+    assert get_block_numbers(w3, 3) == [rpc_node.head] * 3
+    assert not provider.batches_supported
+    # the rejected batch, then each request on its own
+    assert isinstance(rpc_node.posts[0], list)
+    assert all(isinstance(post, dict) for post in rpc_node.posts[1:])
+    assert len(rpc_node.posts) == 4
+
+
+def test_batches_are_kept_after_an_error_for_the_whole_batch(rpc_node):
+    rpc_node.batch_error = {"code": -32005, "message": "request rate limited"}
+    provider = BatchingHTTPProvider(rpc_node.url)
+    requests = [("eth_blockNumber", []), ("eth_chainId", [])]
+
+    responses = provider.make_batch_request(requests)
+    assert [response["error"] for response in responses] == [rpc_node.batch_error] * 2
+    assert responses[0]["id"] != responses[1]["id"]
+    assert provider.batches_supported
+
+    rpc_node.batch_error = None
+    responses = provider.make_batch_request(requests)
+    assert [response["result"] for response in responses] == [hex(rpc_node.head), hex(rpc_node.chain_id)]
+    assert all(isinstance(post, list) for post in rpc_node.posts)
+
+
+def test_block_lookup_fetches_both_ends_in_one_batch(rpc_node):
+    w3 = Web3(BatchingHTTPProvider(rpc_node.url, window=0.05))
+
+    index = BlockIndex()
+    assert index.find_block(w3, 1, 1_600_000_000 + 12 * 400) == 400
+    assert [request["params"][0] for request in rpc_node.posts[0]] in (["latest", "0x0"], ["0x0", "latest"])
+
+
+def test_batches_are_sent_while_others_are_in_flight(rpc_node):
+    rpc_node.delays["eth_blockNumber"] = 0.5
+    w3 = Web3(BatchingHTTPProvider(rpc_node.url, window=0.01))
+    finished = []
+
+    def get_block_number():
+        w3.eth.get_block_number()
+        finished.append("eth_blockNumber")
+
+    slow = threading.Thread(target=get_block_number)
+    slow.start()
+    time.sleep(0.1)
+    # made while the slow batch is in flight, so it goes out in a batch of its own
+    assert w3.eth.chain_id == rpc_node.chain_id
+    finished.append("eth_chainId")
+    slow.join()
+
+    assert finished == ["eth_chainId", "eth_blockNumber"]
+
+
+def test_logs_are_not_batched(rpc_node):
+    w3 = Web3(BatchingHTTPProvider(rpc_node.url, window=0.05))
+    threads = [threading.Thread(target=w3.eth.get_block_number) for _ in range(2)]
+    threads.append(threading.Thread(target=w3.eth.get_logs, args=({"fromBlock": 1, "toBlock": 2},)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {"jsonrpc": "2.0", "method": "eth_getLogs"}.items() <= next(
+        post for post in rpc_node.posts if isinstance(post, dict)
+    ).items()
+    assert [request["method"] for request in next(post for post in rpc_node.posts if isinstance(post, list))] == [
+        "eth_blockNumber"
+    ] * 2
+
+
+def test_only_the_post_is_timed(rpc_node):
+    w3 = Web3(BatchingHTTPProvider(rpc_node.url, window=0.2))
+
+    started = start_request_timer()
+    w3.eth.get_block_number()
+    assert time.perf_counter() - started >= 0.2
+    # the time spent waiting for the batch to fill up isn't the endpoint's
+    assert request_duration(started) < 0.2
@@ -0,0 +1,100 @@
+"""Tests for the per-chain polling scheduler."""
+import asyncio
+from unittest import mock
+
+import pytest
+
+from disputable_values_monitor import MAX_POLL_INTERVAL
+from disputable_values_monitor import MIN_POLL_INTERVAL
+from disputable_values_monitor import STREAMING_POLL_INTERVAL
+from disputable_values_monitor import WAIT_PERIOD
+from disputable_values_monitor.scheduler import ChainScheduler
+from disputable_values_monitor.scheduler import estimate_block_time
+from disputable_values_monitor.scheduler import poll_interval
+
+
+def test_estimate_block_time():
+    """test block time is averaged over the sampled blocks"""
+    blocks = {"latest": {"number": 1000, "timestamp": 12000}, 900: {"number": 900, "timestamp": 10800}}
+    w3 = mock.Mock()
+    w3.eth.get_block.side_effect = lambda block: blocks[block]
+
+    assert estimate_block_time(w3) == 12.0
+
+
+def test_poll_interval():
+    assert poll_interval(12.0) == 12.0
+    assert poll_interval(0.01) == MIN_POLL_INTERVAL
+    assert poll_interval(600) == MAX_POLL_INTERVAL
+    assert poll_interval(None) == WAIT_PERIOD
+
+
+@pytest.mark.asyncio
+async def test_slow_chain_does_not_delay_fast_chain():
+    """test each chain is polled on its own schedule"""
+    polls = {1: 0, 42161: 0}
+
+    async def poll(chain_id):
+        polls[chain_id] += 1
+        if chain_id == 1:
+            # a stuck rpc call on mainnet
+            await asyncio.sleep(10)
+
+    scheduler = ChainScheduler(cfg=None, poll=poll)
+    scheduler.intervals = {1: 12.0, 42161: 0.01}
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.run([1, 42161]), timeout=0.2)
+
+    assert polls[1] == 1
+    assert polls[42161] > 5
+
+
+@pytest.mark.asyncio
+async def test_failing_poll_keeps_polling(caplog):
+    """test an error while polling a chain doesn't stop its polling task"""
+    polls = 0
+
+    async def poll(chain_id):
+        nonlocal polls
+        polls += 1
+        raise ValueError("rpc down")
+
+    scheduler = ChainScheduler(cfg=None, poll=poll, wait=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.run([1]), timeout=0.1)
+
+    assert polls > 1
+    assert "unable to poll chain_id 1: rpc down" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_streamed_chain_is_polled_when_woken():
+    """test a streamed chain is polled rarely, except when its stream asks for a backfill"""
+    polls = 0
+
+    async def poll(chain_id):
+        nonlocal polls
+        polls += 1
+
+    scheduler = ChainScheduler(cfg=None, poll=poll, wait=0.01)
+    scheduler.streaming.add(1)
+    assert await scheduler.interval(1) == STREAMING_POLL_INTERVAL
+
+    task = asyncio.create_task(scheduler.run([1]))
+    await asyncio.sleep(0.05)
+    assert polls == 1
+
+    scheduler.wake(1)
+    await asyncio.sleep(0.01)
+    assert polls == 2
+
+    # the stream dropped: back to polling every wait seconds
+    scheduler.streaming.discard(1)
+    scheduler.wake(1)
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert polls > 4
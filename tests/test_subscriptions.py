@@ -0,0 +1,97 @@
+"""Tests for streaming logs over a websocket."""
+import asyncio
+import json
+
+import pytest
+import websockets
+from hexbytes import HexBytes
+
+from disputable_values_monitor import subscriptions
+from disputable_values_monitor.logs import LogFilterPlan
+from disputable_values_monitor.subscriptions import LogStream
+from disputable_values_monitor.subscriptions import parse_ws_url
+from disputable_values_monitor.utils import Topics
+
+ORACLE = "0x" + "d3" * 20
+
+
+def raw_log(topic=Topics.NEW_REPORT, removed=False, tx="ab"):
+    return {
+        "address": ORACLE,
+        "blockHash": "0x" + "01" * 32,
+        "blockNumber": "0x10",
+        "data": "0x",
+        "logIndex": "0x2",
+        "removed": removed,
+        "topics": [topic, "0x" + "83" * 32],
+        "transactionHash": "0x" + tx * 32,
+        "transactionIndex": "0x1",
+    }
+
+
+async def serve_logs(pushes):
+    """Websocket endpoint pushing the logs queued for each connection, then closing it."""
+    node = {"pushes": list(pushes), "filters": []}
+
+    async def handler(ws, *args):
+        request = json.loads(await ws.recv())
+        node["filters"].append(request["params"][1])
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": "0x9ce5"}))
+        for log in node["pushes"].pop(0) if node["pushes"] else []:
+            params = {"subscription": "0x9ce5", "result": log}
+            await ws.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": params}))
+
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    node["url"] = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    return server, node
+
+
+def test_parse_ws_url():
+    assert parse_ws_url("137=wss://polygon.example/ws") == (137, "wss://polygon.example/ws")
+    assert parse_ws_url("137=https://polygon.example") is None
+    assert parse_ws_url("polygon=wss://polygon.example/ws") is None
+
+
+@pytest.mark.asyncio
+async def test_logs_are_pushed_and_reconnects_backfill(monkeypatch):
+    monkeypatch.setattr(subscriptions, "RECONNECT_DELAYS", (0,))
+    plan = LogFilterPlan(80001)
+    plan.add(ORACLE, Topics.NEW_REPORT)
+    # pushed logs of another event, and of a reorged block, are dropped
+    server, node = await serve_logs(
+        [
+            [raw_log(), raw_log(topic=Topics.NEW_ORACLE_ADDRESS, tx="cd"), raw_log(removed=True, tx="ef")],
+            [raw_log(tx="12")],
+        ]
+    )
+    received = []
+    connects = []
+    disconnects = []
+
+    async def on_logs(events):
+        received.extend(events)
+
+    stream = LogStream(80001, node["url"], plan, on_logs, lambda: connects.append(1), lambda: disconnects.append(1))
+    task = asyncio.create_task(stream.run())
+    try:
+        for _ in range(100):
+            if len(connects) >= 3:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        server.close()
+        await server.wait_closed()
+
+    assert node["filters"][0] == {"address": plan.addresses, "topics": plan.topics}
+    assert [chain_id for chain_id, _ in received] == [80001, 80001]
+    first = received[0][1]
+    assert first.transactionHash == HexBytes("0x" + "ab" * 32)
+    assert first.blockNumber == 16 and first.logIndex == 2
+    assert first.topics[0] == HexBytes(Topics.NEW_REPORT)
+    assert received[1][1].transactionHash == HexBytes("0x" + "12" * 32)
+    # every (re)connection asks for a backfill, every drop falls back to polling
+    assert len(connects) >= 3
+    assert len(disconnects) >= 2